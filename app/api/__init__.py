@@ -1,13 +1,28 @@
 from fastapi import APIRouter
 
-from . import admin, auth, chat, follow, root, post, test, user
+from . import (
+    admin,
+    auth,
+    chat,
+    feed,
+    follow,
+    message,
+    notification,
+    root,
+    post,
+    test,
+    user
+)
 
 main_api_router = APIRouter()
 
 main_api_router.include_router(admin.router)
 main_api_router.include_router(auth.router)
 main_api_router.include_router(chat.router)
+main_api_router.include_router(feed.router)
 main_api_router.include_router(follow.router)
+main_api_router.include_router(message.router)
+main_api_router.include_router(notification.router)
 main_api_router.include_router(root.router)
 main_api_router.include_router(post.router)
 main_api_router.include_router(test.router)
@@ -5,8 +5,8 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.postgres.connection import get_db
 from app.db.postgres.models import User
+from app.db.postgres.unit_of_work import get_uow
 from app.schemas.user import ShowAdmin
 from app.services.oauth2 import get_current_user_from_token
 from app.services.user import _get_user_by_id, _update_user
@@ -24,7 +24,7 @@ router = APIRouter(prefix="/admin", tags=["Admin"])
 )
 async def grant_admin_privilege(
     user_id: UUID,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_uow),
     current_user: User = Depends(get_current_user_from_token)
 ) -> ShowAdmin:
     if not current_user.is_superadmin:
@@ -74,7 +74,7 @@ async def grant_admin_privilege(
 )
 async def revoke_admin_privilege(
     user_id: UUID,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_uow),
     current_user: User = Depends(get_current_user_from_token)
 ) -> ShowAdmin:
     if not current_user.is_superadmin:
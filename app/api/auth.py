@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.postgres.connection import get_db
+from app.db.postgres.unit_of_work import get_uow
 from app.schemas.token import Token
 from app.services.oauth2 import authenticate_user, create_access_token
 
@@ -12,7 +12,7 @@ router = APIRouter(prefix="/auth", tags=["Auth"])
 @router.post("/login", response_model=Token, status_code=status.HTTP_200_OK)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_uow)
 ):
     user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
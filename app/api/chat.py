@@ -1,73 +1,134 @@
-from fastapi import APIRouter, Depends, Request, WebSocket, WebSocketDisconnect
+from uuid import UUID
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+    status
+)
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy import insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.postgres.connection import get_db, async_session
-from app.db.postgres.models import Message
-from app.schemas.chat import ShowMessage
+from app.config import settings
+from app.db.postgres.models import User
+from app.db.postgres.unit_of_work import get_uow
+from app.schemas.chat import ROOM_NAME_REGEX, ShowMessage
+from app.services.chat import (
+    _get_history,
+    _get_last_messages,
+    manager,
+    receive_message
+)
+from app.services.oauth2 import get_current_user_from_websocket
+from app.services.presence import _get_presence, presence
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
 templates = Jinja2Templates(directory="./app/templates")
 
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
-
-    async def broadcast(self, message: str, add_to_db: bool):
-        if add_to_db:
-            await self.add_messages_to_database(message)
-        for connection in self.active_connections:
-            await connection.send_text(message)
-
-    @staticmethod
-    async def add_messages_to_database(message: str):
-        session: AsyncSession = async_session()
-        async with session.begin():
-            stmt = insert(Message).values(message=message)
-            await session.execute(stmt)
-            await session.commit()
-
-
-manager = ConnectionManager()
+@router.websocket("/ws")
+async def authenticated_websocket_endpoint(
+    websocket: WebSocket,
+    room: str = Query(default="public", regex=ROOM_NAME_REGEX),
+    current_user: User = Depends(get_current_user_from_websocket)
+):
+    """Also receives direct messages sent to the user"""
+    username = current_user.username
+    await manager.connect(websocket, room=room, user_id=current_user.id)
+    try:
+        try:
+            await presence.connect(current_user.id)
+            while True:
+                data = await receive_message(websocket)
+                await manager.broadcast(
+                    message=f"{username} says: {data}",
+                    add_to_db=True,
+                    room=room,
+                    sender_id=current_user.id
+                )
+        finally:
+            # also for sockets closed by the server or failed receives
+            manager.disconnect(websocket)
+            await presence.disconnect(current_user.id)
+    except WebSocketDisconnect:
+        await manager.broadcast(
+            message=f"{username} left the chat",
+            add_to_db=False,
+            room=room
+        )
 
 
 @router.websocket("/ws/{client_id}")
-async def websocket_endpoint(websocket: WebSocket, client_id: int):
-    await manager.connect(websocket)
+async def websocket_endpoint(
+    websocket: WebSocket,
+    client_id: int,
+    room: str = Query(default="public", regex=ROOM_NAME_REGEX)
+):
+    await manager.connect(websocket, room=room, user_id=client_id)
     try:
-        while True:
-            data = await websocket.receive_text()
-            await manager.broadcast(
-                message=f"Client #{client_id} says: {data}",
-                add_to_db=True
-            )
+        try:
+            while True:
+                data = await receive_message(websocket)
+                await manager.broadcast(
+                    message=f"Client #{client_id} says: {data}",
+                    add_to_db=True,
+                    room=room
+                )
+        finally:
+            manager.disconnect(websocket)
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
         await manager.broadcast(
             message=f"Client #{client_id} left the chat",
-            add_to_db=False
+            add_to_db=False,
+            room=room
         )
 
 
 @router.get("/last_messages", response_model=list[ShowMessage])
-async def get_last_messages(db: AsyncSession = Depends(get_db)):
-    query = select(Message).order_by(Message.id.desc()).limit(5)
-    messages = await db.execute(query)
-    return messages.scalars().all()
+async def get_last_messages(
+    room: str = Query(default="public", regex=ROOM_NAME_REGEX),
+    limit: int = Query(default=5, ge=0, le=settings.CHAT_HISTORY_SIZE),
+    db: AsyncSession = Depends(get_uow)
+):
+    messages = await _get_last_messages(room, limit, db)
+    if messages is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Room {room} not found"
+        )
+    return messages
+
+
+@router.get("/history", response_model=list[ShowMessage])
+async def get_history(
+    room: str = Query(default="public", regex=ROOM_NAME_REGEX),
+    before_id: int | None = None,
+    limit: int = Query(default=50, ge=0, le=500),
+    db: AsyncSession = Depends(get_uow)
+):
+    messages = await _get_history(room, before_id, limit, db)
+    if messages is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Room {room} not found"
+        )
+    return messages
+
+
+@router.get("/presence", response_model=dict[UUID, bool])
+async def get_presence(user_ids: list[UUID] = Query(alias="user_id")):
+    if len(user_ids) > settings.PRESENCE_LOOKUP_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"No more than {settings.PRESENCE_LOOKUP_LIMIT} users"
+        )
+    return await _get_presence(user_ids)
 
 
 @router.get("/public_chat", response_class=HTMLResponse)
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.postgres.models import User
+from app.db.postgres.unit_of_work import get_uow
+from app.schemas.post import PageRequest, ShowPost
+from app.services.feed import _get_feed
+from app.services.oauth2 import get_current_user_from_token
+from app.utils.responses import ModelResponseRoute, ORJSONModelResponse
+
+router = APIRouter(
+    prefix="/feed",
+    tags=["Feed"],
+    route_class=ModelResponseRoute
+)
+
+
+@router.get(
+    "",
+    description="Get the latest posts of users I follow",
+    response_model=list[ShowPost],
+    response_class=ORJSONModelResponse,
+    status_code=status.HTTP_200_OK
+)
+async def get_feed(
+    page: PageRequest = Depends(),
+    db: AsyncSession = Depends(get_uow),
+    current_user: User = Depends(get_current_user_from_token)
+) -> list[ShowPost]:
+    return await _get_feed(current_user.id, page, db)
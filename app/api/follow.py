@@ -1,22 +1,25 @@
 from logging import getLogger
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi_cache.decorator import cache
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.postgres.connection import get_db
 from app.db.postgres.models import User
+from app.db.postgres.unit_of_work import get_uow
 from app.schemas.follow import Follow
+from app.schemas.user import ShowUser
 from app.services.oauth2 import get_current_user_from_token
 from app.services.follow import (
     _create_follow,
     _delete_follow,
+    _get_common_following,
+    _get_follow_suggestions,
     _get_list_of_followers,
     _get_list_of_following,
     is_user_following
 )
-from app.services.user import _get_user_by_username
+from app.services.user import _get_user_id_by_username
 
 logger = getLogger(__name__)
 
@@ -30,22 +33,22 @@ router = APIRouter(prefix="/follow", tags=["Follow"])
 )
 async def follow_user(
     username: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_uow),
     current_user: User = Depends(get_current_user_from_token)
 ) -> str:
-    user_for_follow = await _get_user_by_username(username, db)
-    if user_for_follow is None:
+    user_for_follow_id = await _get_user_id_by_username(username, db)
+    if user_for_follow_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"User with username {username} not found"
         )
-    if user_for_follow.id == current_user.id:
+    if user_for_follow_id == current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You cannot subscribe to yourself"
         )
     is_follow_exists = await is_user_following(
-        user_id=user_for_follow.id,
+        user_id=user_for_follow_id,
         follower_id=current_user.id,
         db=db
     )
@@ -55,8 +58,8 @@ async def follow_user(
             detail=f"You are already following user {username}"
         )
     try:
-        await _create_follow(
-            user_id=user_for_follow.id,
+        is_created = await _create_follow(
+            user_id=user_for_follow_id,
             follower_id=current_user.id,
             db=db
         )
@@ -66,9 +69,50 @@ async def follow_user(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Bad request"
         )
+    if not is_created:
+        # followed concurrently since the check above
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"You are already following user {username}"
+        )
     return f"You are following to the user {username}"
 
 
+@router.get(
+    "/suggestions",
+    description="Get users followed by the users I follow",
+    response_model=list[ShowUser],
+    status_code=status.HTTP_200_OK
+)
+async def get_follow_suggestions(
+    limit: int = Query(default=10, ge=1, le=50),
+    db: AsyncSession = Depends(get_uow),
+    current_user: User = Depends(get_current_user_from_token)
+) -> list[ShowUser]:
+    return await _get_follow_suggestions(current_user.id, limit, db)
+
+
+@router.get(
+    "/mutual/{username}",
+    description="Get users followed by both me and the user",
+    response_model=list[ShowUser],
+    status_code=status.HTTP_200_OK
+)
+@cache(expire=60)
+async def get_common_following(
+    username: str,
+    db: AsyncSession = Depends(get_uow),
+    current_user: User = Depends(get_current_user_from_token)
+) -> list[ShowUser]:
+    user_for_check_id = await _get_user_id_by_username(username, db)
+    if user_for_check_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with username {username} not found"
+        )
+    return await _get_common_following(current_user.id, user_for_check_id, db)
+
+
 @router.get(
     "/{username}",
     description="Check status of follow",
@@ -77,17 +121,17 @@ async def follow_user(
 @cache(expire=60)
 async def get_status_of_follow(
     username: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_uow),
     current_user: User = Depends(get_current_user_from_token)
 ) -> str:
-    user_for_check = await _get_user_by_username(username, db)
-    if user_for_check is None:
+    user_for_check_id = await _get_user_id_by_username(username, db)
+    if user_for_check_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"User with username {username} not found"
         )
     is_follow_exists = await is_user_following(
-        user_id=user_for_check.id,
+        user_id=user_for_check_id,
         follower_id=current_user.id,
         db=db
     )
@@ -104,7 +148,7 @@ async def get_status_of_follow(
 )
 @cache(expire=60)
 async def get_list_of_followers(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_uow),
     current_user: User = Depends(get_current_user_from_token)
 ) -> list[Follow]:
     return await _get_list_of_followers(current_user.id, db)
@@ -118,7 +162,7 @@ async def get_list_of_followers(
 )
 @cache(expire=60)
 async def get_list_of_following(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_uow),
     current_user: User = Depends(get_current_user_from_token)
 ) -> list[Follow]:
     return await _get_list_of_following(current_user.id, db)
@@ -131,17 +175,17 @@ async def get_list_of_following(
 )
 async def unfollow_user(
     username: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_uow),
     current_user: User = Depends(get_current_user_from_token)
 ) -> str:
-    user_for_unfollow = await _get_user_by_username(username, db)
-    if user_for_unfollow is None:
+    user_for_unfollow_id = await _get_user_id_by_username(username, db)
+    if user_for_unfollow_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"User with username {username} not found"
         )
     is_follow_exists = await is_user_following(
-        user_id=user_for_unfollow.id,
+        user_id=user_for_unfollow_id,
         follower_id=current_user.id,
         db=db
     )
@@ -152,7 +196,7 @@ async def unfollow_user(
         )
 
     await _delete_follow(
-        user_id=user_for_unfollow.id,
+        user_id=user_for_unfollow_id,
         follower_id=current_user.id,
         db=db
     )
@@ -0,0 +1,91 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.postgres.models import User
+from app.db.postgres.unit_of_work import get_uow
+from app.schemas.direct_message import (
+    CreateDirectMessage,
+    ShowConversation,
+    ShowDirectMessage
+)
+from app.services.direct_message import (
+    _get_direct_messages,
+    _get_inbox,
+    _send_direct_message
+)
+from app.services.oauth2 import get_current_user_from_token
+from app.services.user import _get_user_by_username
+
+router = APIRouter(prefix="/messages", tags=["Direct messages"])
+
+
+@router.get(
+    "",
+    description="Get my conversations, the latest first",
+    response_model=list[ShowConversation],
+    status_code=status.HTTP_200_OK
+)
+async def get_inbox(
+    db: AsyncSession = Depends(get_uow),
+    current_user: User = Depends(get_current_user_from_token)
+) -> list[ShowConversation]:
+    return await _get_inbox(current_user, db)
+
+
+@router.post(
+    "/{username}",
+    description="Send a direct message to the user",
+    response_model=ShowDirectMessage,
+    status_code=status.HTTP_201_CREATED
+)
+async def send_direct_message(
+    username: str,
+    body: CreateDirectMessage,
+    db: AsyncSession = Depends(get_uow),
+    current_user: User = Depends(get_current_user_from_token)
+) -> ShowDirectMessage:
+    recipient = await _get_user_by_username(username, db)
+    if recipient is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with username {username} not found"
+        )
+    if recipient.id == current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You cannot send messages to yourself"
+        )
+    return await _send_direct_message(
+        current_user,
+        recipient,
+        body.message,
+        db
+    )
+
+
+@router.get(
+    "/{username}",
+    description="Get messages of my conversation with the user",
+    response_model=list[ShowDirectMessage],
+    status_code=status.HTTP_200_OK
+)
+async def get_direct_messages(
+    username: str,
+    before_id: int | None = None,
+    limit: int = Query(default=50, ge=0, le=500),
+    db: AsyncSession = Depends(get_uow),
+    current_user: User = Depends(get_current_user_from_token)
+) -> list[ShowDirectMessage]:
+    other_user = await _get_user_by_username(username, db)
+    if other_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with username {username} not found"
+        )
+    return await _get_direct_messages(
+        current_user,
+        other_user,
+        before_id,
+        limit,
+        db
+    )
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, Query, status
+
+from app.config import settings
+from app.db.postgres.models import User
+from app.schemas.notification import (
+    NOTIFICATION_CURSOR_REGEX,
+    NotificationPage
+)
+from app.services.notification import (
+    _get_notifications,
+    _mark_notifications_read
+)
+from app.services.oauth2 import get_current_user_from_token
+from app.utils.responses import ModelResponseRoute, ORJSONModelResponse
+
+router = APIRouter(
+    prefix="/notification",
+    tags=["Notification"],
+    route_class=ModelResponseRoute
+)
+
+
+@router.get(
+    "",
+    description="Get my notifications, newest first",
+    response_model=NotificationPage,
+    response_class=ORJSONModelResponse,
+    status_code=status.HTTP_200_OK
+)
+async def get_notifications(
+    before: str | None = Query(
+        default=None,
+        regex=NOTIFICATION_CURSOR_REGEX,
+        description="next_cursor of the previous page"
+    ),
+    limit: int = Query(
+        default=20, ge=1, le=settings.NOTIFICATIONS_PAGE_LIMIT
+    ),
+    current_user: User = Depends(get_current_user_from_token)
+) -> NotificationPage:
+    return await _get_notifications(current_user.id, before, limit)
+
+
+@router.post(
+    "/read",
+    description="Mark my notifications as read",
+    status_code=status.HTTP_200_OK
+)
+async def mark_notifications_read(
+    current_user: User = Depends(get_current_user_from_token)
+) -> int:
+    return await _mark_notifications_read(current_user.id)
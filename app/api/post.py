@@ -5,24 +5,38 @@ from fastapi_cache.decorator import cache
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.postgres.connection import get_db
 from app.db.postgres.models import User
-from app.schemas.post import CreatePost, UpdatePost, ShowPost, PostReaction
+from app.db.postgres.unit_of_work import get_uow
+from app.schemas.post import (
+    CreatePost,
+    PageRequest,
+    PostReaction,
+    ShowPost,
+    UpdatePost
+)
 from app.services.oauth2 import get_current_user_from_token
 from app.services.post import (
     _create_new_post,
     _delete_post,
     _get_post_by_id,
+    _get_post_owner_id,
     _get_all_posts_by_title,
+    _get_trending_posts,
     _update_post,
     _restore_post,
+    _is_post_published,
     _add_reaction_to_post,
     _remove_reaction_from_post
 )
+from app.utils.responses import ModelResponseRoute, ORJSONModelResponse
 
 logger = getLogger(__name__)
 
-router = APIRouter(prefix="/post", tags=["Post (articles)"])
+router = APIRouter(
+    prefix="/post",
+    tags=["Post (articles)"],
+    route_class=ModelResponseRoute
+)
 
 
 @router.post(
@@ -33,7 +47,7 @@ router = APIRouter(prefix="/post", tags=["Post (articles)"])
 )
 async def create_post(
     body: CreatePost,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_uow),
     current_user: User = Depends(get_current_user_from_token)
 ) -> ShowPost:
     try:
@@ -47,16 +61,32 @@ async def create_post(
     return new_post
 
 
+@router.get(
+    "/trending",
+    description="Get posts with the most reactions lately",
+    response_model=list[ShowPost],
+    response_class=ORJSONModelResponse,
+    status_code=status.HTTP_200_OK
+)
+@cache(expire=10)
+async def get_trending_posts(
+    page: PageRequest = Depends(),
+    db: AsyncSession = Depends(get_uow)
+) -> list[ShowPost]:
+    return await _get_trending_posts(page, db)
+
+
 @router.get(
     "/{id}",
     description="Get post by id",
     response_model=ShowPost,
+    response_class=ORJSONModelResponse,
     status_code=status.HTTP_200_OK
 )
 @cache(expire=10)
 async def get_post(
     post_id: int,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_uow)
 ) -> ShowPost:
     post = await _get_post_by_id(post_id, db)
     if post is None:
@@ -71,12 +101,13 @@ async def get_post(
     "/posts/{title}",
     description="Get a list of all posts with this name",
     response_model=list[ShowPost],
+    response_class=ORJSONModelResponse,
     status_code=status.HTTP_200_OK
 )
 @cache(expire=10)
 async def get_all_posts_by_title(
     title: str,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_uow)
 ) -> list[ShowPost]:
     posts = await _get_all_posts_by_title(title, db)
     return posts
@@ -86,11 +117,12 @@ async def get_all_posts_by_title(
     "/",
     description="Update post",
     response_model=ShowPost,
+    response_class=ORJSONModelResponse,
     status_code=status.HTTP_200_OK
 )
 async def update_post(
     body: UpdatePost,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_uow),
     current_user: User = Depends(get_current_user_from_token)
 ) -> ShowPost:
     updated_post_params = body.dict(exclude_none=True)
@@ -130,11 +162,12 @@ async def update_post(
     "/{id}",
     description="Delete post",
     response_model=ShowPost,
+    response_class=ORJSONModelResponse,
     status_code=status.HTTP_200_OK
 )
 async def delete_post(
     post_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_uow),
     current_user: User = Depends(get_current_user_from_token)
 ) -> ShowPost:
     post_to_delete = await _get_post_by_id(post_id, db)
@@ -156,11 +189,12 @@ async def delete_post(
     "/restore/{id}",
     description="Restore post",
     response_model=ShowPost,
+    response_class=ORJSONModelResponse,
     status_code=status.HTTP_200_OK
 )
 async def restore_post(
     post_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_uow),
     current_user: User = Depends(get_current_user_from_token)
 ) -> ShowPost:
     post_to_restore = await _restore_post(post_id, current_user.id, db)
@@ -180,16 +214,16 @@ async def restore_post(
 async def add_reaction_to_post(
     reaction: PostReaction,
     post_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_uow),
     current_user: User = Depends(get_current_user_from_token),
 ) -> str:
-    post = await _get_post_by_id(post_id, db)
-    if post is None:
+    owner_id = await _get_post_owner_id(post_id, db)
+    if owner_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Post with id {post_id} not found."
         )
-    await _add_reaction_to_post(post_id, current_user.id, reaction)
+    await _add_reaction_to_post(post_id, owner_id, current_user.id, reaction)
     return f"Reaction {reaction.value} was added to post with id {post_id}"
 
 
@@ -201,11 +235,10 @@ async def add_reaction_to_post(
 async def remove_reaction_from_post(
     reaction: PostReaction,
     post_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_uow),
     current_user: User = Depends(get_current_user_from_token)
 ) -> str:
-    post = await _get_post_by_id(post_id, db)
-    if post is None:
+    if not await _is_post_published(post_id, db):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Post with id {post_id} not found."
@@ -1,24 +1,29 @@
 from logging import getLogger
+from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi_cache.decorator import cache
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.postgres.connection import get_db
-from app.db.postgres.models import User
-from app.schemas.user import CreateUser, UpdateUser, ShowUser
+from app.db.postgres.models import RegistrationStatus, User
+from app.db.postgres.unit_of_work import get_uow
+from app.schemas.user import (
+    CreateUser,
+    ShowRegistration,
+    ShowUser,
+    UpdateUser
+)
 from app.services.oauth2 import get_current_user_from_token
 from app.services.user import (
     _create_new_user,
     _delete_user_by_email,
+    _get_registration_status,
     _get_user_by_email,
     _get_user_by_username,
     _update_user,
     check_user_permissions
 )
-from app.utils.celery.worker import verify_email_for_registration
-
 logger = getLogger(__name__)
 
 router = APIRouter(prefix="/user", tags=["User"])
@@ -26,23 +31,17 @@ router = APIRouter(prefix="/user", tags=["User"])
 
 @router.post(
     "/registration",
-    description="Registration",
-    response_model=ShowUser,
-    status_code=status.HTTP_201_CREATED
+    description="Registration, the user is activated "
+                "after the email verification",
+    response_model=ShowRegistration,
+    status_code=status.HTTP_202_ACCEPTED
 )
 async def create_user(
     body: CreateUser,
-    db: AsyncSession = Depends(get_db)
-) -> ShowUser:
+    db: AsyncSession = Depends(get_uow)
+) -> ShowRegistration:
     try:
-        is_verified_email = verify_email_for_registration.delay(body.email)
-        if is_verified_email:
-            new_user = await _create_new_user(body, db)
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You have not verified your email"
-            )
+        new_user = await _create_new_user(body, db)
     except IntegrityError as err:
         logger.error(err)
         raise HTTPException(
@@ -52,6 +51,25 @@ async def create_user(
     return new_user
 
 
+@router.get(
+    "/registration/{user_id}",
+    description="Get the registration status",
+    response_model=RegistrationStatus,
+    status_code=status.HTTP_200_OK
+)
+async def get_registration_status(
+    user_id: UUID,
+    db: AsyncSession = Depends(get_uow)
+) -> RegistrationStatus:
+    registration_status = await _get_registration_status(user_id, db)
+    if registration_status is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with id {user_id} not found."
+        )
+    return registration_status
+
+
 @router.get(
     "/{username}",
     description="Get information about a user by username",
@@ -61,7 +79,7 @@ async def create_user(
 @cache(expire=120)
 async def get_user(
     username: str,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_uow)
 ) -> ShowUser:
     user = await _get_user_by_username(username, db)
     if user is None:
@@ -80,7 +98,7 @@ async def get_user(
 )
 async def update_user(
     body: UpdateUser,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_uow),
     current_user: User = Depends(get_current_user_from_token)
 ) -> ShowUser:
     updated_user_params = body.dict(exclude_none=True)
@@ -127,7 +145,7 @@ async def update_user(
 )
 async def delete_user(
     email: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_uow),
     current_user: User = Depends(get_current_user_from_token)
 ) -> ShowUser:
     user_to_delete = await _get_user_by_email(email, db)
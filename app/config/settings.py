@@ -43,6 +43,74 @@ class DefaultSettings(BaseSettings):
     def broker_url(self):
         return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}"
 
+    CELERY_RESULT_BACKEND: str | None = None  # results are not stored
+    CELERY_POOL: str = "prefork"  # prefork, threads, gevent or solo
+    CELERY_CONCURRENCY: int | None = None  # defaults to the CPUs amount
+    # tasks reserved per process, 1 keeps long tasks from starving others
+    CELERY_PREFETCH_MULTIPLIER: int = 1
+    # tasks are acked after they ran, lost ones are redelivered
+    CELERY_ACKS_LATE: bool = True
+    CELERY_TASK_QUEUES: dict[str, str] = {
+        "verify_registration": "registration",
+        "fan_out_post": "feed",
+        "remove_post_from_timelines": "feed",
+        "rebuild_follow_graph": "maintenance",
+        "repair_user_counters": "maintenance",
+        "compute_follow_suggestions": "maintenance",
+        "decay_trending_posts": "maintenance",
+        "relay_outbox": "outbox",
+        "flush_notification_digest": "notifications",
+    }
+    CELERY_METRICS_PORT: int | None = 9808  # worker metrics exporter
+    CELERY_BATCH_SIZE: int = 100  # small jobs per task execution
+    CELERY_BATCH_INTERVAL: float = 1.0  # seconds a small job may wait
+
+    OUTBOX_RELAY_INTERVAL: int = 5  # seconds, services also nudge it
+    OUTBOX_BATCH_SIZE: int = 500  # events per relay transaction
+    EVENTS_STREAM_MAX_LENGTH: int = 100_000  # about, events kept
+
+    NOTIFICATIONS_MAX_LENGTH: int = 1_000  # about, entries kept per user
+    # seconds identical events are coalesced into one digest entry
+    NOTIFICATIONS_DIGEST_WINDOW: int = 60
+    NOTIFICATIONS_PAGE_LIMIT: int = 100
+    # seconds ids of notified outbox events are kept to skip their replays
+    NOTIFICATIONS_EVENT_DEDUPE_TTL: int = 24 * 60 * 60
+
+    FOLLOW_GRAPH_RECONCILE_INTERVAL: int = 60 * 60  # seconds
+    USER_COUNTERS_REPAIR_INTERVAL: int = 60 * 60  # seconds
+    FOLLOW_SUGGESTIONS_INTERVAL: int = 6 * 60 * 60  # seconds
+    FOLLOW_SUGGESTIONS_LIMIT: int = 50
+
+    FEED_TIMELINE_LENGTH: int = 800  # post ids kept per user
+    FEED_FAN_OUT_BATCH_SIZE: int = 1_000  # timelines per redis pipeline
+    # posts of accounts with more followers are pulled at read time
+    FEED_CELEBRITY_FOLLOWERS_THRESHOLD: int = 10_000
+
+    TRENDING_DECAY_INTERVAL: int = 10 * 60  # seconds
+    TRENDING_HALF_LIFE: int = 6 * 60 * 60  # seconds
+    TRENDING_MIN_SCORE: float = 0.05  # decayed below it, posts are dropped
+    TRENDING_MAX_POSTS: int = 10_000
+
+    CHAT_SEND_QUEUE_SIZE: int = 100  # messages per connection
+    CHAT_SEEN_MESSAGES_SIZE: int = 10_000  # ids remembered for dedupe
+    CHAT_FLUSH_SIZE: int = 500  # messages per INSERT
+    CHAT_FLUSH_INTERVAL: float = 1.0  # seconds
+    CHAT_BUFFER_MAX_SIZE: int = 10_000  # messages waiting for a flush
+    # failed flushes in a row before messages are written one by one
+    CHAT_FLUSH_MAX_RETRIES: int = 3
+    CHAT_HISTORY_SIZE: int = 100  # recent messages kept in redis
+    CHAT_DRAIN_TIMEOUT: float = 5.0  # seconds to send queued messages
+    CHAT_RECONNECT_MIN_DELAY: float = 1.0  # seconds
+    CHAT_RECONNECT_MAX_DELAY: float = 30.0  # seconds
+
+    PRESENCE_TTL: int = 60  # seconds without heartbeats until offline
+    PRESENCE_HEARTBEAT_INTERVAL: int = 20  # seconds
+    PRESENCE_BROADCAST_INTERVAL: float = 1.0  # seconds
+    PRESENCE_LOOKUP_LIMIT: int = 100  # user ids per request
+
+    COMPRESSION_MINIMUM_SIZE: int = 500  # bytes
+    COMPRESSION_EXCLUDED_PATHS: list[str] = ["/metrics"]
+
     class Config:
         env_file = ".env"
 
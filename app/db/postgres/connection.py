@@ -1,5 +1,6 @@
 from typing import AsyncGenerator
 
+from sqlalchemy import create_engine
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy_utils import create_database, database_exists
@@ -20,6 +21,10 @@ async_session = sessionmaker(
     class_=AsyncSession
 )
 
+# for celery tasks, which run outside of the event loop
+sync_engine = create_engine(url=settings.database_url, pool_pre_ping=True)
+sync_session = sessionmaker(bind=sync_engine, expire_on_commit=False)
+
 
 if not database_exists(url=settings.database_url):
     create_database(url=settings.database_url)
@@ -0,0 +1,77 @@
+from functools import wraps
+from typing import Any, Callable
+
+from prometheus_client import Counter
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import ORMExecuteState, Session
+
+MEMO_HITS_HEADER = "X-DB-Memo-Hits"
+
+memo_lookups = Counter(
+    "db_memo_lookups_total",
+    "CRUD getter lookups, hits are served from the session memo",
+    ["getter", "result"],
+)
+
+
+class Memo:
+    """
+    Entities looked up through a session, keyed by
+    (model, attribute, value). A found entity is stored under
+    all of its lookup attributes, so a user found by email is also
+    a hit by id or username. Any write through the session clears
+    the entries, hits and misses are kept for the whole session.
+    """
+
+    def __init__(self):
+        self.entries: dict[tuple, Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries.clear()
+
+
+def get_memo(session: Session | AsyncSession) -> Memo:
+    return session.info.setdefault("memo", Memo())
+
+
+@event.listens_for(Session, "do_orm_execute")
+def clear_memo_on_write(orm_execute_state: ORMExecuteState):
+    if not orm_execute_state.is_select:
+        get_memo(orm_execute_state.session).clear()
+
+
+@event.listens_for(Session, "after_flush")
+def clear_memo_on_flush(session: Session, flush_context):
+    get_memo(session).clear()
+
+
+def memoized(model: type, attribute: str, aliases: tuple[str, ...] = ()):
+    """
+    Memoizes a CRUD getter of one `model` by `attribute`. `aliases`
+    are the other attributes the getter's filter holds for as well.
+    """
+    def decorator(getter: Callable) -> Callable:
+        name = getter.__qualname__
+
+        @wraps(getter)
+        async def wrapper(self, value):
+            memo = get_memo(self.db_session)
+            key = (model.__name__, attribute, value)
+            if key in memo.entries:
+                memo.hits += 1
+                memo_lookups.labels(getter=name, result="hit").inc()
+                return memo.entries[key]
+            memo.misses += 1
+            memo_lookups.labels(getter=name, result="miss").inc()
+            entity = await getter(self, value)
+            memo.entries[key] = entity
+            if entity is not None:
+                for alias in aliases:
+                    alias_key = (model.__name__, alias, getattr(entity, alias))
+                    memo.entries[alias_key] = entity
+            return entity
+        return wrapper
+    return decorator
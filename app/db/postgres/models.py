@@ -3,16 +3,19 @@ from enum import Enum
 
 from sqlalchemy import (
     ARRAY,
+    BigInteger,
     Boolean,
     Column,
     ForeignKey,
+    Index,
     Integer,
     String,
     text,
-    TIMESTAMP
+    TIMESTAMP,
+    UniqueConstraint
 )
 from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import TEXT, UUID
+from sqlalchemy.dialects.postgresql import JSONB, TEXT, UUID
 
 from app.db.postgres.connection import Base
 
@@ -23,6 +26,21 @@ class PortalRole(str, Enum):
     ROLE_PORTAL_SUPERADMIN = "ROLE_PORTAL_SUPERADMIN"
 
 
+class RegistrationStatus(str, Enum):
+    PENDING = "PENDING"
+    VERIFIED = "VERIFIED"
+    REJECTED = "REJECTED"
+
+
+class OutboxEventType(str, Enum):
+    USER_REGISTERED = "user_registered"
+    USER_DELETED = "user_deleted"
+    USER_FOLLOWED = "user_followed"
+    USER_UNFOLLOWED = "user_unfollowed"
+    POST_PUBLISHED = "post_published"
+    POST_DELETED = "post_deleted"
+
+
 class BaseAlchemyModel(Base):
     __abstract__ = True
 
@@ -49,7 +67,30 @@ class User(BaseAlchemyModel):
     email = Column(String(255), unique=True, nullable=False, index=True)
     password = Column(String(255), nullable=False)
     is_active = Column(Boolean, default=True)
+    registration_status = Column(
+        String(16),
+        nullable=False,
+        server_default=RegistrationStatus.VERIFIED.value
+    )
     roles = Column(ARRAY(String), nullable=False)
+    followers_count = Column(
+        Integer,
+        default=0,
+        server_default="0",
+        nullable=False
+    )
+    following_count = Column(
+        Integer,
+        default=0,
+        server_default="0",
+        nullable=False
+    )
+    posts_count = Column(
+        Integer,
+        default=0,
+        server_default="0",
+        nullable=False
+    )
     posts = relationship("Post", back_populates="owner")
 
     @property
@@ -79,27 +120,126 @@ class Post(BaseAlchemyModel):
     owner_id = Column(
         UUID(as_uuid=True),
         ForeignKey("users.id", ondelete="CASCADE"),
-        nullable=False
+        nullable=False,
+        index=True
     )
     owner = relationship("User", back_populates="posts")
 
 
 class Follower(Base):
     __tablename__ = "follows"
+    __table_args__ = (
+        UniqueConstraint(
+            "user_id",
+            "follower_id",
+            name="uq_follows_user_id_follower_id"
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(
         UUID(as_uuid=True),
-        ForeignKey("users.id", ondelete="CASCADE")
+        ForeignKey("users.id", ondelete="CASCADE"),
+        index=True
     )
     follower_id = Column(
         UUID(as_uuid=True),
-        ForeignKey("users.id", ondelete="CASCADE")
+        ForeignKey("users.id", ondelete="CASCADE"),
+        index=True
     )
 
 
+class ChatRoom(BaseAlchemyModel):
+    __tablename__ = "chat_rooms"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(64), unique=True, nullable=False)
+
+
 class Message(BaseAlchemyModel):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_room_id_id", "room_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     message = Column(TEXT)
+    room_id = Column(
+        Integer,
+        ForeignKey("chat_rooms.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    sender_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="SET NULL"),
+        nullable=True
+    )
+
+
+class Conversation(BaseAlchemyModel):
+    __tablename__ = "conversations"
+
+    id = Column(Integer, primary_key=True)
+    # "<smaller user id>:<greater user id>" of a one-to-one conversation
+    members_key = Column(String(73), unique=True, nullable=False)
+    last_message_id = Column(Integer, nullable=True)
+
+
+class ConversationMember(Base):
+    __tablename__ = "conversation_members"
+
+    conversation_id = Column(
+        Integer,
+        ForeignKey("conversations.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    user_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True
+    )
+    unread_count = Column(
+        Integer,
+        default=0,
+        server_default="0",
+        nullable=False
+    )
+
+
+class DirectMessage(BaseAlchemyModel):
+    __tablename__ = "direct_messages"
+    __table_args__ = (
+        Index(
+            "ix_direct_messages_conversation_id_id",
+            "conversation_id",
+            "id"
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    conversation_id = Column(
+        Integer,
+        ForeignKey("conversations.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    sender_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="SET NULL"),
+        nullable=True
+    )
+    message = Column(TEXT, nullable=False)
+
+
+class OutboxEvent(Base):
+    """Domain event written in the transaction of the change it describes"""
+    __tablename__ = "outbox"
+
+    id = Column(BigInteger, primary_key=True)
+    event_type = Column(String(64), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    created_at = Column(
+        TIMESTAMP(timezone=True),
+        nullable=False,
+        server_default=text("now()")
+    )
@@ -0,0 +1,180 @@
+import inspect
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable
+
+from fastapi import Request
+from prometheus_client import Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.db.postgres.connection import async_session
+from app.db.postgres.memo import MEMO_HITS_HEADER, get_memo
+
+READ_ONLY_METHODS = frozenset({"GET", "HEAD"})
+ROUND_TRIPS_HEADER = "X-DB-Round-Trips"
+
+db_round_trips_per_request = Histogram(
+    "db_round_trips_per_request",
+    "Statements, BEGINs and COMMITs sent to the database per request",
+    ["method"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+
+
+class RoundTrips:
+    def __init__(self):
+        self.value = 0
+
+
+_round_trips: ContextVar[RoundTrips | None] = ContextVar(
+    "round_trips", default=None
+)
+
+
+def _is_autocommit(conn: Connection) -> bool:
+    options = conn.get_execution_options()
+    return options.get("isolation_level") == "AUTOCOMMIT"
+
+
+def _count_statement(conn: Connection, *args):
+    round_trips = _round_trips.get()
+    if round_trips is not None:
+        round_trips.value += 1
+
+
+def _count_transaction_command(conn: Connection, *args):
+    if not _is_autocommit(conn):
+        _count_statement(conn)
+
+
+def count_round_trips(engine: AsyncEngine):
+    """Counts round trips of requests served by UnitOfWorkMiddleware"""
+    sync_engine = engine.sync_engine
+    if event.contains(sync_engine, "before_cursor_execute", _count_statement):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _count_statement)
+    for name in ("begin", "commit", "rollback"):
+        event.listen(sync_engine, name, _count_transaction_command)
+
+
+class UnitOfWork:
+    """
+    Session of one request. The transaction begins with the first
+    query, UnitOfWorkMiddleware commits it once before the response
+    starts or rolls it back when the request failed.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self._after_commit: list[Callable[[], Awaitable | Any]] = []
+        session.info["unit_of_work"] = self
+
+    def after_commit(self, callback: Callable[[], Awaitable | Any]):
+        self._after_commit.append(callback)
+
+    async def commit(self):
+        await self.session.commit()
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            res = callback()
+            if inspect.isawaitable(res):
+                await res
+
+    async def rollback(self):
+        self._after_commit.clear()
+        await self.session.rollback()
+
+    async def close(self):
+        self._after_commit.clear()
+        self.session.info.pop("memo", None)
+        await self.session.close()
+
+
+def after_commit(db: AsyncSession, callback: Callable[[], Awaitable | Any]):
+    """
+    Defers side effects which must see the committed data,
+    such as nudging the outbox relay. They are dropped on rollback.
+    """
+    unit_of_work: UnitOfWork | None = db.info.get("unit_of_work")
+    if unit_of_work is None:
+        raise RuntimeError("The session doesn't belong to a unit of work")
+    unit_of_work.after_commit(callback)
+
+
+def unit_of_work_dependency(
+    session_factory: sessionmaker
+) -> Callable[[Request], Awaitable[AsyncSession]]:
+    """
+    Builds the request session dependency. Sessions of read-only
+    requests run in AUTOCOMMIT, so they skip BEGIN and COMMIT.
+    """
+    engine: AsyncEngine = session_factory.kw["bind"]
+    read_only_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+    count_round_trips(engine)
+
+    async def get_uow(request: Request) -> AsyncSession:
+        bind = (
+            read_only_engine if request.method in READ_ONLY_METHODS
+            else engine
+        )
+        unit_of_work = UnitOfWork(session_factory(bind=bind))
+        request.state.unit_of_work = unit_of_work
+        return unit_of_work.session
+
+    return get_uow
+
+
+get_uow = unit_of_work_dependency(async_session)
+
+
+class UnitOfWorkMiddleware:
+    """
+    Finishes the unit of work of a request before the response
+    starts: errors of the commit still become a 500 and clients
+    never read data which isn't committed yet. Round trips and
+    memo hits of the request are reported in the X-DB-Round-Trips
+    and X-DB-Memo-Hits headers.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        round_trips = RoundTrips()
+        token = _round_trips.set(round_trips)
+        state = scope.setdefault("state", {})
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                unit_of_work: UnitOfWork | None = state.get("unit_of_work")
+                if unit_of_work is not None:
+                    if message["status"] < 400:
+                        await unit_of_work.commit()
+                    else:
+                        await unit_of_work.rollback()
+                    headers.append(
+                        MEMO_HITS_HEADER,
+                        str(get_memo(unit_of_work.session).hits)
+                    )
+                headers.append(ROUND_TRIPS_HEADER, str(round_trips.value))
+                db_round_trips_per_request.labels(
+                    method=scope["method"]
+                ).observe(round_trips.value)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            unit_of_work = state.get("unit_of_work")
+            if unit_of_work is not None:
+                await unit_of_work.close()
+            _round_trips.reset(token)
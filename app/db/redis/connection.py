@@ -1,5 +1,9 @@
+from redis import Redis as SyncRedis
 from redis.asyncio import Redis
 
 from app.config import settings
 
 redis = Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+
+# for celery tasks, which run outside of the event loop
+sync_redis = SyncRedis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
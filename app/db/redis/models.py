@@ -1,3 +1,4 @@
+from typing import ClassVar
 from uuid import UUID
 
 from pydantic import BaseModel
@@ -6,6 +7,12 @@ from app.schemas.post import PostReaction
 
 
 class PostReactionRedisSet(BaseModel):
+    TRENDING_KEY: ClassVar[str] = "Post:trending"
+    TRENDING_WEIGHTS: ClassVar[dict[PostReaction, float]] = {
+        PostReaction.LIKE: 1.0,
+        PostReaction.DISLIKE: -0.5,
+    }
+
     post_id: int | None = None
     user_id: UUID | None = None
     reaction: PostReaction | None = None
@@ -16,8 +23,150 @@ class PostReactionRedisSet(BaseModel):
             raise ValueError("Can't create key: check post_id or reaction")
         return f"Post:{self.post_id} Reaction:{self.reaction.value}"
 
+    @property
+    def trending_weight(self):
+        if self.reaction is None:
+            raise ValueError("Can't get weight: reaction is null")
+        return self.TRENDING_WEIGHTS[self.reaction]
+
+    @property
+    def value(self):
+        if self.user_id is None:
+            raise ValueError("Can't create value: user_id is null")
+        return str(self.user_id)
+
+
+class FollowRedisSet(BaseModel):
+    KEY_PATTERNS: ClassVar[tuple[str, ...]] = (
+        "User:* Followers",
+        "User:* Following",
+    )
+    BUILT_MARKER_KEY: ClassVar[str] = "FollowGraph:built"
+    # "<user id>:<follower id>" of follows changed since the last rebuild
+    CHANGES_KEY: ClassVar[str] = "FollowGraph:changes"
+
+    user_id: UUID | None = None
+
+    @property
+    def followers_key(self):
+        if self.user_id is None:
+            raise ValueError("Can't create key: user_id is null")
+        return f"User:{self.user_id} Followers"
+
+    @property
+    def following_key(self):
+        if self.user_id is None:
+            raise ValueError("Can't create key: user_id is null")
+        return f"User:{self.user_id} Following"
+
+    def change(self, follower_id: UUID) -> str:
+        return f"{self.value}:{follower_id}"
+
+    @property
+    def suggestions_key(self):
+        if self.user_id is None:
+            raise ValueError("Can't create key: user_id is null")
+        return f"User:{self.user_id} Suggestions"
+
     @property
     def value(self):
         if self.user_id is None:
             raise ValueError("Can't create value: user_id is null")
         return str(self.user_id)
+
+
+class TimelineRedisSortedSet(BaseModel):
+    CELEBRITIES_KEY: ClassVar[str] = "Feed:celebrities"
+
+    user_id: UUID | None = None
+    post_id: int | None = None
+
+    @property
+    def key(self):
+        if self.user_id is None:
+            raise ValueError("Can't create key: user_id is null")
+        return f"User:{self.user_id} Timeline"
+
+    @property
+    def posts_key(self):
+        if self.user_id is None:
+            raise ValueError("Can't create key: user_id is null")
+        return f"User:{self.user_id} Posts"
+
+    @property
+    def value(self):
+        if self.post_id is None:
+            raise ValueError("Can't create value: post_id is null")
+        return str(self.post_id)
+
+
+class ChatRedisChannel(BaseModel):
+    CHANNEL_PATTERN: ClassVar[str] = "Chat:*"
+
+    room: str = "public"
+
+    @property
+    def key(self):
+        return f"Chat:{self.room}"
+
+    @property
+    def history_key(self):
+        return f"Chat:{self.room} Recent"
+
+
+class PresenceRedisKey(BaseModel):
+    user_id: UUID | None = None
+
+    @property
+    def key(self):
+        if self.user_id is None:
+            raise ValueError("Can't create key: user_id is null")
+        return f"User:{self.user_id} Presence Workers"
+
+
+class EventRedisStream(BaseModel):
+    """Domain events relayed from the outbox, capped by length"""
+    KEY: ClassVar[str] = "Events"
+
+    event_id: int | None = None
+
+    @property
+    def notified_key(self):
+        if self.event_id is None:
+            raise ValueError("Can't create key: event_id is null")
+        return f"Events:{self.event_id} notified"
+
+
+class NotificationRedisStream(BaseModel):
+    """
+    Notifications of a user, capped by length. Identical events
+    are counted in digest hashes until the digest is flushed
+    to the stream as one entry.
+    """
+    user_id: UUID | None = None
+
+    @property
+    def key(self):
+        if self.user_id is None:
+            raise ValueError("Can't create key: user_id is null")
+        return f"User:{self.user_id} Notifications"
+
+    @property
+    def unread_key(self):
+        if self.user_id is None:
+            raise ValueError("Can't create key: user_id is null")
+        return f"User:{self.user_id} Notifications:unread"
+
+    def digest_key(self, notification_type: str, target: str):
+        if self.user_id is None:
+            raise ValueError("Can't create key: user_id is null")
+        return (
+            f"User:{self.user_id} Notifications:digest"
+            f":{notification_type}:{target}"
+        )
+
+
+class PublishedPostRedisBitmap(BaseModel):
+    """Bit per post id, set while the post is published"""
+    KEY: ClassVar[str] = "Post:published"
+    MAX_POST_ID: ClassVar[int] = 2 ** 32 - 1  # the largest bit offset
@@ -6,7 +6,14 @@ from fastapi_cache.backends.redis import RedisBackend
 from starlette_exporter import handle_metrics, PrometheusMiddleware
 
 from app.api import main_api_router
+from app.config import settings
+from app.db.postgres.unit_of_work import UnitOfWorkMiddleware
 from app.db.redis.connection import redis
+from app.services.chat import manager as chat_manager
+from app.services.crud import FollowGraphCRUD
+from app.services.presence import presence
+from app.utils.celery.worker import rebuild_follow_graph
+from app.utils.compression import CompressionMiddleware
 
 app = FastAPI()
 
@@ -17,6 +24,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    excluded_paths=settings.COMPRESSION_EXCLUDED_PATHS,
+)
+app.add_middleware(UnitOfWorkMiddleware)
 app.add_middleware(PrometheusMiddleware)
 
 app.add_route("/metrics", handle_metrics)
@@ -26,7 +39,26 @@ app.include_router(main_api_router)
 @app.on_event("startup")
 async def startup_event():
     FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+    if not await FollowGraphCRUD.is_built():
+        rebuild_follow_graph.delay()
+    await chat_manager.start()
+    await presence.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await chat_manager.drain()
+    try:
+        await presence.stop()
+    finally:
+        await chat_manager.stop()
 
 
 if __name__ == "__main__":
-    uvicorn.run(app="main:app", host="0.0.0.0", port=8080, reload=True)
+    uvicorn.run(
+        app="main:app",
+        host="0.0.0.0",
+        port=8080,
+        reload=True,
+        ws_per_message_deflate=True
+    )
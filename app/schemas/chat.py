@@ -1,5 +1,7 @@
 from pydantic import BaseModel
 
+ROOM_NAME_REGEX = r"^[\w-]{1,64}$"
+
 
 class ShowMessage(BaseModel):
     id: int
@@ -0,0 +1,27 @@
+from datetime import datetime
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+
+class CreateDirectMessage(BaseModel):
+    message: str = Field(min_length=1, max_length=4096)
+
+
+class ShowDirectMessage(BaseModel):
+    id: int
+    conversation_id: int
+    sender_id: UUID | None
+    message: str
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class ShowConversation(BaseModel):
+    conversation_id: int
+    username: str
+    unread_count: int
+    last_message: str | None
+    updated_at: datetime
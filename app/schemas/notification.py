@@ -0,0 +1,28 @@
+from datetime import datetime
+from enum import Enum
+from uuid import UUID
+
+from pydantic import BaseModel
+
+NOTIFICATION_CURSOR_REGEX = r"^\d+-\d+$"
+
+
+class NotificationType(str, Enum):
+    FOLLOW = "follow"
+    LIKE = "like"
+    DISLIKE = "dislike"
+
+
+class ShowNotification(BaseModel):
+    id: str
+    type: NotificationType
+    target: str
+    actor_id: UUID
+    count: int
+    created_at: datetime
+
+
+class NotificationPage(BaseModel):
+    notifications: list[ShowNotification]
+    next_cursor: str | None
+    unread: int
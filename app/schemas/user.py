@@ -3,6 +3,8 @@ from uuid import UUID
 
 from pydantic import BaseModel, EmailStr, Field
 
+from app.db.postgres.models import RegistrationStatus
+
 
 class BaseUserSchema(BaseModel):
     username: str
@@ -18,6 +20,16 @@ class CreateUser(BaseUserSchema):
     password: str = Field(min_length=8)
 
 
+class ShowRegistration(BaseModel):
+    id: UUID
+    username: str
+    email: EmailStr
+    registration_status: RegistrationStatus
+
+    class Config:
+        orm_mode = True
+
+
 class UpdateUser(BaseUserSchema):
     ...
 
@@ -25,6 +37,9 @@ class UpdateUser(BaseUserSchema):
 class ShowUser(BaseUserSchema):
     id: UUID
     is_active: bool
+    followers_count: int
+    following_count: int
+    posts_count: int
 
 
 class ShowAdmin(ShowUser):
@@ -0,0 +1,744 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from logging import getLogger
+from datetime import datetime, timezone
+from typing import NamedTuple
+from uuid import UUID, uuid4
+
+import msgpack
+import orjson
+from fastapi import (
+    WebSocket,
+    WebSocketDisconnect,
+    WebSocketException,
+    status
+)
+from prometheus_client import Counter, Gauge, Histogram
+from redis.exceptions import RedisError
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.db.postgres.connection import async_session
+from app.db.postgres.models import Message
+from app.db.redis.connection import redis
+from app.db.redis.models import ChatRedisChannel
+from app.services.crud import ChatHistoryCRUD, ChatRoomCRUD, MessageCRUD
+
+logger = getLogger(__name__)
+
+chat_connections = Gauge(
+    "chat_connections",
+    "WebSocket chat connections open in this process",
+)
+chat_send_queue_depth = Gauge(
+    "chat_send_queue_depth",
+    "Chat messages waiting in outbound queues of this process",
+)
+chat_dropped_connections = Counter(
+    "chat_dropped_connections_total",
+    "Chat connections dropped because their outbound queue overflowed",
+)
+chat_buffered_messages = Gauge(
+    "chat_buffered_messages",
+    "Chat messages waiting to be written to the database",
+)
+chat_buffer_backpressure = Counter(
+    "chat_buffer_backpressure_total",
+    "Chat messages which waited for room in the full write buffer",
+)
+chat_flush_seconds = Histogram(
+    "chat_flush_seconds",
+    "Time spent writing a batch of chat messages to the database",
+)
+chat_dropped_messages = Counter(
+    "chat_dropped_messages_total",
+    "Chat messages which the database rejected on their own",
+)
+chat_failed_publishes = Counter(
+    "chat_failed_publishes_total",
+    "Chat messages delivered locally but not published to other workers",
+)
+chat_flush_batch_size = Histogram(
+    "chat_flush_batch_size",
+    "Chat messages written to the database per batch",
+    buckets=(1, 10, 50, 100, 500, 1_000, 5_000),
+)
+
+
+MSGPACK_SUBPROTOCOL = "chat.msgpack.v1"
+
+
+class ChatFrame:
+    """
+    Message delivered to chat connections. Text clients get the bare
+    message, msgpack clients get it packed together with its id, room,
+    sender and timestamp. The packed form is encoded once and shared
+    by all connections.
+    """
+
+    __slots__ = ("id", "room", "sender_id", "sent_at", "message", "_packed")
+
+    def __init__(
+        self,
+        message: str,
+        room: str | None = None,
+        sender_id: int | UUID | str | None = None,
+        id: str | None = None,
+        sent_at: float | None = None
+    ):
+        self.id = id if id is not None else uuid4().hex
+        self.room = room
+        self.sender_id = sender_id
+        self.sent_at = sent_at if sent_at is not None else time.time()
+        self.message = message
+        self._packed: bytes | None = None
+
+    @property
+    def packed(self) -> bytes:
+        if self._packed is None:
+            self._packed = msgpack.packb(self.to_payload())
+        return self._packed
+
+    def to_payload(self) -> dict:
+        return {
+            "id": self.id,
+            "room": self.room,
+            "sender": (
+                str(self.sender_id) if self.sender_id is not None else None
+            ),
+            "sent_at": self.sent_at,
+            "message": self.message,
+        }
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> "ChatFrame":
+        return cls(
+            message=payload["message"],
+            room=payload["room"],
+            sender_id=payload["sender"],
+            id=payload["id"],
+            sent_at=payload["sent_at"],
+        )
+
+
+class ChatConnection:
+    """Socket with a bounded outbound queue drained by its own writer"""
+
+    __slots__ = (
+        "websocket",
+        "user_id",
+        "room",
+        "binary",
+        "joined_at",
+        "queue",
+        "writer",
+    )
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: int | UUID | None,
+        room: str,
+        queue_size: int,
+        binary: bool = False
+    ):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.room = room
+        self.binary = binary
+        self.joined_at = datetime.now(timezone.utc)
+        self.queue: asyncio.Queue[ChatFrame] = asyncio.Queue(
+            maxsize=queue_size
+        )
+        self.writer: asyncio.Task | None = None
+
+
+def negotiate_subprotocol(websocket: WebSocket) -> str | None:
+    """Text frames stay the default unless msgpack is requested"""
+    if MSGPACK_SUBPROTOCOL in websocket.scope.get("subprotocols", ()):
+        return MSGPACK_SUBPROTOCOL
+    return None
+
+
+async def receive_message(websocket: WebSocket) -> str:
+    """
+    Text frames carry the bare message, binary frames carry
+    a msgpack map with the message under the "message" key.
+    Malformed frames close the connection with 1003.
+    """
+    data = await websocket.receive()
+    if data["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(data["code"])
+    if data.get("text") is not None:
+        return data["text"]
+    try:
+        message = msgpack.unpackb(data["bytes"])["message"]
+    except (ValueError, TypeError, KeyError, msgpack.UnpackException):
+        message = None
+    if not isinstance(message, str):
+        await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+        raise WebSocketDisconnect(status.WS_1003_UNSUPPORTED_DATA)
+    return message
+
+
+class BufferedMessage(NamedTuple):
+    room: str
+    room_id: int
+    sender_id: UUID | None
+    message: str
+    # taken on broadcast, messages without one get it on flush
+    id: int | None = None
+
+    def values(self, message_id: int) -> dict:
+        return {
+            "id": message_id,
+            "room_id": self.room_id,
+            "sender_id": self.sender_id,
+            "message": self.message,
+        }
+
+
+async def add_to_history(messages: list[tuple[int, BufferedMessage]]):
+    """Pushes messages with their ids to their rooms' recent history"""
+    rooms: dict[str, list[dict]] = {}
+    for message_id, message in messages:
+        rooms.setdefault(message.room, []).append(
+            {"id": message_id, "message": message.message}
+        )
+    try:
+        for room, room_messages in rooms.items():
+            await ChatHistoryCRUD.add_messages(
+                ChatRedisChannel(room=room),
+                room_messages
+            )
+    except RedisError as err:
+        # the database still has them for deeper scrollback
+        logger.error(err)
+
+
+class ChatMessageBuffer:
+    """
+    Write-behind buffer for chat messages. Messages are written
+    with one multi-row INSERT when `flush_size` of them piled up
+    or every `flush_interval` seconds. When `max_size` messages
+    are waiting, `add` blocks until a flush makes room.
+    Messages which got no id on broadcast are pushed to their room's
+    recent history once they are written.
+
+    A failed batch is retried with the next flush. After `max_retries`
+    failed flushes in a row its messages are written one by one,
+    the ones the database rejects are logged and dropped, so one bad
+    row doesn't stop all chat persistence.
+    """
+    def __init__(
+        self,
+        session_factory: sessionmaker = async_session,
+        flush_size: int = settings.CHAT_FLUSH_SIZE,
+        flush_interval: float = settings.CHAT_FLUSH_INTERVAL,
+        max_size: int = settings.CHAT_BUFFER_MAX_SIZE,
+        max_retries: int = settings.CHAT_FLUSH_MAX_RETRIES
+    ):
+        self.session_factory = session_factory
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.max_retries = max_retries
+        self._failed_flushes = 0
+        self._messages: list[BufferedMessage] = []
+        self._flush_needed = asyncio.Event()
+        self._has_room = asyncio.Condition()
+        self._flusher: asyncio.Task | None = None
+
+    def __len__(self):
+        return len(self._messages)
+
+    async def add(self, message: BufferedMessage):
+        if len(self._messages) >= self.max_size:
+            chat_buffer_backpressure.inc()
+            async with self._has_room:
+                await self._has_room.wait_for(
+                    lambda: len(self._messages) < self.max_size
+                )
+        self._messages.append(message)
+        chat_buffered_messages.inc()
+        if len(self._messages) >= self.flush_size:
+            self._flush_needed.set()
+
+    async def flush(self):
+        if not self._messages:
+            return
+        batch, self._messages = self._messages, []
+        try:
+            with chat_flush_seconds.time():
+                if self._failed_flushes < self.max_retries:
+                    written = await self._write_batch(batch)
+                else:
+                    written = await self._write_one_by_one(batch)
+        except Exception as err:
+            # keep the batch for the next flush
+            logger.error(err)
+            self._failed_flushes += 1
+            self._messages[:0] = batch
+            raise
+        self._failed_flushes = 0
+        chat_buffered_messages.dec(len(batch))
+        chat_flush_batch_size.observe(len(batch))
+        async with self._has_room:
+            self._has_room.notify_all()
+        await add_to_history([
+            (message_id, message) for message_id, message in written
+            if message.id is None
+        ])
+
+    @staticmethod
+    async def _assign_ids(
+        session: AsyncSession,
+        batch: list[BufferedMessage]
+    ) -> list[tuple[int, BufferedMessage]]:
+        # assigned up front, RETURNING doesn't keep VALUES order
+        missing = sum(message.id is None for message in batch)
+        reserved = iter(
+            await MessageCRUD(session).reserve_message_ids(missing)
+            if missing != 0 else ()
+        )
+        return [
+            (message.id if message.id is not None else next(reserved), message)
+            for message in batch
+        ]
+
+    async def _write_batch(
+        self,
+        batch: list[BufferedMessage]
+    ) -> list[tuple[int, BufferedMessage]]:
+        """Returns the written messages with their ids"""
+        async with self.session_factory() as session:
+            async with session.begin():
+                written = await self._assign_ids(session, batch)
+                await session.execute(
+                    insert(Message).values([
+                        message.values(message_id)
+                        for message_id, message in written
+                    ])
+                )
+        return written
+
+    async def _write_one_by_one(
+        self,
+        batch: list[BufferedMessage]
+    ) -> list[tuple[int, BufferedMessage]]:
+        written = []
+        async with self.session_factory() as session:
+            async with session.begin():
+                for message_id, message in await self._assign_ids(
+                    session, batch
+                ):
+                    try:
+                        async with session.begin_nested():
+                            await session.execute(
+                                insert(Message)
+                                .values(message.values(message_id))
+                            )
+                    except (DataError, IntegrityError) as err:
+                        chat_dropped_messages.inc()
+                        logger.error(
+                            "Dropped chat message %r: %s", message, err
+                        )
+                        continue
+                    written.append((message_id, message))
+        return written
+
+    async def start(self):
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the periodic flushes and drains what is left"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._flush_needed.wait(),
+                    timeout=self.flush_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+            try:
+                await self.flush()
+            except Exception:
+                await asyncio.sleep(self.flush_interval)
+
+
+class ConnectionManager:
+    """
+    Connections are grouped by room, rooms are created on demand.
+    Broadcast only enqueues a message for every connection of the room,
+    so a slow client never delays the others. Clients whose queue
+    overflows are disconnected with 1013 (try again later).
+
+    Connections which negotiated the msgpack subprotocol get binary
+    frames with the message metadata, the others get the bare text.
+
+    On shutdown `drain` stops accepting sockets, sends every client
+    a reconnect hint with a random delay, so clients of a restarted
+    worker don't come back all at once, and closes the connections
+    with 1012 (service restart) after their queues are sent.
+
+    Messages are also published to the room's Redis channel, every
+    worker subscribes to all rooms and delivers messages to its local
+    connections. Local connections get a message right away, its own
+    copy coming back from Redis is skipped by message id.
+    """
+    def __init__(
+        self,
+        session_factory: sessionmaker = async_session,
+        queue_size: int = settings.CHAT_SEND_QUEUE_SIZE,
+        seen_messages_size: int = settings.CHAT_SEEN_MESSAGES_SIZE
+    ):
+        self.session_factory = session_factory
+        self.queue_size = queue_size
+        self.accepting = True
+        self.active_connections: dict[WebSocket, ChatConnection] = {}
+        self.rooms: dict[str, set[ChatConnection]] = {}
+        self.users: dict[int | UUID, set[ChatConnection]] = {}
+        self._room_ids: dict[str, int] = {}
+        self._closing: set[asyncio.Task] = set()
+        self._seen_messages: OrderedDict[str, None] = OrderedDict()
+        self._seen_messages_size = seen_messages_size
+        self._pubsub = None
+        self._listener: asyncio.Task | None = None
+        self.buffer = ChatMessageBuffer(session_factory)
+
+    async def start(self):
+        if self._listener is not None:
+            return
+        await self.buffer.start()
+        self._pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.psubscribe(ChatRedisChannel.CHANNEL_PATTERN)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is None:
+            return
+        self._listener.cancel()
+        try:
+            await self._listener
+        except asyncio.CancelledError:
+            pass
+        await self._pubsub.close()
+        self._listener, self._pubsub = None, None
+        await self.buffer.stop()
+
+    async def drain(
+        self,
+        timeout: float = settings.CHAT_DRAIN_TIMEOUT,
+        min_delay: float = settings.CHAT_RECONNECT_MIN_DELAY,
+        max_delay: float = settings.CHAT_RECONNECT_MAX_DELAY
+    ):
+        self.accepting = False
+        connections = list(self.active_connections.values())
+        for connection in connections:
+            hint = {
+                "type": "reconnect",
+                "delay": round(random.uniform(min_delay, max_delay), 3),
+            }
+            self._enqueue(
+                connection,
+                ChatFrame(orjson.dumps(hint).decode(), connection.room)
+            )
+        # overflowed connections were dropped by _enqueue
+        connections = [
+            connection for connection in connections
+            if connection.websocket in self.active_connections
+        ]
+        if len(connections) != 0:
+            sent = [
+                asyncio.create_task(connection.queue.join())
+                for connection in connections
+            ]
+            _, pending = await asyncio.wait(sent, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        try:
+            await self.buffer.flush()
+        except Exception:
+            # flush logged the error, the batch is retried on stop
+            pass
+        for connection in connections:
+            self.disconnect(connection.websocket)
+        await asyncio.gather(
+            *[
+                connection.websocket.close(
+                    code=status.WS_1012_SERVICE_RESTART
+                )
+                for connection in connections
+            ],
+            return_exceptions=True
+        )
+
+    async def get_room_id(self, room: str) -> int:
+        room_id = self._room_ids.get(room)
+        if room_id is None:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    room_crud = ChatRoomCRUD(session)
+                    room_id = await room_crud.get_or_create_room(room)
+            self._room_ids[room] = room_id
+        return room_id
+
+    async def _reserve_message_id(self) -> int | None:
+        """
+        The id is taken from the sequence right away, so the recent
+        history is updated on broadcast. Without the database the
+        buffer takes ids when it flushes.
+        """
+        try:
+            async with self.session_factory() as session:
+                [message_id] = await MessageCRUD(session).reserve_message_ids(
+                    1
+                )
+        except (SQLAlchemyError, OSError) as err:
+            logger.error(err)
+            return None
+        return message_id
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        room: str = "public",
+        user_id: int | UUID | None = None
+    ):
+        if not self.accepting:
+            raise WebSocketException(code=status.WS_1012_SERVICE_RESTART)
+        await self.get_room_id(room)
+        subprotocol = negotiate_subprotocol(websocket)
+        await websocket.accept(subprotocol=subprotocol)
+        connection = ChatConnection(
+            websocket,
+            user_id,
+            room,
+            self.queue_size,
+            binary=subprotocol == MSGPACK_SUBPROTOCOL
+        )
+        connection.writer = asyncio.create_task(self._write(connection))
+        self.active_connections[websocket] = connection
+        self.rooms.setdefault(room, set()).add(connection)
+        if user_id is not None:
+            self.users.setdefault(user_id, set()).add(connection)
+        chat_connections.inc()
+
+    def disconnect(self, websocket: WebSocket):
+        connection = self.active_connections.pop(websocket, None)
+        if connection is None:
+            return
+        room = self.rooms[connection.room]
+        room.discard(connection)
+        if len(room) == 0:
+            del self.rooms[connection.room]
+        if connection.user_id is not None:
+            user_connections = self.users[connection.user_id]
+            user_connections.discard(connection)
+            if len(user_connections) == 0:
+                del self.users[connection.user_id]
+        connection.writer.cancel()
+        chat_send_queue_depth.dec(connection.queue.qsize())
+        chat_connections.dec()
+
+    async def send_personal_message(self, message: str, websocket: WebSocket):
+        connection = self.active_connections.get(websocket)
+        if connection is not None:
+            self._enqueue(connection, ChatFrame(message, connection.room))
+
+    async def broadcast(
+        self,
+        message: str,
+        add_to_db: bool,
+        room: str = "public",
+        sender_id: UUID | None = None
+    ):
+        if add_to_db:
+            buffered = BufferedMessage(
+                room=room,
+                room_id=await self.get_room_id(room),
+                sender_id=sender_id,
+                message=message,
+                id=await self._reserve_message_id()
+            )
+            await self.buffer.add(buffered)
+            if buffered.id is not None:
+                await add_to_history([(buffered.id, buffered)])
+        frame = ChatFrame(message, room, sender_id)
+        self._deliver(frame)
+        await self._publish(
+            ChatRedisChannel(room=room).key,
+            frame.to_payload()
+        )
+
+    async def send_to_user(self, user_id: UUID, message: str):
+        """Delivers the message to every connection of the user"""
+        frame = ChatFrame(message)
+        self._deliver_to_user(frame, user_id)
+        await self._publish(
+            ChatRedisChannel(room=f"@{user_id}").key,
+            {**frame.to_payload(), "user_id": str(user_id)}
+        )
+
+    async def broadcast_to_all(self, message: str):
+        """Delivers the message to every connection of every room"""
+        frame = ChatFrame(message)
+        self._deliver_to_all(frame)
+        await self._publish(
+            ChatRedisChannel(room="@all").key,
+            {**frame.to_payload(), "all": True}
+        )
+
+    @staticmethod
+    async def _publish(channel: str, payload: dict):
+        # local clients already have the message, only other
+        # workers miss it while redis is down
+        try:
+            await redis.publish(channel, orjson.dumps(payload))
+        except RedisError as err:
+            chat_failed_publishes.inc()
+            logger.error(err)
+
+    def _is_new_message(self, message_id: str) -> bool:
+        if message_id in self._seen_messages:
+            return False
+        self._seen_messages[message_id] = None
+        if len(self._seen_messages) > self._seen_messages_size:
+            self._seen_messages.popitem(last=False)
+        return True
+
+    def _deliver(self, frame: ChatFrame):
+        if not self._is_new_message(frame.id):
+            return
+        for connection in list(self.rooms.get(frame.room, ())):
+            self._enqueue(connection, frame)
+
+    def _deliver_to_user(self, frame: ChatFrame, user_id: UUID):
+        if not self._is_new_message(frame.id):
+            return
+        for connection in list(self.users.get(user_id, ())):
+            self._enqueue(connection, frame)
+
+    def _deliver_to_all(self, frame: ChatFrame):
+        if not self._is_new_message(frame.id):
+            return
+        for connection in list(self.active_connections.values()):
+            self._enqueue(connection, frame)
+
+    async def _listen(self):
+        while True:
+            try:
+                async for item in self._pubsub.listen():
+                    if item["type"] != "pmessage":
+                        continue
+                    payload = orjson.loads(item["data"])
+                    frame = ChatFrame.from_payload(payload)
+                    if payload.get("all"):
+                        self._deliver_to_all(frame)
+                    elif "user_id" in payload:
+                        self._deliver_to_user(
+                            frame,
+                            UUID(payload["user_id"])
+                        )
+                    else:
+                        self._deliver(frame)
+            except asyncio.CancelledError:
+                raise
+            except (RedisError, OSError) as err:
+                # pubsub resubscribes to the channels on reconnect
+                logger.error(err)
+                await asyncio.sleep(1)
+
+    def _enqueue(self, connection: ChatConnection, frame: ChatFrame):
+        try:
+            connection.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            chat_dropped_connections.inc()
+            self.disconnect(connection.websocket)
+            # closing may block on the same slow client, don't wait for it
+            task = asyncio.create_task(
+                connection.websocket.close(
+                    code=status.WS_1013_TRY_AGAIN_LATER
+                )
+            )
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+            return
+        chat_send_queue_depth.inc()
+
+    async def _write(self, connection: ChatConnection):
+        try:
+            while True:
+                frame = await connection.queue.get()
+                chat_send_queue_depth.dec()
+                if connection.binary:
+                    await connection.websocket.send_bytes(frame.packed)
+                else:
+                    await connection.websocket.send_text(frame.message)
+                connection.queue.task_done()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # the receive loop gets WebSocketDisconnect as well,
+            # disconnect is idempotent
+            self.disconnect(connection.websocket)
+
+
+manager = ConnectionManager()
+
+
+async def _get_last_messages(
+    room: str,
+    limit: int,
+    db: AsyncSession
+) -> list | None:
+    messages = await ChatHistoryCRUD.get_last_messages(
+        ChatRedisChannel(room=room),
+        limit
+    )
+    if len(messages) != 0 or limit == 0:
+        return messages
+    # redis lost the history or nothing was written yet
+    messages = await _get_history(room, None, settings.CHAT_HISTORY_SIZE, db)
+    if messages is None:
+        return None
+    # so the next reads are served by redis again
+    await ChatHistoryCRUD.add_messages(
+        ChatRedisChannel(room=room),
+        [
+            {"id": message.id, "message": message.message}
+            for message in messages
+        ]
+    )
+    return messages[:limit]
+
+
+async def _get_history(
+    room: str,
+    before_id: int | None,
+    limit: int,
+    db: AsyncSession
+) -> list[Message] | None:
+    room_crud = ChatRoomCRUD(db)
+    room_id = await room_crud.get_room_id_by_name(room)
+    if room_id is None:
+        return
+    message_crud = MessageCRUD(db)
+    return await message_crud.get_messages(room_id, limit, before_id)
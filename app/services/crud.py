@@ -1,11 +1,43 @@
+import time
 from uuid import UUID
 
-from sqlalchemy import and_, delete, select, update
+import orjson
+from redis.asyncio.client import Pipeline as AsyncPipeline
+from redis.client import Pipeline
+from sqlalchemy import and_, case, delete, exists, func, select, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
-from app.db.postgres.models import PortalRole, Follower, Post, User
-from app.db.redis.connection import redis
-from app.db.redis.models import PostReaction, PostReactionRedisSet
+from app.config import settings
+from app.db.postgres.memo import memoized
+from app.db.postgres.models import (
+    ChatRoom,
+    Conversation,
+    ConversationMember,
+    DirectMessage,
+    PortalRole,
+    Follower,
+    Message,
+    OutboxEvent,
+    OutboxEventType,
+    Post,
+    RegistrationStatus,
+    User
+)
+from app.db.redis.connection import redis, sync_redis
+from app.db.redis.models import (
+    ChatRedisChannel,
+    EventRedisStream,
+    FollowRedisSet,
+    NotificationRedisStream,
+    PostReaction,
+    PostReactionRedisSet,
+    PresenceRedisKey,
+    PublishedPostRedisBitmap,
+    TimelineRedisSortedSet
+)
+from app.schemas.notification import NotificationType
 
 
 class UserCRUD:
@@ -27,13 +59,15 @@ class UserCRUD:
             last_name=last_name,
             email=email,
             password=hashed_password,
-            is_active=True,
+            is_active=False,
+            registration_status=RegistrationStatus.PENDING,
             roles=roles,
         )
         self.db_session.add(new_user)
-        await self.db_session.commit()
+        await self.db_session.flush()
         return new_user
 
+    @memoized(User, "id", aliases=("email", "username"))
     async def get_user_by_id(self, user_id: UUID) -> User | None:
         query = (
             select(User)
@@ -44,6 +78,16 @@ class UserCRUD:
         if user_row is not None:
             return user_row[0]
 
+    async def get_users_by_ids(self, user_ids: list[UUID]) -> list[User]:
+        query = (
+            select(User)
+            .where(and_(User.id.in_(user_ids), User.is_active == True))
+        )
+        res = await self.db_session.execute(query)
+        users = {user.id: user for user in res.scalars().all()}
+        return [users[user_id] for user_id in user_ids if user_id in users]
+
+    @memoized(User, "email", aliases=("id", "username"))
     async def get_user_by_email(self, email: str) -> User | None:
         query = (
             select(User)
@@ -54,6 +98,7 @@ class UserCRUD:
         if user_row is not None:
             return user_row[0]
 
+    @memoized(User, "username", aliases=("id", "email"))
     async def get_user_by_username(self, username: str) -> User | None:
         query = (
             select(User)
@@ -64,6 +109,14 @@ class UserCRUD:
         if user_row is not None:
             return user_row[0]
 
+    async def get_user_id_by_username(self, username: str) -> UUID | None:
+        query = (
+            select(User.id)
+            .where(and_(User.username == username, User.is_active == True))
+        )
+        res = await self.db_session.execute(query)
+        return res.scalar_one_or_none()
+
     async def update_user_by_id(self, user_id: UUID, **kwargs) -> User | None:
         query = (
             update(User)
@@ -115,7 +168,13 @@ class UserCRUD:
     async def restore_user_by_email(self, email: str) -> User | None:
         query = (
             update(User)
-            .where(and_(User.email == email, User.is_active == False))
+            .where(
+                and_(
+                    User.email == email,
+                    User.is_active == False,
+                    User.registration_status == RegistrationStatus.VERIFIED
+                )
+            )
             .values(is_active=True)
             .returning(User)
         )
@@ -124,6 +183,44 @@ class UserCRUD:
         if restored_user_row is not None:
             return restored_user_row[0]
 
+    async def get_registration_status(
+        self,
+        user_id: UUID
+    ) -> RegistrationStatus | None:
+        query = select(User.registration_status).where(User.id == user_id)
+        res = await self.db_session.execute(query)
+        return res.scalar_one_or_none()
+
+    async def change_follow_counters(
+        self,
+        user_id: UUID,
+        follower_id: UUID,
+        delta: int
+    ) -> None:
+        query = (
+            update(User)
+            .where(User.id.in_([user_id, follower_id]))
+            .values(
+                followers_count=case(
+                    (User.id == user_id, User.followers_count + delta),
+                    else_=User.followers_count
+                ),
+                following_count=case(
+                    (User.id == follower_id, User.following_count + delta),
+                    else_=User.following_count
+                ),
+            )
+        )
+        await self.db_session.execute(query)
+
+    async def change_posts_counter(self, user_id: UUID, delta: int) -> None:
+        query = (
+            update(User)
+            .where(User.id == user_id)
+            .values(posts_count=User.posts_count + delta)
+        )
+        await self.db_session.execute(query)
+
 
 class PostCRUD:
     def __init__(self, db_session: AsyncSession):
@@ -142,9 +239,11 @@ class PostCRUD:
             owner_id=owner_id
         )
         self.db_session.add(new_post)
-        await self.db_session.commit()
+        await UserCRUD(self.db_session).change_posts_counter(owner_id, 1)
+        await self.db_session.flush()
         return new_post
 
+    @memoized(Post, "id")
     async def get_post_by_id(self, post_id: int) -> Post | None:
         query = (
             select(Post)
@@ -155,6 +254,34 @@ class PostCRUD:
         if post_row is not None:
             return post_row[0]
 
+    async def is_post_published(
+        self,
+        post_id: int,
+        lock: bool = False
+    ) -> bool:
+        """With `lock` the post can't be deleted until the transaction ends"""
+        if not lock:
+            query = select(exists().where(
+                and_(Post.id == post_id, Post.is_published == True)
+            ))
+            res = await self.db_session.execute(query)
+            return res.scalar_one()
+        query = (
+            select(Post.id)
+            .where(and_(Post.id == post_id, Post.is_published == True))
+            .with_for_update(read=True)
+        )
+        res = await self.db_session.execute(query)
+        return res.scalar_one_or_none() is not None
+
+    async def get_post_owner_id(self, post_id: int) -> UUID | None:
+        query = (
+            select(Post.owner_id)
+            .where(and_(Post.id == post_id, Post.is_published == True))
+        )
+        res = await self.db_session.execute(query)
+        return res.scalar_one_or_none()
+
     async def get_all_posts_by_title(self, title: str) -> list[Post]:
         query = (
             select(Post)
@@ -164,6 +291,15 @@ class PostCRUD:
         posts = list(res.scalars().all())
         return posts
 
+    async def get_posts_by_ids(self, post_ids: list[int]) -> list[Post]:
+        query = (
+            select(Post)
+            .where(and_(Post.id.in_(post_ids), Post.is_published == True))
+        )
+        res = await self.db_session.execute(query)
+        posts = {post.id: post for post in res.scalars().all()}
+        return [posts[post_id] for post_id in post_ids if post_id in posts]
+
     async def update_post(
         self,
         post_id: int,
@@ -203,6 +339,7 @@ class PostCRUD:
         res = await self.db_session.execute(query)
         deleted_post_row = res.fetchone()
         if deleted_post_row is not None:
+            await UserCRUD(self.db_session).change_posts_counter(owner_id, -1)
             return deleted_post_row[0]
 
     async def restore_post(self, post_id: int, owner_id: UUID) -> Post | None:
@@ -221,6 +358,7 @@ class PostCRUD:
         res = await self.db_session.execute(query)
         restored_post_row = res.fetchone()
         if restored_post_row is not None:
+            await UserCRUD(self.db_session).change_posts_counter(owner_id, 1)
             return restored_post_row[0]
 
 
@@ -232,13 +370,26 @@ class FollowCRUD:
         self,
         user_id: UUID,
         follower_id: UUID
-    ) -> None:
-        new_follow = Follower(
+    ) -> bool:
+        """Returns False when the follow already exists"""
+        query = (
+            insert(Follower)
+            .values(user_id=user_id, follower_id=follower_id)
+            .on_conflict_do_nothing(
+                constraint="uq_follows_user_id_follower_id"
+            )
+            .returning(Follower.id)
+        )
+        res = await self.db_session.execute(query)
+        if res.scalar_one_or_none() is None:
+            return False
+        await UserCRUD(self.db_session).change_follow_counters(
             user_id=user_id,
-            follower_id=follower_id
+            follower_id=follower_id,
+            delta=1
         )
-        self.db_session.add(new_follow)
-        await self.db_session.commit()
+        await self.db_session.flush()
+        return True
 
     async def get_follow(
         self,
@@ -277,7 +428,7 @@ class FollowCRUD:
         following = list(res.scalars().all())
         return following
 
-    async def delete_follow(self, user_id: UUID, follower_id: UUID) -> None:
+    async def delete_follow(self, user_id: UUID, follower_id: UUID) -> bool:
         query = (
             delete(Follower)
             .where(
@@ -287,35 +438,186 @@ class FollowCRUD:
                 )
             )
         )
-        await self.db_session.execute(query)
-        await self.db_session.commit()
+        res = await self.db_session.execute(query)
+        if res.rowcount:
+            await UserCRUD(self.db_session).change_follow_counters(
+                user_id=user_id,
+                follower_id=follower_id,
+                delta=-res.rowcount
+            )
+        await self.db_session.flush()
+        return res.rowcount != 0
+
+
+class FollowGraphCRUD:
+    """
+    Follow graph mirrored into per-user followers / following sets.
+    Changed follows are also recorded, so a rebuild can replay
+    the changes it raced with.
+    """
+
+    @staticmethod
+    async def add_follow(user_id: UUID, follower_id: UUID):
+        user = FollowRedisSet(user_id=user_id)
+        follower = FollowRedisSet(user_id=follower_id)
+        async with redis.pipeline(transaction=True) as pipe:
+            await pipe.sadd(user.followers_key, follower.value)
+            await pipe.sadd(follower.following_key, user.value)
+            await pipe.sadd(
+                FollowRedisSet.CHANGES_KEY, user.change(follower_id)
+            )
+            await pipe.execute()
+
+    @staticmethod
+    async def remove_follow(user_id: UUID, follower_id: UUID):
+        user = FollowRedisSet(user_id=user_id)
+        follower = FollowRedisSet(user_id=follower_id)
+        async with redis.pipeline(transaction=True) as pipe:
+            await pipe.srem(user.followers_key, follower.value)
+            await pipe.srem(follower.following_key, user.value)
+            await pipe.sadd(
+                FollowRedisSet.CHANGES_KEY, user.change(follower_id)
+            )
+            await pipe.execute()
+
+    @staticmethod
+    async def is_following(user_id: UUID, follower_id: UUID) -> bool | None:
+        """
+        None when the graph can't tell: it isn't built yet
+        or the user's followers set is missing.
+        """
+        user = FollowRedisSet(user_id=user_id)
+        follower = FollowRedisSet(user_id=follower_id)
+        async with redis.pipeline(transaction=False) as pipe:
+            await pipe.sismember(user.followers_key, follower.value)
+            await pipe.exists(
+                user.followers_key,
+                FollowRedisSet.BUILT_MARKER_KEY
+            )
+            is_member, existing = await pipe.execute()
+        if is_member:
+            return True
+        if existing < 2:
+            return None
+        return False
+
+    @staticmethod
+    async def count_followers(user_id: UUID) -> int:
+        return await redis.scard(FollowRedisSet(user_id=user_id).followers_key)
+
+    @staticmethod
+    async def count_following(user_id: UUID) -> int:
+        return await redis.scard(FollowRedisSet(user_id=user_id).following_key)
+
+    @staticmethod
+    async def get_mutual_followers(
+        user_id: UUID,
+        other_user_id: UUID
+    ) -> list[UUID]:
+        user = FollowRedisSet(user_id=user_id)
+        other_user = FollowRedisSet(user_id=other_user_id)
+        members = await redis.sinter(
+            user.followers_key,
+            other_user.followers_key
+        )
+        return [UUID(member.decode()) for member in members]
+
+    @staticmethod
+    async def get_common_following(
+        user_id: UUID,
+        other_user_id: UUID
+    ) -> list[UUID]:
+        user = FollowRedisSet(user_id=user_id)
+        other_user = FollowRedisSet(user_id=other_user_id)
+        members = await redis.sinter(
+            user.following_key,
+            other_user.following_key
+        )
+        return [UUID(member.decode()) for member in members]
+
+    @staticmethod
+    async def get_suggestions(user_id: UUID, limit: int) -> list[UUID]:
+        """
+        Precomputed suggestions, without users who were followed
+        since the last computation.
+        """
+        user = FollowRedisSet(user_id=user_id)
+        candidates = await redis.zrevrange(user.suggestions_key, 0, limit - 1)
+        if not candidates:
+            return []
+        already_followed = await redis.smismember(
+            user.following_key,
+            candidates
+        )
+        return [
+            UUID(candidate.decode())
+            for candidate, is_followed in zip(candidates, already_followed)
+            if not is_followed
+        ]
+
+    @staticmethod
+    async def is_built() -> bool:
+        return bool(await redis.exists(FollowRedisSet.BUILT_MARKER_KEY))
+
+
+# the trending score moves only with the reaction it belongs to
+_ADD_REACTION_SCRIPT = redis.register_script("""
+if redis.call("SADD", KEYS[1], ARGV[1]) == 1 then
+    redis.call("ZINCRBY", KEYS[2], ARGV[2], ARGV[3])
+    return 1
+end
+return 0
+""")
 
 
 class PostReactionCRUD:
+    """
+    Reactions are per-post sets of user ids. Every actual change
+    also moves the post score in the trending sorted set.
+    """
+
     @staticmethod
     async def add_reaction(
         post_id: int,
         user_id: UUID,
         reaction: PostReaction
-    ):
+    ) -> bool:
+        """Returns True when the user hadn't reacted so yet"""
         rk = PostReactionRedisSet(
             post_id=post_id,
             user_id=user_id,
             reaction=reaction
         )
-        async with redis.pipeline(transaction=True) as pipe:
-            await pipe.sadd(rk.key, rk.value)
-            await pipe.execute()
+        added = await _ADD_REACTION_SCRIPT(
+            keys=[rk.key, rk.TRENDING_KEY],
+            args=[rk.value, rk.trending_weight, post_id]
+        )
+        return added == 1
 
     @staticmethod
     async def get_post_reactions(post_id: int) -> dict:
-        rk = PostReactionRedisSet(post_id=post_id)
-        reactions = {}
-        for reaction in PostReaction:
-            rk.reaction = reaction
-            reactions |= {reaction: await redis.scard(rk.key)}
+        reactions = await PostReactionCRUD.get_reactions_of_posts([post_id])
+        return reactions[post_id]
 
-        return reactions
+    @staticmethod
+    async def get_reactions_of_posts(post_ids: list[int]) -> dict[int, dict]:
+        """Counts of every reaction, in one round trip for all posts"""
+        if len(post_ids) == 0:
+            return {}
+        async with redis.pipeline(transaction=False) as pipe:
+            for post_id in post_ids:
+                for reaction in PostReaction:
+                    pipe.scard(
+                        PostReactionRedisSet(
+                            post_id=post_id,
+                            reaction=reaction
+                        ).key
+                    )
+            counts = iter(await pipe.execute())
+        return {
+            post_id: {reaction: next(counts) for reaction in PostReaction}
+            for post_id in post_ids
+        }
 
     @staticmethod
     async def remove_reaction(
@@ -328,7 +630,10 @@ class PostReactionCRUD:
             user_id=user_id,
             reaction=reaction
         )
-        await redis.srem(rk.key, rk.value)
+        if await redis.srem(rk.key, rk.value):
+            await PostReactionCRUD._take_back_trending_weights(
+                post_id, [rk.trending_weight]
+            )
 
     @staticmethod
     async def remove_all_reactions(post_id: int, user_id: UUID):
@@ -337,4 +642,565 @@ class PostReactionCRUD:
             for to_delete in PostReaction:
                 rk.reaction = to_delete
                 await pipe.srem(rk.key, rk.value)
+            removed = await pipe.execute()
+        weights = [
+            rk.TRENDING_WEIGHTS[reaction]
+            for reaction, is_removed in zip(PostReaction, removed)
+            if is_removed
+        ]
+        if len(weights) != 0:
+            await PostReactionCRUD._take_back_trending_weights(
+                post_id, weights
+            )
+
+    @staticmethod
+    async def _take_back_trending_weights(post_id: int, weights: list[float]):
+        key = PostReactionRedisSet.TRENDING_KEY
+        async with redis.pipeline(transaction=True) as pipe:
+            for weight in weights:
+                await pipe.zincrby(key, -weight, post_id)
+            # reactions given before a decay are taken back with their
+            # full weight, scores gone below zero would hold back new
+            # reactions, they are dropped as the decay does
+            await pipe.zremrangebyscore(key, "-inf", 0)
             await pipe.execute()
+
+    @staticmethod
+    async def remove_trending_post(post_id: int):
+        await redis.zrem(PostReactionRedisSet.TRENDING_KEY, post_id)
+
+    @staticmethod
+    async def get_trending_posts(skip: int, limit: int) -> list[int]:
+        if limit == 0:
+            return []
+        # posts with more dislikes than likes are never trending
+        post_ids = await redis.zrevrangebyscore(
+            PostReactionRedisSet.TRENDING_KEY, "+inf", "(0",
+            start=skip, num=limit
+        )
+        return [int(post_id) for post_id in post_ids]
+
+
+class PublishedPostCRUD:
+    """
+    Ids of published posts in a Redis bitmap. A set bit is trusted,
+    a clear one may only be missing from the cache, so callers
+    fall back to the database.
+    """
+
+    @staticmethod
+    async def add(post_id: int):
+        await redis.setbit(PublishedPostRedisBitmap.KEY, post_id, 1)
+
+    @staticmethod
+    async def remove(post_id: int):
+        await redis.setbit(PublishedPostRedisBitmap.KEY, post_id, 0)
+
+    @staticmethod
+    async def contains(post_id: int) -> bool:
+        if not 0 <= post_id <= PublishedPostRedisBitmap.MAX_POST_ID:
+            return False
+        return await redis.getbit(PublishedPostRedisBitmap.KEY, post_id) == 1
+
+
+class TimelineCRUD:
+    """Home timelines: per-user sorted sets of post ids by creation time"""
+
+    @staticmethod
+    async def get_timeline(user_id: UUID, skip: int, limit: int) -> list[int]:
+        if limit == 0:
+            return []
+        tk = TimelineRedisSortedSet(user_id=user_id)
+        post_ids = await redis.zrevrange(tk.key, skip, skip + limit - 1)
+        return [int(post_id) for post_id in post_ids]
+
+    @staticmethod
+    async def get_followed_celebrities(user_id: UUID) -> list[UUID]:
+        user = FollowRedisSet(user_id=user_id)
+        celebrities = await redis.sinter(
+            user.following_key,
+            TimelineRedisSortedSet.CELEBRITIES_KEY
+        )
+        return [UUID(celebrity.decode()) for celebrity in celebrities]
+
+    @staticmethod
+    async def get_timelines_with_scores(
+        user_id: UUID,
+        celebrity_ids: list[UUID],
+        size: int
+    ) -> list[list[tuple[bytes, float]]]:
+        """
+        Newest `size` entries of the user's timeline and of each
+        celebrity's posts, every list sorted by score desc.
+        """
+        async with redis.pipeline(transaction=False) as pipe:
+            tk = TimelineRedisSortedSet(user_id=user_id)
+            await pipe.zrevrange(tk.key, 0, size - 1, withscores=True)
+            for celebrity_id in celebrity_ids:
+                tk = TimelineRedisSortedSet(user_id=celebrity_id)
+                await pipe.zrevrange(
+                    tk.posts_key, 0, size - 1, withscores=True
+                )
+            return await pipe.execute()
+
+
+class ChatRoomCRUD:
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    async def get_or_create_room(self, name: str) -> int:
+        query = (
+            insert(ChatRoom)
+            .values(name=name)
+            .on_conflict_do_nothing(index_elements=[ChatRoom.name])
+            .returning(ChatRoom.id)
+        )
+        res = await self.db_session.execute(query)
+        room_id = res.scalar_one_or_none()
+        if room_id is None:
+            room_id = await self.get_room_id_by_name(name)
+        return room_id
+
+    async def get_room_id_by_name(self, name: str) -> int | None:
+        query = select(ChatRoom.id).where(ChatRoom.name == name)
+        res = await self.db_session.execute(query)
+        return res.scalar_one_or_none()
+
+
+class MessageCRUD:
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    async def reserve_message_ids(self, amount: int) -> list[int]:
+        """Ids of the messages sequence, ascending"""
+        sequence = func.pg_get_serial_sequence(Message.__tablename__, "id")
+        res = await self.db_session.execute(
+            select(func.nextval(sequence))
+            .select_from(func.generate_series(1, amount))
+        )
+        return sorted(res.scalars())
+
+    async def get_messages(
+        self,
+        room_id: int,
+        limit: int,
+        before_id: int | None = None
+    ) -> list[Message]:
+        """Newest first, keyset pagination by id"""
+        query = (
+            select(Message)
+            .where(Message.room_id == room_id)
+            .order_by(Message.id.desc())
+            .limit(limit)
+        )
+        if before_id is not None:
+            query = query.where(Message.id < before_id)
+        res = await self.db_session.execute(query)
+        return list(res.scalars().all())
+
+
+class ChatHistoryCRUD:
+    """
+    Recent chat messages in a sorted set scored by message id, capped
+    to the newest ones. Workers add messages in any order, reads
+    still get them by id, as the database history does.
+    """
+
+    @staticmethod
+    async def add_messages(channel: ChatRedisChannel, messages: list[dict]):
+        if len(messages) == 0:
+            return
+        async with redis.pipeline(transaction=True) as pipe:
+            await pipe.zadd(
+                channel.history_key,
+                {orjson.dumps(message): message["id"] for message in messages}
+            )
+            await pipe.zremrangebyrank(
+                channel.history_key, 0, -settings.CHAT_HISTORY_SIZE - 1
+            )
+            await pipe.execute()
+
+    @staticmethod
+    async def get_last_messages(
+        channel: ChatRedisChannel,
+        limit: int
+    ) -> list[dict]:
+        """Newest first"""
+        if limit == 0:
+            return []
+        messages = await redis.zrevrange(channel.history_key, 0, limit - 1)
+        return [orjson.loads(message) for message in messages]
+
+
+class PresenceCRUD:
+    """
+    Workers which have connections of a user, in a sorted set scored
+    by the time each worker's presence expires. Workers prolong it
+    with heartbeats, so users of a crashed worker go offline on their
+    own, without losing the connections of other workers.
+    """
+
+    @staticmethod
+    def _prolong(pipe: AsyncPipeline, key: str, worker_id: str):
+        now = time.time()
+        pipe.zremrangebyscore(key, "-inf", now)
+        pipe.zcard(key)
+        pipe.zadd(key, {worker_id: now + settings.PRESENCE_TTL})
+        pipe.expire(key, settings.PRESENCE_TTL)
+
+    @staticmethod
+    async def connect(user_id: UUID, worker_id: str) -> bool:
+        """Returns True when the user came online"""
+        key = PresenceRedisKey(user_id=user_id).key
+        async with redis.pipeline(transaction=True) as pipe:
+            PresenceCRUD._prolong(pipe, key, worker_id)
+            _, workers, *_ = await pipe.execute()
+        return workers == 0
+
+    @staticmethod
+    async def disconnect(user_id: UUID, worker_id: str) -> bool:
+        """
+        Called when the last connection of the user to the worker
+        is closed. Returns True when the user went offline.
+        """
+        key = PresenceRedisKey(user_id=user_id).key
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(key, worker_id)
+            pipe.zremrangebyscore(key, "-inf", time.time())
+            pipe.zcard(key)
+            removed, _, workers = await pipe.execute()
+        return removed == 1 and workers == 0
+
+    @staticmethod
+    async def refresh(user_ids: list[UUID], worker_id: str) -> list[UUID]:
+        """
+        Prolongs presence of the users connected to the worker.
+        Returns the users who had already gone offline and were
+        restored.
+        """
+        if len(user_ids) == 0:
+            return []
+        async with redis.pipeline(transaction=True) as pipe:
+            for user_id in user_ids:
+                PresenceCRUD._prolong(
+                    pipe, PresenceRedisKey(user_id=user_id).key, worker_id
+                )
+            res = await pipe.execute()
+        return [
+            user_id for user_id, workers in zip(user_ids, res[1::4])
+            if workers == 0
+        ]
+
+    @staticmethod
+    async def get_presence(user_ids: list[UUID]) -> dict[UUID, bool]:
+        if len(user_ids) == 0:
+            return {}
+        now = time.time()
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.zcount(PresenceRedisKey(user_id=user_id).key, now, "+inf")
+            workers = await pipe.execute()
+        return {
+            user_id: count > 0 for user_id, count in zip(user_ids, workers)
+        }
+
+
+class NotificationCRUD:
+    """
+    Notification streams of users. Events are counted in digest
+    hashes first, a flush appends every digest to the stream
+    as one entry, so bursts of identical events take one entry.
+    """
+
+    @staticmethod
+    def _add_to_digest(
+        pipe: Pipeline | AsyncPipeline,
+        user_id: UUID,
+        notification_type: NotificationType,
+        target: str,
+        actor_id: UUID
+    ) -> Pipeline | AsyncPipeline:
+        """Queues commands only, so sync and async pipelines share it"""
+        key = NotificationRedisStream(user_id=user_id).digest_key(
+            notification_type.value, target
+        )
+        pipe.hincrby(key, "count", 1)
+        pipe.hset(key, "actor_id", str(actor_id))
+        pipe.hsetnx(key, "created_at", time.time())
+        # a digest whose flush was lost doesn't stay forever
+        pipe.expire(key, 10 * settings.NOTIFICATIONS_DIGEST_WINDOW)
+        return pipe
+
+    @staticmethod
+    async def add_to_digest(
+        user_id: UUID,
+        notification_type: NotificationType,
+        target: str,
+        actor_id: UUID
+    ) -> bool:
+        """Returns True when the event started a new digest"""
+        async with redis.pipeline(transaction=True) as pipe:
+            NotificationCRUD._add_to_digest(
+                pipe, user_id, notification_type, target, actor_id
+            )
+            count, *_ = await pipe.execute()
+        return count == 1
+
+    @staticmethod
+    def sync_add_to_digest(
+        user_id: UUID,
+        notification_type: NotificationType,
+        target: str,
+        actor_id: UUID,
+        event_id: int | None = None
+    ) -> bool:
+        """
+        `add_to_digest` for celery tasks. An outbox event is counted
+        once by its `event_id`, relays may publish it again.
+        """
+        if event_id is not None and not sync_redis.set(
+            EventRedisStream(event_id=event_id).notified_key,
+            1,
+            nx=True,
+            ex=settings.NOTIFICATIONS_EVENT_DEDUPE_TTL
+        ):
+            return False
+        with sync_redis.pipeline(transaction=True) as pipe:
+            NotificationCRUD._add_to_digest(
+                pipe, user_id, notification_type, target, actor_id
+            )
+            count, *_ = pipe.execute()
+        return count == 1
+
+    @staticmethod
+    def sync_flush_digest(
+        user_id: UUID,
+        notification_type: NotificationType,
+        target: str
+    ) -> int:
+        """
+        Moves the digest to the stream, returns the amount
+        of coalesced events. Events which come after the digest
+        was taken start a new one.
+        """
+        stream = NotificationRedisStream(user_id=user_id)
+        key = stream.digest_key(notification_type.value, target)
+        with sync_redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(key)
+            pipe.delete(key)
+            digest, _ = pipe.execute()
+            if len(digest) == 0:
+                return 0
+            pipe.xadd(
+                stream.key,
+                {
+                    "type": notification_type.value,
+                    "target": target,
+                    "actor_id": digest[b"actor_id"],
+                    "count": digest[b"count"],
+                    "created_at": digest[b"created_at"],
+                },
+                maxlen=settings.NOTIFICATIONS_MAX_LENGTH,
+                approximate=True,
+            )
+            pipe.incr(stream.unread_key)
+            pipe.execute()
+        return int(digest[b"count"])
+
+    @staticmethod
+    async def get_notifications(
+        user_id: UUID,
+        before: str | None,
+        limit: int
+    ) -> tuple[list[dict], int]:
+        """Newest first, `before` is an exclusive stream id"""
+        stream = NotificationRedisStream(user_id=user_id)
+        async with redis.pipeline(transaction=False) as pipe:
+            await pipe.xrevrange(
+                stream.key,
+                max="+" if before is None else f"({before}",
+                count=limit
+            )
+            await pipe.get(stream.unread_key)
+            entries, unread = await pipe.execute()
+        notifications = [
+            {
+                "id": entry_id.decode(),
+                **{
+                    field.decode(): value.decode()
+                    for field, value in fields.items()
+                },
+            }
+            for entry_id, fields in entries
+        ]
+        # entries trimmed from the stream can't be unread
+        unread = min(int(unread or 0), settings.NOTIFICATIONS_MAX_LENGTH)
+        return notifications, unread
+
+    @staticmethod
+    async def mark_read(user_id: UUID) -> int:
+        """Returns the amount of unread notifications"""
+        unread = await redis.getdel(
+            NotificationRedisStream(user_id=user_id).unread_key
+        )
+        return min(int(unread or 0), settings.NOTIFICATIONS_MAX_LENGTH)
+
+
+class DirectMessageCRUD:
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    @staticmethod
+    def get_members_key(user_id: UUID, other_user_id: UUID) -> str:
+        return ":".join(sorted((str(user_id), str(other_user_id))))
+
+    async def get_conversation_id(
+        self,
+        user_id: UUID,
+        other_user_id: UUID
+    ) -> int | None:
+        query = (
+            select(Conversation.id)
+            .where(
+                Conversation.members_key
+                == self.get_members_key(user_id, other_user_id)
+            )
+        )
+        res = await self.db_session.execute(query)
+        return res.scalar_one_or_none()
+
+    async def get_or_create_conversation(
+        self,
+        user_id: UUID,
+        other_user_id: UUID
+    ) -> int:
+        query = (
+            insert(Conversation)
+            .values(members_key=self.get_members_key(user_id, other_user_id))
+            .on_conflict_do_nothing(index_elements=[Conversation.members_key])
+            .returning(Conversation.id)
+        )
+        res = await self.db_session.execute(query)
+        conversation_id = res.scalar_one_or_none()
+        if conversation_id is None:
+            return await self.get_conversation_id(user_id, other_user_id)
+        await self.db_session.execute(
+            insert(ConversationMember),
+            [
+                {"conversation_id": conversation_id, "user_id": user_id},
+                {"conversation_id": conversation_id, "user_id": other_user_id},
+            ]
+        )
+        return conversation_id
+
+    async def create_message(
+        self,
+        conversation_id: int,
+        sender_id: UUID,
+        message: str
+    ) -> DirectMessage:
+        query = (
+            insert(DirectMessage)
+            .values(
+                conversation_id=conversation_id,
+                sender_id=sender_id,
+                message=message
+            )
+            .returning(DirectMessage)
+        )
+        res = await self.db_session.execute(query)
+        new_message = res.scalar_one()
+        await self.db_session.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id)
+            .values(last_message_id=new_message.id, updated_at=func.now())
+        )
+        await self.db_session.execute(
+            update(ConversationMember)
+            .where(
+                and_(
+                    ConversationMember.conversation_id == conversation_id,
+                    ConversationMember.user_id != sender_id
+                )
+            )
+            .values(unread_count=ConversationMember.unread_count + 1)
+        )
+        return new_message
+
+    async def get_messages(
+        self,
+        conversation_id: int,
+        limit: int,
+        before_id: int | None = None
+    ) -> list[DirectMessage]:
+        """Newest first, keyset pagination by id"""
+        query = (
+            select(DirectMessage)
+            .where(DirectMessage.conversation_id == conversation_id)
+            .order_by(DirectMessage.id.desc())
+            .limit(limit)
+        )
+        if before_id is not None:
+            query = query.where(DirectMessage.id < before_id)
+        res = await self.db_session.execute(query)
+        return list(res.scalars().all())
+
+    async def mark_conversation_as_read(
+        self,
+        conversation_id: int,
+        user_id: UUID
+    ) -> None:
+        query = (
+            update(ConversationMember)
+            .where(
+                and_(
+                    ConversationMember.conversation_id == conversation_id,
+                    ConversationMember.user_id == user_id,
+                    ConversationMember.unread_count != 0
+                )
+            )
+            .values(unread_count=0)
+        )
+        await self.db_session.execute(query)
+
+    async def get_inbox(self, user_id: UUID) -> list[dict]:
+        member = aliased(ConversationMember)
+        peer = aliased(ConversationMember)
+        query = (
+            select(
+                Conversation.id.label("conversation_id"),
+                User.username,
+                member.unread_count,
+                DirectMessage.message.label("last_message"),
+                Conversation.updated_at
+            )
+            .select_from(member)
+            .join(Conversation, Conversation.id == member.conversation_id)
+            .join(
+                peer,
+                and_(
+                    peer.conversation_id == member.conversation_id,
+                    peer.user_id != member.user_id
+                )
+            )
+            .join(User, User.id == peer.user_id)
+            .outerjoin(
+                DirectMessage,
+                DirectMessage.id == Conversation.last_message_id
+            )
+            .where(member.user_id == user_id)
+            .order_by(Conversation.updated_at.desc())
+        )
+        res = await self.db_session.execute(query)
+        return [row._asdict() for row in res]
+
+
+class OutboxCRUD:
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    def add_event(self, event_type: OutboxEventType, payload: dict):
+        """Is written by the transaction of the caller"""
+        self.db_session.add(
+            OutboxEvent(event_type=event_type, payload=payload)
+        )
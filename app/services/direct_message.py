@@ -0,0 +1,69 @@
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.postgres.models import DirectMessage, User
+from app.db.postgres.unit_of_work import after_commit
+from app.services.chat import manager
+from app.services.crud import DirectMessageCRUD
+
+
+async def _send_direct_message(
+    sender: User,
+    recipient: User,
+    message: str,
+    db: AsyncSession
+) -> DirectMessage:
+    message_crud = DirectMessageCRUD(db)
+    conversation_id = await message_crud.get_or_create_conversation(
+        sender.id,
+        recipient.id
+    )
+    new_message = await message_crud.create_message(
+        conversation_id=conversation_id,
+        sender_id=sender.id,
+        message=message
+    )
+    after_commit(db, lambda: manager.send_to_user(
+        recipient.id,
+        orjson.dumps({
+            "type": "direct_message",
+            "id": new_message.id,
+            "conversation_id": conversation_id,
+            "from": sender.username,
+            "message": message,
+        }).decode()
+    ))
+    return new_message
+
+
+async def _get_direct_messages(
+    user: User,
+    other_user: User,
+    before_id: int | None,
+    limit: int,
+    db: AsyncSession
+) -> list[DirectMessage]:
+    message_crud = DirectMessageCRUD(db)
+    conversation_id = await message_crud.get_conversation_id(
+        user.id,
+        other_user.id
+    )
+    if conversation_id is None:
+        return []
+    messages = await message_crud.get_messages(
+        conversation_id,
+        limit,
+        before_id
+    )
+    if before_id is None:
+        # the newest page was read
+        await message_crud.mark_conversation_as_read(
+            conversation_id,
+            user.id
+        )
+    return messages
+
+
+async def _get_inbox(user: User, db: AsyncSession) -> list[dict]:
+    message_crud = DirectMessageCRUD(db)
+    return await message_crud.get_inbox(user.id)
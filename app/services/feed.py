@@ -0,0 +1,54 @@
+from heapq import merge
+from itertools import islice
+from operator import itemgetter
+from uuid import UUID
+
+from prometheus_client import Histogram
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.schemas.post import PageRequest, ShowPost
+from app.services.crud import PostCRUD, TimelineCRUD
+from app.services.post_reaction import enrich_posts_with_reactions
+
+feed_merge_seconds = Histogram(
+    "feed_merge_seconds",
+    "Read-time merge of pulled celebrity posts into a home timeline",
+)
+
+
+async def _get_timeline_page(user_id: UUID, page: PageRequest) -> list[int]:
+    if page.limit == 0:
+        return []
+    celebrity_ids = await TimelineCRUD.get_followed_celebrities(user_id)
+    if len(celebrity_ids) == 0:
+        return await TimelineCRUD.get_timeline(
+            user_id, page.skip, page.limit
+        )
+
+    with feed_merge_seconds.time():
+        timelines = await TimelineCRUD.get_timelines_with_scores(
+            user_id,
+            celebrity_ids,
+            page.skip + page.limit
+        )
+        # posts fanned out before the owner became a celebrity
+        # are both pushed and pulled
+        post_ids = dict.fromkeys(
+            int(post_id) for post_id, _ in merge(
+                *timelines, key=itemgetter(1), reverse=True
+            )
+        )
+        return list(islice(post_ids, page.skip, page.skip + page.limit))
+
+
+async def _get_feed(
+    user_id: UUID,
+    page: PageRequest,
+    db: AsyncSession
+) -> list[ShowPost]:
+    post_ids = await _get_timeline_page(user_id, page)
+    if len(post_ids) == 0:
+        return []
+    post_crud = PostCRUD(db)
+    posts = await post_crud.get_posts_by_ids(post_ids)
+    return await enrich_posts_with_reactions(posts)
@@ -2,36 +2,51 @@ from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.services.crud import FollowCRUD
+from app.db.postgres.models import OutboxEventType, User
+from app.db.postgres.unit_of_work import after_commit
+from app.services.crud import (
+    FollowCRUD,
+    FollowGraphCRUD,
+    OutboxCRUD,
+    UserCRUD
+)
 from app.schemas.follow import Follow
+from app.utils.celery.worker import relay_outbox
 
 
 async def _create_follow(
     user_id: UUID,
     follower_id: UUID,
     db: AsyncSession
-) -> None:
-    async with db.begin():
-        follow_crud = FollowCRUD(db)
-        await follow_crud.create_follow(user_id, follower_id)
+) -> bool:
+    """Returns False when the follow already exists"""
+    follow_crud = FollowCRUD(db)
+    if not await follow_crud.create_follow(user_id, follower_id):
+        return False
+    OutboxCRUD(db).add_event(
+        OutboxEventType.USER_FOLLOWED,
+        {"user_id": str(user_id), "follower_id": str(follower_id)}
+    )
+    # read right after the write, so it is not left to the relay
+    after_commit(db, lambda: FollowGraphCRUD.add_follow(user_id, follower_id))
+    after_commit(db, relay_outbox.delay)
+    return True
 
 
 async def _get_list_of_following(
     follower_id: UUID,
     db: AsyncSession
 ) -> list:
-    async with db.begin():
-        follow_crud = FollowCRUD(db)
-        return await follow_crud.get_all_following(follower_id)
+    follow_crud = FollowCRUD(db)
+    return await follow_crud.get_all_following(follower_id)
 
 
 async def _get_list_of_followers(
     user_id: UUID,
     db: AsyncSession
 ) -> list:
-    async with db.begin():
-        follow_crud = FollowCRUD(db)
-        return await follow_crud.get_all_followers(user_id)
+    follow_crud = FollowCRUD(db)
+    return await follow_crud.get_all_followers(user_id)
 
 
 async def is_user_following(
@@ -39,10 +54,12 @@ async def is_user_following(
     follower_id: UUID,
     db: AsyncSession
 ) -> bool:
-    async with db.begin():
+    is_following = await FollowGraphCRUD.is_following(user_id, follower_id)
+    if is_following is None:
         follow_crud = FollowCRUD(db)
         follow = await follow_crud.get_follow(user_id, follower_id)
-        return False if follow is None else True
+        return follow is not None
+    return is_following
 
 
 async def _delete_follow(
@@ -50,6 +67,42 @@ async def _delete_follow(
     follower_id: UUID,
     db: AsyncSession
 ) -> None:
-    async with db.begin():
-        follow_crud = FollowCRUD(db)
-        await follow_crud.delete_follow(user_id, follower_id)
+    follow_crud = FollowCRUD(db)
+    is_deleted = await follow_crud.delete_follow(user_id, follower_id)
+    if is_deleted:
+        OutboxCRUD(db).add_event(
+            OutboxEventType.USER_UNFOLLOWED,
+            {"user_id": str(user_id), "follower_id": str(follower_id)}
+        )
+    after_commit(
+        db, lambda: FollowGraphCRUD.remove_follow(user_id, follower_id)
+    )
+    if is_deleted:
+        after_commit(db, relay_outbox.delay)
+
+
+async def _get_common_following(
+    user_id: UUID,
+    other_user_id: UUID,
+    db: AsyncSession
+) -> list[User]:
+    common_following = await FollowGraphCRUD.get_common_following(
+        user_id,
+        other_user_id
+    )
+    if len(common_following) == 0:
+        return []
+    user_crud = UserCRUD(db)
+    return await user_crud.get_users_by_ids(common_following)
+
+
+async def _get_follow_suggestions(
+    user_id: UUID,
+    limit: int,
+    db: AsyncSession
+) -> list[User]:
+    suggestions = await FollowGraphCRUD.get_suggestions(user_id, limit)
+    if len(suggestions) == 0:
+        return []
+    user_crud = UserCRUD(db)
+    return await user_crud.get_users_by_ids(suggestions)
@@ -0,0 +1,53 @@
+from typing import Iterator
+
+import numpy as np
+from scipy import sparse
+
+
+def rank_follow_suggestions(
+    follower_ids: np.ndarray,
+    user_ids: np.ndarray,
+    users_amount: int,
+    limit: int = 50,
+    batch_size: int = 10_000,
+) -> Iterator[tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Friends-of-friends ranking over an id-indexed follow adjacency.
+    `follower_ids[i]` follows `user_ids[i]`, both are dense indexes
+    in range(users_amount).
+    The score of candidate `c` for user `u` is the number of users
+    followed by `u` who follow `c`. Users already followed by `u`
+    and `u` itself are never suggested.
+    Yields `(user_index, candidate_indexes, scores)` sorted by score desc.
+    """
+    adjacency = sparse.csr_matrix(
+        (np.ones(len(follower_ids), dtype=np.int32), (follower_ids, user_ids)),
+        shape=(users_amount, users_amount),
+    )
+    adjacency.sum_duplicates()
+    adjacency.data[:] = 1
+
+    for start in range(0, users_amount, batch_size):
+        stop = min(start + batch_size, users_amount)
+        following = adjacency[start:stop]
+        scores = following @ adjacency
+        # drop users who are already followed and the users themselves
+        rows = np.arange(stop - start)
+        themselves = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, rows + start)),
+            shape=scores.shape,
+        )
+        scores = scores - scores.multiply(following + themselves)
+        scores.eliminate_zeros()
+
+        for row in range(stop - start):
+            begin, end = scores.indptr[row], scores.indptr[row + 1]
+            if begin == end:
+                continue
+            candidates = scores.indices[begin:end]
+            row_scores = scores.data[begin:end]
+            if len(row_scores) > limit:
+                top = np.argpartition(-row_scores, limit)[:limit]
+                candidates, row_scores = candidates[top], row_scores[top]
+            order = np.argsort(-row_scores, kind="stable")
+            yield start + row, candidates[order], row_scores[order]
@@ -0,0 +1,48 @@
+from uuid import UUID
+
+from app.config import settings
+from app.schemas.notification import NotificationPage, NotificationType
+from app.services.crud import NotificationCRUD
+from app.utils.celery.worker import flush_notification_digest
+
+
+async def _notify(
+    user_id: UUID,
+    notification_type: NotificationType,
+    target: str,
+    actor_id: UUID
+) -> None:
+    """
+    Identical events coming within NOTIFICATIONS_DIGEST_WINDOW
+    are delivered as one entry, the first one schedules the flush.
+    """
+    if user_id == actor_id:
+        return
+    if await NotificationCRUD.add_to_digest(
+        user_id, notification_type, target, actor_id
+    ):
+        flush_notification_digest.apply_async(
+            (str(user_id), notification_type.value, target),
+            countdown=settings.NOTIFICATIONS_DIGEST_WINDOW
+        )
+
+
+async def _get_notifications(
+    user_id: UUID,
+    before: str | None,
+    limit: int
+) -> NotificationPage:
+    notifications, unread = await NotificationCRUD.get_notifications(
+        user_id, before, limit
+    )
+    return NotificationPage(
+        notifications=notifications,
+        next_cursor=(
+            notifications[-1]["id"] if len(notifications) == limit else None
+        ),
+        unread=unread
+    )
+
+
+async def _mark_notifications_read(user_id: UUID) -> int:
+    return await NotificationCRUD.mark_read(user_id)
@@ -1,12 +1,20 @@
 from datetime import datetime, timedelta
 
-from fastapi import Depends, HTTPException, status
+from fastapi import (
+    Depends,
+    HTTPException,
+    Query,
+    WebSocket,
+    WebSocketException,
+    status
+)
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
 from app.db.postgres.connection import get_db
+from app.db.postgres.unit_of_work import get_uow
 from app.db.postgres.models import User
 from app.services.security import Hasher
 from app.services.user import _get_user_by_email
@@ -48,7 +56,7 @@ async def verify_access_token(token: str) -> dict:
 async def authenticate_user(
     email: str,
     password: str,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_uow)
 ) -> User | None:
     user = await _get_user_by_email(email, db)
     if user is None:
@@ -60,7 +68,7 @@ async def authenticate_user(
 
 async def get_current_user_from_token(
     token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_uow)
 ) -> User:
     payload: dict = await verify_access_token(token)
     email: str = payload.get("sub")
@@ -74,3 +82,33 @@ async def get_current_user_from_token(
         )
 
     return current_user
+
+
+async def get_current_user_from_websocket(
+    websocket: WebSocket,
+    token: str | None = Query(default=None),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """
+    Browsers can't set headers on WebSocket handshakes,
+    so the token may also come in the `token` query param.
+    The session is closed before the socket is accepted,
+    an open socket must not hold a pooled connection.
+    """
+    if token is None:
+        scheme, _, token = websocket.headers.get(
+            "authorization", ""
+        ).partition(" ")
+        if scheme.lower() != "bearer":
+            token = None
+    try:
+        if token is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+        return await get_current_user_from_token(token, db)
+    except HTTPException:
+        raise WebSocketException(
+            code=status.WS_1008_POLICY_VIOLATION,
+            reason="Could not validate credentials"
+        )
+    finally:
+        await db.close()
@@ -3,13 +3,32 @@ from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.schemas.post import CreatePost, ShowPost, PostReaction
-from app.services.crud import PostCRUD, PostReactionCRUD
+from app.db.postgres.models import OutboxEventType, Post
+from app.db.postgres.unit_of_work import after_commit
+from app.schemas.notification import NotificationType
+from app.schemas.post import CreatePost, PageRequest, ShowPost, PostReaction
+from app.services.crud import (
+    OutboxCRUD,
+    PostCRUD,
+    PostReactionCRUD,
+    PublishedPostCRUD
+)
+from app.services.notification import _notify
 from app.services.post_reaction import (
     enrich_post_with_reactions,
+    enrich_posts_with_reactions,
     is_user_liked_post,
     is_user_disliked_post
 )
+from app.utils.celery.worker import relay_outbox
+
+
+def post_event(post: Post) -> dict:
+    return {
+        "post_id": post.id,
+        "owner_id": str(post.owner_id),
+        "created_at": post.created_at.timestamp(),
+    }
 
 
 async def _create_new_post(
@@ -17,34 +36,71 @@ async def _create_new_post(
     owner_id: UUID,
     db: AsyncSession
 ) -> ShowPost:
-    async with db.begin():
-        post_crud = PostCRUD(db)
-        return await post_crud.create_post(
-            title=body.title,
-            content=body.content,
-            owner_id=owner_id
-        )
+    post_crud = PostCRUD(db)
+    new_post = await post_crud.create_post(
+        title=body.title,
+        content=body.content,
+        owner_id=owner_id
+    )
+    OutboxCRUD(db).add_event(
+        OutboxEventType.POST_PUBLISHED,
+        post_event(new_post)
+    )
+    after_commit(db, lambda: PublishedPostCRUD.add(new_post.id))
+    after_commit(db, relay_outbox.delay)
+    return new_post
 
 
 async def _get_post_by_id(post_id: int, db: AsyncSession) -> ShowPost | None:
-    async with db.begin():
-        post_crud = PostCRUD(db)
-        post = await post_crud.get_post_by_id(post_id)
-        if post is None:
-            return
-        return await enrich_post_with_reactions(post)
+    post_crud = PostCRUD(db)
+    post = await post_crud.get_post_by_id(post_id)
+    if post is None:
+        return
+    return await enrich_post_with_reactions(post)
+
+
+async def _is_post_published(post_id: int, db: AsyncSession) -> bool:
+    if await PublishedPostCRUD.contains(post_id):
+        return True
+    post_crud = PostCRUD(db)
+    # the lock holds off a delete until the bit is set, so its
+    # after-commit clear can't be overwritten by this repair
+    if not await post_crud.is_post_published(post_id, lock=True):
+        return False
+    # the post was published before the cache was filled
+    await PublishedPostCRUD.add(post_id)
+    return True
+
+
+async def _get_post_owner_id(post_id: int, db: AsyncSession) -> UUID | None:
+    post_crud = PostCRUD(db)
+    return await post_crud.get_post_owner_id(post_id)
 
 
 async def _get_all_posts_by_title(title: str, db: AsyncSession) -> list:
-    async with db.begin():
-        post_crud = PostCRUD(db)
-        posts = await post_crud.get_all_posts_by_title(title)
+    post_crud = PostCRUD(db)
+    posts = await post_crud.get_all_posts_by_title(title)
+
+    if len(posts) != 0:
+        for i in range(len(posts)):
+            posts[i] = await enrich_post_with_reactions(posts[i])
 
-        if len(posts) != 0:
-            for i in range(len(posts)):
-                posts[i] = await enrich_post_with_reactions(posts[i])
+    return posts
 
-        return posts
+
+async def _get_trending_posts(
+    page: PageRequest,
+    db: AsyncSession
+) -> list[ShowPost]:
+    post_ids = await PostReactionCRUD.get_trending_posts(
+        page.skip,
+        page.limit
+    )
+    if len(post_ids) == 0:
+        return []
+    post_crud = PostCRUD(db)
+    posts = await post_crud.get_posts_by_ids(post_ids)
+    return await enrich_posts_with_reactions(posts)
 
 
 async def _update_post(
@@ -53,15 +109,14 @@ async def _update_post(
     updated_post_params: dict,
     db: AsyncSession
 ) -> ShowPost | None:
-    async with db.begin():
-        post_crud = PostCRUD(db)
-        updated_post_params.update({"updated_at": datetime.now()})
-        updated_post = await post_crud.update_post(
-            post_id=post_id,
-            owner_id=owner_id,
-            **updated_post_params
-        )
-        return await enrich_post_with_reactions(updated_post)
+    post_crud = PostCRUD(db)
+    updated_post_params.update({"updated_at": datetime.now()})
+    updated_post = await post_crud.update_post(
+        post_id=post_id,
+        owner_id=owner_id,
+        **updated_post_params
+    )
+    return await enrich_post_with_reactions(updated_post)
 
 
 async def _delete_post(
@@ -69,10 +124,22 @@ async def _delete_post(
     owner_id: UUID,
     db: AsyncSession
 ) -> ShowPost | None:
-    async with db.begin():
-        post_crud = PostCRUD(db)
-        deleted_post = await post_crud.delete_post(post_id, owner_id)
-        return await enrich_post_with_reactions(deleted_post)
+    post_crud = PostCRUD(db)
+    deleted_post = await post_crud.delete_post(post_id, owner_id)
+    if deleted_post is not None:
+        OutboxCRUD(db).add_event(
+            OutboxEventType.POST_DELETED,
+            post_event(deleted_post)
+        )
+        # cleared before the commit: a rollback only costs a cache miss
+        await PublishedPostCRUD.remove(post_id)
+        # and after it, reads racing the commit may have set it back
+        after_commit(db, lambda: PublishedPostCRUD.remove(post_id))
+        after_commit(
+            db, lambda: PostReactionCRUD.remove_trending_post(post_id)
+        )
+        after_commit(db, relay_outbox.delay)
+    return await enrich_post_with_reactions(deleted_post)
 
 
 async def _restore_post(
@@ -80,16 +147,22 @@ async def _restore_post(
     owner_id: UUID,
     db: AsyncSession
 ) -> ShowPost | None:
-    async with db.begin():
-        post_crud = PostCRUD(db)
-        restored_post = await post_crud.restore_post(post_id, owner_id)
-        if restored_post is None:
-            return
-        return await enrich_post_with_reactions(restored_post)
+    post_crud = PostCRUD(db)
+    restored_post = await post_crud.restore_post(post_id, owner_id)
+    if restored_post is None:
+        return
+    OutboxCRUD(db).add_event(
+        OutboxEventType.POST_PUBLISHED,
+        post_event(restored_post)
+    )
+    after_commit(db, lambda: PublishedPostCRUD.add(post_id))
+    after_commit(db, relay_outbox.delay)
+    return await enrich_post_with_reactions(restored_post)
 
 
 async def _add_reaction_to_post(
     post_id: int,
+    owner_id: UUID,
     user_id: UUID,
     reaction: PostReaction
 ) -> None:
@@ -111,7 +184,13 @@ async def _add_reaction_to_post(
             user_id=user_id,
             reaction=PostReaction.LIKE
         )
-    await PostReactionCRUD().add_reaction(post_id, user_id, reaction)
+    if await PostReactionCRUD().add_reaction(post_id, user_id, reaction):
+        await _notify(
+            owner_id,
+            NotificationType(reaction.value),
+            str(post_id),
+            user_id
+        )
 
 
 async def _remove_reaction_from_post(
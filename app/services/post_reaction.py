@@ -15,6 +15,18 @@ async def enrich_post_with_reactions(post: Post) -> ShowPost:
     return resp
 
 
+async def enrich_posts_with_reactions(posts: list[Post]) -> list[ShowPost]:
+    reactions = await PostReactionCRUD.get_reactions_of_posts(
+        [post.id for post in posts]
+    )
+    resps = []
+    for post in posts:
+        resp = ShowPost.from_orm(post)
+        resp.reactions = reactions[post.id]
+        resps.append(resp)
+    return resps
+
+
 async def is_user_liked_post(post_id: int, user_id: UUID) -> bool:
     rk = PostReactionRedisSet(
         post_id=post_id,
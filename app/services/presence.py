@@ -0,0 +1,138 @@
+import asyncio
+from collections import Counter as ConnectionsCounter
+from logging import getLogger
+from uuid import UUID, uuid4
+
+import orjson
+from prometheus_client import Counter
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.services.chat import ConnectionManager, manager
+from app.services.crud import PresenceCRUD
+
+logger = getLogger(__name__)
+
+presence_changes = Counter(
+    "presence_changes_total",
+    "Users who came online or went offline, before coalescing",
+)
+presence_broadcasts = Counter(
+    "presence_broadcasts_total",
+    "Coalesced presence updates broadcast to chat clients",
+)
+
+
+class PresenceService:
+    """
+    Tracks users connected to this worker, its presence for them
+    in Redis is refreshed by heartbeats every `heartbeat_interval`
+    seconds.
+    Presence changes are collected and broadcast to all chat clients
+    at most once per `broadcast_interval`. A user who came online
+    and went offline within one interval is not broadcast at all.
+    """
+    def __init__(
+        self,
+        chat_manager: ConnectionManager = manager,
+        heartbeat_interval: float = settings.PRESENCE_HEARTBEAT_INTERVAL,
+        broadcast_interval: float = settings.PRESENCE_BROADCAST_INTERVAL
+    ):
+        self.chat_manager = chat_manager
+        self.heartbeat_interval = heartbeat_interval
+        self.broadcast_interval = broadcast_interval
+        self.worker_id = uuid4().hex
+        self.local_users: ConnectionsCounter[UUID] = ConnectionsCounter()
+        self._changes: dict[UUID, bool] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        if len(self._tasks) != 0:
+            return
+        self._tasks = [
+            asyncio.create_task(
+                self._every(self.heartbeat_interval, self.heartbeat)
+            ),
+            asyncio.create_task(
+                self._every(self.broadcast_interval, self.flush_changes)
+            ),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        await self.flush_changes()
+
+    async def connect(self, user_id: UUID):
+        self.local_users[user_id] += 1
+        if await PresenceCRUD.connect(user_id, self.worker_id):
+            self._change(user_id, is_online=True)
+
+    async def disconnect(self, user_id: UUID):
+        if self.local_users[user_id] <= 0:
+            return
+        self.local_users[user_id] -= 1
+        if self.local_users[user_id] != 0:
+            return
+        del self.local_users[user_id]
+        if await PresenceCRUD.disconnect(user_id, self.worker_id):
+            self._change(user_id, is_online=False)
+
+    async def heartbeat(self):
+        restored = await PresenceCRUD.refresh(
+            list(self.local_users), self.worker_id
+        )
+        for user_id in restored:
+            self._change(user_id, is_online=True)
+
+    async def flush_changes(self):
+        if len(self._changes) == 0:
+            return
+        changes, self._changes = self._changes, {}
+        await self.chat_manager.broadcast_to_all(
+            orjson.dumps({
+                "type": "presence",
+                # ids loaded by asyncpg are not uuid.UUID for orjson
+                "online": [
+                    str(user_id) for user_id, is_online in changes.items()
+                    if is_online
+                ],
+                "offline": [
+                    str(user_id) for user_id, is_online in changes.items()
+                    if not is_online
+                ],
+            }).decode()
+        )
+        presence_broadcasts.inc()
+
+    def _change(self, user_id: UUID, is_online: bool):
+        presence_changes.inc()
+        if self._changes.get(user_id, is_online) != is_online:
+            # came back to the state clients already know
+            del self._changes[user_id]
+        else:
+            self._changes[user_id] = is_online
+
+    async def _every(self, interval: float, callback):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await callback()
+            except (RedisError, OSError) as err:
+                logger.error(err)
+            except Exception:
+                # the loop must outlive any failed heartbeat or broadcast
+                logger.exception("%s failed", callback.__name__)
+
+
+presence = PresenceService()
+
+
+async def _get_presence(user_ids: list[UUID]) -> dict[UUID, bool]:
+    return await PresenceCRUD.get_presence(user_ids)
@@ -2,37 +2,78 @@ from datetime import datetime
 from uuid import UUID
 
 from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.postgres.models import PortalRole, User
+from app.db.postgres.models import (
+    OutboxEventType,
+    PortalRole,
+    RegistrationStatus,
+    User
+)
+from app.db.postgres.unit_of_work import after_commit
 from app.schemas.user import CreateUser
-from app.services.crud import UserCRUD
+from app.services.crud import OutboxCRUD, UserCRUD
 from app.services.security import Hasher
+from app.utils.celery.worker import relay_outbox
 
 
 async def _create_new_user(body: CreateUser, db: AsyncSession) -> User:
-    async with db.begin():
-        user_crud = UserCRUD(db)
-        return await user_crud.create_user(
-            username=body.username,
-            first_name=body.first_name,
-            last_name=body.last_name,
-            email=body.email,
-            hashed_password=Hasher.get_hashed_password(body.password),
-            roles=[PortalRole.ROLE_PORTAL_USER],
-        )
+    """The user stays pending until the email is verified"""
+    # bcrypt is slow on purpose, keep it off the event loop
+    hashed_password = await run_in_threadpool(
+        Hasher.get_hashed_password,
+        body.password
+    )
+    user_crud = UserCRUD(db)
+    new_user = await user_crud.create_user(
+        username=body.username,
+        first_name=body.first_name,
+        last_name=body.last_name,
+        email=body.email,
+        hashed_password=hashed_password,
+        roles=[PortalRole.ROLE_PORTAL_USER],
+    )
+    OutboxCRUD(db).add_event(
+        OutboxEventType.USER_REGISTERED,
+        {"user_id": str(new_user.id)}
+    )
+    after_commit(db, relay_outbox.delay)
+    return new_user
+
+
+async def _get_registration_status(
+    user_id: UUID,
+    db: AsyncSession
+) -> RegistrationStatus | None:
+    user_crud = UserCRUD(db)
+    return await user_crud.get_registration_status(user_id)
 
 
 async def _delete_user_by_id(user_id: UUID, db: AsyncSession) -> User | None:
-    async with db.begin():
-        user_crud = UserCRUD(db)
-        return await user_crud.delete_user_by_id(user_id)
+    user_crud = UserCRUD(db)
+    deleted_user = await user_crud.delete_user_by_id(user_id)
+    if deleted_user is None:
+        return
+    OutboxCRUD(db).add_event(
+        OutboxEventType.USER_DELETED,
+        {"user_id": str(deleted_user.id)}
+    )
+    after_commit(db, relay_outbox.delay)
+    return deleted_user
 
 
 async def _delete_user_by_email(email: str, db: AsyncSession) -> User | None:
-    async with db.begin():
-        user_crud = UserCRUD(db)
-        return await user_crud.delete_user_by_email(email)
+    user_crud = UserCRUD(db)
+    deleted_user = await user_crud.delete_user_by_email(email)
+    if deleted_user is None:
+        return
+    OutboxCRUD(db).add_event(
+        OutboxEventType.USER_DELETED,
+        {"user_id": str(deleted_user.id)}
+    )
+    after_commit(db, relay_outbox.delay)
+    return deleted_user
 
 
 async def _update_user(
@@ -40,34 +81,38 @@ async def _update_user(
     user_id: UUID,
     db: AsyncSession
 ) -> User | None:
-    async with db.begin():
-        user_crud = UserCRUD(db)
-        updated_user_params.update({"updated_at": datetime.now()})
-        return await user_crud.update_user_by_id(
-            user_id=user_id,
-            **updated_user_params
-        )
+    user_crud = UserCRUD(db)
+    updated_user_params.update({"updated_at": datetime.now()})
+    return await user_crud.update_user_by_id(
+        user_id=user_id,
+        **updated_user_params
+    )
 
 
 async def _get_user_by_id(user_id: UUID, db: AsyncSession) -> User | None:
-    async with db.begin():
-        user_crud = UserCRUD(db)
-        return await user_crud.get_user_by_id(user_id)
+    user_crud = UserCRUD(db)
+    return await user_crud.get_user_by_id(user_id)
 
 
 async def _get_user_by_email(email: str, db: AsyncSession) -> User | None:
-    async with db.begin():
-        user_crud = UserCRUD(db)
-        return await user_crud.get_user_by_email(email)
+    user_crud = UserCRUD(db)
+    return await user_crud.get_user_by_email(email)
 
 
 async def _get_user_by_username(
     username: str,
     db: AsyncSession
 ) -> User | None:
-    async with db.begin():
-        user_crud = UserCRUD(db)
-        return await user_crud.get_user_by_username(username)
+    user_crud = UserCRUD(db)
+    return await user_crud.get_user_by_username(username)
+
+
+async def _get_user_id_by_username(
+    username: str,
+    db: AsyncSession
+) -> UUID | None:
+    user_crud = UserCRUD(db)
+    return await user_crud.get_user_id_by_username(username)
 
 
 def check_user_permissions(target_user: User, current_user: User) -> bool:
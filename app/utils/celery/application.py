@@ -0,0 +1,29 @@
+from celery import Celery
+from kombu import Queue
+
+from app.config import settings
+from app.utils.celery import metrics  # noqa: F401, connects the signals
+
+celery = Celery(
+    "tasks",
+    broker=settings.broker_url,
+    backend=settings.CELERY_RESULT_BACKEND,
+)
+celery.conf.update(
+    worker_pool=settings.CELERY_POOL,
+    worker_concurrency=settings.CELERY_CONCURRENCY,
+    worker_prefetch_multiplier=settings.CELERY_PREFETCH_MULTIPLIER,
+    task_acks_late=settings.CELERY_ACKS_LATE,
+    task_reject_on_worker_lost=settings.CELERY_ACKS_LATE,
+    task_ignore_result=settings.CELERY_RESULT_BACKEND is None,
+    # a worker started without -Q consumes every queue
+    task_queues=[
+        Queue(queue, routing_key=queue) for queue in sorted(
+            {"celery", *settings.CELERY_TASK_QUEUES.values()}
+        )
+    ],
+    task_routes={
+        f"app.utils.celery.worker.{task}": {"queue": queue}
+        for task, queue in settings.CELERY_TASK_QUEUES.items()
+    },
+)
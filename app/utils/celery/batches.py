@@ -0,0 +1,115 @@
+from typing import Any, Callable
+from uuid import uuid4
+
+import orjson
+from prometheus_client import Histogram
+
+from app.config import settings
+from app.db.redis.connection import redis, sync_redis
+from app.utils.celery.application import celery
+
+celery_batch_size = Histogram(
+    "celery_batch_size",
+    "Small jobs handled by one batch task execution",
+    ["batch"],
+    buckets=(1, 10, 50, 100, 500, 1_000),
+)
+
+
+class TaskBatch:
+    """
+    Groups many small jobs into one task execution. Jobs are pushed
+    to a Redis list, the first job of a batch schedules a flush after
+    `interval` seconds and a full batch is flushed right away.
+    `handler` gets a list of up to `size` jobs, jobs of a failed
+    flush are put back to the list and flushed again after `interval`.
+
+    A flush moves its jobs to its own processing list and deletes it
+    only after `handler` succeeded. A flush task redelivered after
+    its worker died handles the jobs left in its processing list.
+    """
+    registry: dict[str, "TaskBatch"] = {}
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[list[Any]], None],
+        queue: str = "celery",
+        size: int = settings.CELERY_BATCH_SIZE,
+        interval: float = settings.CELERY_BATCH_INTERVAL
+    ):
+        self.name = name
+        self.handler = handler
+        self.queue = queue
+        self.size = size
+        self.interval = interval
+        TaskBatch.registry[name] = self
+
+    @property
+    def key(self) -> str:
+        return f"Batch:{self.name}"
+
+    async def add(self, *jobs: Any):
+        length = await redis.rpush(
+            self.key, *[orjson.dumps(job) for job in jobs]
+        )
+        self._schedule(length, added=len(jobs))
+
+    def sync_add(self, *jobs: Any):
+        """`add` for celery tasks, which run outside of the event loop"""
+        length = sync_redis.rpush(
+            self.key, *[orjson.dumps(job) for job in jobs]
+        )
+        self._schedule(length, added=len(jobs))
+
+    def processing_key(self, flush_id: str) -> str:
+        return f"{self.key}:processing:{flush_id}"
+
+    def flush(self, flush_id: str | None = None) -> int:
+        processing_key = self.processing_key(flush_id or str(uuid4()))
+        pipe = sync_redis.pipeline(transaction=True)
+        pipe.lrange(processing_key, 0, -1)
+        pipe.llen(self.key)
+        raw_jobs, left = pipe.execute()
+        if len(raw_jobs) == 0:
+            pipe = sync_redis.pipeline(transaction=True)
+            for _ in range(self.size):
+                pipe.lmove(self.key, processing_key, "LEFT", "RIGHT")
+            pipe.llen(self.key)
+            *moved, left = pipe.execute()
+            raw_jobs = [job for job in moved if job is not None]
+        if len(raw_jobs) != 0:
+            try:
+                self.handler([orjson.loads(job) for job in raw_jobs])
+            except Exception:
+                pipe = sync_redis.pipeline(transaction=True)
+                pipe.lpush(self.key, *reversed(raw_jobs))
+                pipe.delete(processing_key)
+                pipe.execute()
+                flush_task_batch.apply_async(
+                    (self.name,),
+                    queue=self.queue,
+                    countdown=self.interval
+                )
+                raise
+            sync_redis.delete(processing_key)
+            celery_batch_size.labels(batch=self.name).observe(len(raw_jobs))
+        if left != 0:
+            self._schedule(left, added=left)
+        return len(raw_jobs)
+
+    def _schedule(self, length: int, added: int):
+        if length >= self.size > length - added:
+            flush_task_batch.apply_async((self.name,), queue=self.queue)
+        elif length == added:
+            flush_task_batch.apply_async(
+                (self.name,),
+                queue=self.queue,
+                countdown=self.interval
+            )
+
+
+@celery.task(bind=True)
+def flush_task_batch(self, name: str) -> int:
+    # a redelivered task keeps its id, so it finds its processing list
+    return TaskBatch.registry[name].flush(self.request.id)
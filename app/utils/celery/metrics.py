@@ -0,0 +1,83 @@
+import os
+import time
+
+from celery.signals import (
+    before_task_publish,
+    task_postrun,
+    task_prerun,
+    worker_ready
+)
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    multiprocess,
+    start_http_server
+)
+
+from app.config import settings
+
+celery_tasks = Counter(
+    "celery_tasks_total",
+    "Celery tasks finished by this worker",
+    ["task", "state"],
+)
+celery_task_runtime_seconds = Histogram(
+    "celery_task_runtime_seconds",
+    "Time spent running a celery task",
+    ["task"],
+)
+celery_task_queue_latency_seconds = Histogram(
+    "celery_task_queue_latency_seconds",
+    "Time between publishing a celery task and starting it",
+    ["task", "queue"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900),
+)
+
+_started_at: dict[str, float] = {}
+
+
+@before_task_publish.connect
+def stamp_published_at(headers: dict, **kwargs):
+    headers.setdefault("published_at", time.time())
+
+
+@task_prerun.connect
+def observe_queue_latency(task_id: str, task, **kwargs):
+    now = time.time()
+    _started_at[task_id] = now
+    published_at = getattr(task.request, "published_at", None)
+    if published_at is None:
+        # eager calls are not published
+        return
+    delivery_info = task.request.delivery_info or {}
+    celery_task_queue_latency_seconds.labels(
+        task=task.name,
+        queue=delivery_info.get("routing_key") or "",
+    ).observe(max(now - published_at, 0))
+
+
+@task_postrun.connect
+def observe_runtime(task_id: str, task, state: str | None = None, **kwargs):
+    started_at = _started_at.pop(task_id, None)
+    if started_at is not None:
+        celery_task_runtime_seconds.labels(task=task.name).observe(
+            time.time() - started_at
+        )
+    celery_tasks.labels(task=task.name, state=state or "UNKNOWN").inc()
+
+
+@worker_ready.connect
+def start_metrics_server(**kwargs):
+    """
+    Prefork children record metrics in their own processes,
+    set PROMETHEUS_MULTIPROC_DIR to export all of them.
+    """
+    if settings.CELERY_METRICS_PORT is None:
+        return
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    start_http_server(settings.CELERY_METRICS_PORT, registry=registry)
@@ -1,15 +1,522 @@
-from celery import Celery
+from datetime import datetime, timezone
+from uuid import UUID
+
+import numpy as np
+import orjson
+from prometheus_client import Histogram
+from sqlalchemy import and_, delete, func, or_, select, tuple_, update
 
 from app.config import settings
+from app.db.postgres.connection import sync_session
+from app.db.postgres.models import (
+    Follower,
+    OutboxEvent,
+    OutboxEventType,
+    Post,
+    RegistrationStatus,
+    User
+)
+from app.db.redis.connection import sync_redis
+from app.db.redis.models import (
+    EventRedisStream,
+    FollowRedisSet,
+    PostReactionRedisSet,
+    TimelineRedisSortedSet
+)
+from app.schemas.notification import NotificationType
+from app.services import email_verification
+from app.services.crud import NotificationCRUD
+from app.services.follow_suggestions import rank_follow_suggestions
+from app.utils.celery.application import celery
+from app.utils.celery.batches import TaskBatch
+
+celery.conf.beat_schedule = {
+    "rebuild-follow-graph": {
+        "task": "app.utils.celery.worker.rebuild_follow_graph",
+        "schedule": settings.FOLLOW_GRAPH_RECONCILE_INTERVAL,
+    },
+    "repair-user-counters": {
+        "task": "app.utils.celery.worker.repair_user_counters",
+        "schedule": settings.USER_COUNTERS_REPAIR_INTERVAL,
+    },
+    "compute-follow-suggestions": {
+        "task": "app.utils.celery.worker.compute_follow_suggestions",
+        "schedule": settings.FOLLOW_SUGGESTIONS_INTERVAL,
+    },
+    "decay-trending-posts": {
+        "task": "app.utils.celery.worker.decay_trending_posts",
+        "schedule": settings.TRENDING_DECAY_INTERVAL,
+    },
+    "relay-outbox": {
+        "task": "app.utils.celery.worker.relay_outbox",
+        "schedule": settings.OUTBOX_RELAY_INTERVAL,
+    },
+}
+
+feed_fan_out_timelines = Histogram(
+    "feed_fan_out_timelines",
+    "Home timelines written per fanned out post",
+    buckets=(0, 1, 10, 100, 1_000, 10_000, 100_000),
+)
+feed_fan_out_seconds = Histogram(
+    "feed_fan_out_seconds",
+    "Time spent fanning out a post to home timelines",
+)
+notification_digest_size = Histogram(
+    "notification_digest_size",
+    "Events coalesced into one notification entry",
+    ["type"],
+    buckets=(1, 2, 5, 10, 50, 100, 500, 1_000),
+)
+outbox_relay_lag_seconds = Histogram(
+    "outbox_relay_lag_seconds",
+    "Time between writing an outbox event and relaying it",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+)
+
+
+@celery.task
+def verify_registration(user_id: str) -> str | None:
+    """
+    Activates a pending user whose email passed the verification.
+    The verifier runs outside of transactions, it may be slow.
+    """
+    with sync_session() as session:
+        email = session.execute(
+            select(User.email).where(
+                and_(
+                    User.id == user_id,
+                    User.registration_status == RegistrationStatus.PENDING
+                )
+            )
+        ).scalar_one_or_none()
+    if email is None:
+        return
+    is_verified = email_verification.email_verifier.verify(email)
+    registration_status = (
+        RegistrationStatus.VERIFIED if is_verified
+        else RegistrationStatus.REJECTED
+    )
+    with sync_session() as session:
+        with session.begin():
+            session.execute(
+                update(User)
+                .where(
+                    and_(
+                        User.id == user_id,
+                        User.registration_status == RegistrationStatus.PENDING
+                    )
+                )
+                .values(
+                    registration_status=registration_status,
+                    is_active=is_verified
+                )
+            )
+    return registration_status
+
+
+@celery.task
+def rebuild_follow_graph(batch_size: int = 10_000) -> int:
+    """
+    Reconciles the follow graph Redis sets with the follows table.
+    Sets are filled under temporary keys and swapped in with RENAME,
+    sets of users who have no follows anymore are removed. Follows
+    changed while the table was read would be lost by the swap,
+    so they are checked against the table again afterwards.
+    """
+    # recorded by FollowGraphCRUD from now on
+    sync_redis.delete(FollowRedisSet.CHANGES_KEY)
+    rebuilt_keys = set()
+    follows_amount = 0
+    pipe = sync_redis.pipeline(transaction=False)
+    with sync_session() as db:
+        rows = db.execute(
+            select(Follower.user_id, Follower.follower_id)
+            .execution_options(yield_per=batch_size)
+        )
+        for user_id, follower_id in rows:
+            user = FollowRedisSet(user_id=user_id)
+            follower = FollowRedisSet(user_id=follower_id)
+            pipe.sadd(f"{user.followers_key}:rebuild", follower.value)
+            pipe.sadd(f"{follower.following_key}:rebuild", user.value)
+            rebuilt_keys.update((user.followers_key, follower.following_key))
+            follows_amount += 1
+            if follows_amount % batch_size == 0:
+                pipe.execute()
+    pipe.execute()
+
+    stale_keys = {
+        key.decode()
+        for pattern in FollowRedisSet.KEY_PATTERNS
+        for key in sync_redis.scan_iter(match=pattern, count=batch_size)
+    } - rebuilt_keys
+
+    pipe = sync_redis.pipeline(transaction=True)
+    for key in rebuilt_keys:
+        pipe.rename(f"{key}:rebuild", key)
+    for key in stale_keys:
+        pipe.delete(key)
+    pipe.set(FollowRedisSet.BUILT_MARKER_KEY, 1)
+    pipe.smembers(FollowRedisSet.CHANGES_KEY)
+    pipe.delete(FollowRedisSet.CHANGES_KEY)
+    changes = pipe.execute()[-2]
+    replay_follow_changes(changes, batch_size)
+    return follows_amount
+
+
+def replay_follow_changes(changes: set[bytes], batch_size: int):
+    """
+    Sets follows "<user id>:<follower id>" in the graph as they are
+    in the table. Follows changed during the replay are recorded
+    again, the next rebuild fixes them.
+    """
+    pairs = [
+        tuple(UUID(user_id) for user_id in change.decode().split(":"))
+        for change in changes
+    ]
+    for i in range(0, len(pairs), batch_size):
+        batch = pairs[i:i + batch_size]
+        with sync_session() as db:
+            existing = set(db.execute(
+                select(Follower.user_id, Follower.follower_id)
+                .where(
+                    tuple_(Follower.user_id, Follower.follower_id).in_(batch)
+                )
+            ).tuples())
+        pipe = sync_redis.pipeline(transaction=False)
+        for user_id, follower_id in batch:
+            user = FollowRedisSet(user_id=user_id)
+            follower = FollowRedisSet(user_id=follower_id)
+            if (user_id, follower_id) in existing:
+                pipe.sadd(user.followers_key, follower.value)
+                pipe.sadd(follower.following_key, user.value)
+            else:
+                pipe.srem(user.followers_key, follower.value)
+                pipe.srem(follower.following_key, user.value)
+        pipe.execute()
+
+
+@celery.task
+def repair_user_counters() -> int:
+    """
+    Recounts followers / following / posts counters of users
+    whose denormalized values drifted from the source tables.
+    """
+    followers_count = (
+        select(func.count(Follower.id))
+        .where(Follower.user_id == User.id)
+        .scalar_subquery()
+    )
+    following_count = (
+        select(func.count(Follower.id))
+        .where(Follower.follower_id == User.id)
+        .scalar_subquery()
+    )
+    posts_count = (
+        select(func.count(Post.id))
+        .where(and_(Post.owner_id == User.id, Post.is_published == True))
+        .scalar_subquery()
+    )
+    query = (
+        update(User)
+        .where(
+            or_(
+                User.followers_count != followers_count,
+                User.following_count != following_count,
+                User.posts_count != posts_count,
+            )
+        )
+        .values(
+            followers_count=followers_count,
+            following_count=following_count,
+            posts_count=posts_count,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    with sync_session() as db:
+        res = db.execute(query)
+        db.commit()
+        return res.rowcount
+
+
+@celery.task
+def compute_follow_suggestions(batch_size: int = 10_000) -> int:
+    """
+    Ranks friends-of-friends for every user in one sparse matrix pass
+    and stores top candidates in "User:{id} Suggestions" sorted sets.
+    Keys expire after two intervals, so users who lost all candidates
+    stop getting stale suggestions.
+    """
+    with sync_session() as db:
+        rows = db.execute(select(Follower.follower_id, Follower.user_id)).all()
+
+    user_indexes: dict = {}
+    follower_ids = np.empty(len(rows), dtype=np.int32)
+    user_ids = np.empty(len(rows), dtype=np.int32)
+    for i, (follower_id, user_id) in enumerate(rows):
+        follower_ids[i] = user_indexes.setdefault(
+            follower_id, len(user_indexes)
+        )
+        user_ids[i] = user_indexes.setdefault(user_id, len(user_indexes))
+    users = [str(user_id) for user_id in user_indexes]
+
+    users_amount = 0
+    pipe = sync_redis.pipeline(transaction=False)
+    for user_index, candidates, scores in rank_follow_suggestions(
+        follower_ids,
+        user_ids,
+        len(users),
+        limit=settings.FOLLOW_SUGGESTIONS_LIMIT,
+        batch_size=batch_size,
+    ):
+        key = FollowRedisSet(user_id=users[user_index]).suggestions_key
+        pipe.delete(key)
+        pipe.zadd(key, {
+            users[candidate]: int(score)
+            for candidate, score in zip(candidates, scores)
+        })
+        pipe.expire(key, 2 * settings.FOLLOW_SUGGESTIONS_INTERVAL)
+        users_amount += 1
+        if users_amount % 1_000 == 0:
+            pipe.execute()
+    pipe.execute()
+    return users_amount
+
+
+@celery.task
+def fan_out_post(post_id: int, owner_id: str, created_at: float) -> int:
+    """
+    Pushes the post to home timelines of the owner's followers,
+    timelines are trimmed to the newest FEED_TIMELINE_LENGTH posts.
+    Owners with FEED_CELEBRITY_FOLLOWERS_THRESHOLD followers or more
+    are marked as celebrities and skip the fan-out: their posts are
+    pulled from "User:{id} Posts" when followers read the feed.
+    """
+    with feed_fan_out_seconds.time():
+        owner = TimelineRedisSortedSet(user_id=owner_id, post_id=post_id)
+        followers_key = FollowRedisSet(user_id=owner_id).followers_key
+        is_celebrity = (
+            sync_redis.scard(followers_key)
+            >= settings.FEED_CELEBRITY_FOLLOWERS_THRESHOLD
+        )
+        pipe = sync_redis.pipeline(transaction=False)
+        pipe.zadd(owner.posts_key, {owner.value: created_at})
+        pipe.zremrangebyrank(
+            owner.posts_key, 0, -settings.FEED_TIMELINE_LENGTH - 1
+        )
+        if is_celebrity:
+            pipe.sadd(TimelineRedisSortedSet.CELEBRITIES_KEY, owner_id)
+        else:
+            pipe.srem(TimelineRedisSortedSet.CELEBRITIES_KEY, owner_id)
+        pipe.execute()
+
+        followers_amount = 0
+        if not is_celebrity:
+            for follower_id in sync_redis.sscan_iter(
+                followers_key,
+                count=settings.FEED_FAN_OUT_BATCH_SIZE
+            ):
+                tk = TimelineRedisSortedSet(
+                    user_id=follower_id.decode(),
+                    post_id=post_id
+                )
+                pipe.zadd(tk.key, {tk.value: created_at})
+                pipe.zremrangebyrank(
+                    tk.key, 0, -settings.FEED_TIMELINE_LENGTH - 1
+                )
+                followers_amount += 1
+                if followers_amount % settings.FEED_FAN_OUT_BATCH_SIZE == 0:
+                    pipe.execute()
+            pipe.execute()
+    feed_fan_out_timelines.observe(followers_amount)
+    return followers_amount
+
+
+def fan_out_posts(jobs: list[list]):
+    """Posts deleted while they waited in the batch are skipped"""
+    with sync_session() as db:
+        published = set(
+            db.execute(
+                select(Post.id).where(
+                    and_(
+                        Post.id.in_([post_id for post_id, _, _ in jobs]),
+                        Post.is_published == True
+                    )
+                )
+            ).scalars()
+        )
+    for post_id, owner_id, created_at in jobs:
+        if post_id in published:
+            fan_out_post(post_id, owner_id, created_at)
+
+
+fan_out_batch = TaskBatch(
+    "fan_out_post",
+    fan_out_posts,
+    queue=settings.CELERY_TASK_QUEUES["fan_out_post"],
+)
+
+
+@celery.task
+def remove_post_from_timelines(post_id: int, owner_id: str) -> int:
+    """
+    Removes the post from the owner's posts and from home timelines
+    of the owner's followers. Timelines are cleaned for celebrities
+    too, the post may be fanned out before the owner became one.
+    """
+    owner = TimelineRedisSortedSet(user_id=owner_id, post_id=post_id)
+    sync_redis.zrem(owner.posts_key, owner.value)
+    followers_key = FollowRedisSet(user_id=owner_id).followers_key
+    followers_amount = 0
+    pipe = sync_redis.pipeline(transaction=False)
+    for follower_id in sync_redis.sscan_iter(
+        followers_key,
+        count=settings.FEED_FAN_OUT_BATCH_SIZE
+    ):
+        tk = TimelineRedisSortedSet(
+            user_id=follower_id.decode(),
+            post_id=post_id
+        )
+        pipe.zrem(tk.key, tk.value)
+        followers_amount += 1
+        if followers_amount % settings.FEED_FAN_OUT_BATCH_SIZE == 0:
+            pipe.execute()
+    pipe.execute()
+    return followers_amount
+
+
+@celery.task
+def decay_trending_posts() -> int:
+    """
+    Exponentially decays trending scores by one TRENDING_DECAY_INTERVAL
+    step in place (ZUNIONSTORE with a weight) and drops posts
+    which cooled down below TRENDING_MIN_SCORE or fell out of the
+    top TRENDING_MAX_POSTS.
+    """
+    key = PostReactionRedisSet.TRENDING_KEY
+    factor = 0.5 ** (
+        settings.TRENDING_DECAY_INTERVAL / settings.TRENDING_HALF_LIFE
+    )
+    pipe = sync_redis.pipeline(transaction=True)
+    pipe.zunionstore(key, {key: factor})
+    pipe.zremrangebyscore(key, "-inf", f"({settings.TRENDING_MIN_SCORE}")
+    pipe.zremrangebyrank(key, 0, -settings.TRENDING_MAX_POSTS - 1)
+    _, cooled_down, overflow = pipe.execute()
+    return cooled_down + overflow
+
+
+@celery.task
+def flush_notification_digest(
+    user_id: str,
+    notification_type: str,
+    target: str
+) -> int:
+    notification_type = NotificationType(notification_type)
+    count = NotificationCRUD.sync_flush_digest(
+        user_id, notification_type, target
+    )
+    if count != 0:
+        notification_digest_size.labels(
+            type=notification_type.value
+        ).observe(count)
+    return count
+
+
+def notify(
+    user_id: str,
+    notification_type: NotificationType,
+    target: str,
+    actor_id: str,
+    event_id: int | None = None
+):
+    """`_notify` of the notification service for celery tasks"""
+    if NotificationCRUD.sync_add_to_digest(
+        user_id, notification_type, target, actor_id, event_id
+    ):
+        flush_notification_digest.apply_async(
+            (user_id, notification_type.value, target),
+            countdown=settings.NOTIFICATIONS_DIGEST_WINDOW
+        )
+
+
+def publish_events(events: list[OutboxEvent]):
+    """
+    Every event goes to the events stream, events with side effects
+    of their own are handed to their tasks as well.
+    """
+    pipe = sync_redis.pipeline(transaction=False)
+    for event in events:
+        pipe.xadd(
+            EventRedisStream.KEY,
+            {
+                "id": event.id,
+                "type": event.event_type,
+                "payload": orjson.dumps(event.payload),
+            },
+            maxlen=settings.EVENTS_STREAM_MAX_LENGTH,
+            approximate=True,
+        )
+    pipe.execute()
 
-celery = Celery("tasks", broker=settings.broker_url)
+    fan_out_jobs = []
+    for event in events:
+        payload = event.payload
+        if event.event_type == OutboxEventType.POST_PUBLISHED:
+            fan_out_jobs.append([
+                payload["post_id"],
+                payload["owner_id"],
+                payload["created_at"],
+            ])
+        elif event.event_type == OutboxEventType.POST_DELETED:
+            remove_post_from_timelines.delay(
+                payload["post_id"],
+                payload["owner_id"]
+            )
+        elif event.event_type == OutboxEventType.USER_REGISTERED:
+            verify_registration.delay(payload["user_id"])
+        elif event.event_type == OutboxEventType.USER_FOLLOWED:
+            # all new followers of a user share one digest
+            notify(
+                payload["user_id"],
+                NotificationType.FOLLOW,
+                payload["user_id"],
+                payload["follower_id"],
+                event.id
+            )
+    if len(fan_out_jobs) != 0:
+        fan_out_batch.sync_add(*fan_out_jobs)
 
 
 @celery.task
-def verify_email_for_registration(email: str) -> bool:
+def relay_outbox(batch_size: int = settings.OUTBOX_BATCH_SIZE) -> int:
     """
-    Confirmation of mail for registration.
-    TO DO: find and add a service for mail verification.
-    For now, it's used as a stub function
+    Publishes outbox events in batches and deletes them in the same
+    transaction. Rows locked by another relay are skipped, so relays
+    may run concurrently. An event is published again if the relay
+    dies before the commit, consumers dedupe by the event id.
     """
-    return True
+    relayed = 0
+    while True:
+        with sync_session() as db:
+            with db.begin():
+                events = db.execute(
+                    select(OutboxEvent)
+                    .order_by(OutboxEvent.id)
+                    .limit(batch_size)
+                    .with_for_update(skip_locked=True)
+                ).scalars().all()
+                if len(events) == 0:
+                    return relayed
+                publish_events(events)
+                db.execute(
+                    delete(OutboxEvent)
+                    .where(OutboxEvent.id.in_([e.id for e in events]))
+                )
+                now = datetime.now(timezone.utc)
+                for event in events:
+                    outbox_relay_lag_seconds.observe(
+                        (now - event.created_at).total_seconds()
+                    )
+        relayed += len(events)
+        if len(events) < batch_size:
+            return relayed
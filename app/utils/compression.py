@@ -0,0 +1,269 @@
+import zlib
+
+from prometheus_client import Counter
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+COMPRESSIBLE_MEDIA_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+)
+
+compression_bytes_in = Counter(
+    "http_compression_bytes_in_total",
+    "Response bytes before compression",
+    ["encoding"],
+)
+compression_bytes_out = Counter(
+    "http_compression_bytes_out_total",
+    "Response bytes after compression",
+    ["encoding"],
+)
+compression_bytes_saved = Counter(
+    "http_compression_bytes_saved_total",
+    "Egress bytes saved by response compression",
+    ["encoding"],
+)
+
+
+class GzipCompressor:
+    def __init__(self, level: int = 6):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self, quality: int = 4):
+        self._obj = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.process(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush()
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level: int = 3):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+# server preference order, best first
+COMPRESSORS = {
+    encoding: compressor
+    for encoding, compressor, available in (
+        ("zstd", ZstdCompressor, zstandard is not None),
+        ("br", BrotliCompressor, brotli is not None),
+        ("gzip", GzipCompressor, True),
+    )
+    if available
+}
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """
+    Picks the encoding with the highest q-value from `Accept-Encoding`,
+    ties are broken by server preference (zstd, br, gzip).
+    """
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in COMPRESSORS:
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compresses HTTP responses with the encoding negotiated
+    from `Accept-Encoding`. Responses below `minimum_size`,
+    already encoded or non-text ones are sent as is. Text ones
+    always vary by `Accept-Encoding`, even when sent as is, so
+    caches don't serve them to clients of another encoding.
+    WebSockets and `excluded_paths` are never touched.
+    """
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 500,
+        excluded_paths: list[str] | tuple[str, ...] = (),
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.excluded_paths = tuple(excluded_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] != "http"
+            or scope["path"].startswith(self.excluded_paths)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(
+            Headers(scope=scope).get("accept-encoding", "")
+        )
+        responder = CompressionResponder(
+            self.app, encoding, self.minimum_size
+        )
+        await responder(scope, receive, send)
+
+
+class CompressionResponder:
+    def __init__(
+        self,
+        app: ASGIApp,
+        encoding: str | None,
+        minimum_size: int
+    ):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send: Send = None
+        self.start_message: Message | None = None
+        self.buffer = bytearray()
+        self.compressor = None
+        self.passthrough = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = MutableHeaders(raw=message["headers"])
+            is_compressible = (
+                "content-encoding" not in headers
+                and headers.get("content-type", "").startswith(
+                    COMPRESSIBLE_MEDIA_TYPES
+                )
+            )
+            if is_compressible:
+                headers.add_vary_header("Accept-Encoding")
+            self.passthrough = not is_compressible or self.encoding is None
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.passthrough:
+            if self.start_message is not None:
+                await self._send_start()
+                self.start_message = None
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            self.buffer.extend(body)
+            if more_body and len(self.buffer) < self.minimum_size:
+                return
+            body = bytes(self.buffer)
+            self.buffer.clear()
+            if len(body) < self.minimum_size:
+                self.passthrough = True
+                await self._send_start()
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            self.compressor = COMPRESSORS[self.encoding]()
+            if not more_body:
+                compressed = self._compress(body, finish=True)
+                await self._send_start(content_length=len(compressed))
+                await self.send({
+                    "type": "http.response.body",
+                    "body": compressed,
+                })
+                self._record_metrics()
+                return
+            await self._send_start()
+
+        chunk = self._compress(body, finish=not more_body)
+        await self.send({
+            "type": "http.response.body",
+            "body": chunk,
+            "more_body": more_body,
+        })
+        if not more_body:
+            self._record_metrics()
+
+    def _compress(self, body: bytes, finish: bool) -> bytes:
+        self.bytes_in += len(body)
+        chunk = self.compressor.compress(body)
+        if finish:
+            chunk += self.compressor.finish()
+        else:
+            chunk += self.compressor.flush()
+        self.bytes_out += len(chunk)
+        return chunk
+
+    async def _send_start(self, content_length: int | None = None):
+        message = self.start_message
+        if self.compressor is not None:
+            headers = MutableHeaders(raw=message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            if content_length is None:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(content_length)
+        await self.send(message)
+
+    def _record_metrics(self):
+        compression_bytes_in.labels(self.encoding).inc(self.bytes_in)
+        compression_bytes_out.labels(self.encoding).inc(self.bytes_out)
+        compression_bytes_saved.labels(self.encoding).inc(
+            max(self.bytes_in - self.bytes_out, 0)
+        )
@@ -0,0 +1,81 @@
+import asyncio
+from functools import wraps
+from typing import Any, Callable
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from starlette.responses import Response
+
+
+def _orjson_default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    return jsonable_encoder(obj)
+
+
+class ORJSONModelResponse(JSONResponse):
+    """
+    JSON response for content that is already validated:
+    pydantic models (or lists of them) are dumped with orjson as is.
+    """
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_orjson_default,
+            option=orjson.OPT_NON_STR_KEYS,
+        )
+
+
+class ModelResponseRoute(APIRoute):
+    """
+    Route that skips `response_model` re-validation for endpoints
+    declared with `response_class=ORJSONModelResponse`.
+    `response_model` is still used for the OpenAPI schema.
+    """
+    def get_route_handler(self) -> Callable:
+        if self._is_fast_response():
+            self.dependant.call = self._wrap_endpoint(self.dependant.call)
+        return super().get_route_handler()
+
+    def _is_fast_response(self) -> bool:
+        response_class = self.response_class
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = response_class.value
+        return issubclass(response_class, ORJSONModelResponse)
+
+    def _wrap_endpoint(self, call: Callable) -> Callable:
+        response_class = self.response_class
+        status_code = self.status_code
+        response_param_name = self.dependant.response_param_name
+        is_coroutine = asyncio.iscoroutinefunction(call)
+
+        @wraps(call)
+        async def endpoint(**kwargs) -> Response:
+            if is_coroutine:
+                content = await call(**kwargs)
+            else:
+                content = await run_in_threadpool(call, **kwargs)
+            if isinstance(content, Response):
+                return content
+
+            sub_response: Response | None = kwargs.get(response_param_name)
+            response = response_class(
+                content,
+                status_code=(
+                    sub_response and sub_response.status_code
+                    or status_code
+                    or 200
+                ),
+            )
+            if sub_response is not None:
+                for key, value in sub_response.headers.items():
+                    if key != "content-length":
+                        response.headers[key] = value
+            return response
+
+        return endpoint
@@ -0,0 +1,30 @@
+import socket
+
+import uvicorn
+
+from app.services.chat import manager as chat_manager
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    uvicorn closes WebSockets with 1012 before the lifespan shutdown,
+    drain the chat first so clients get their reconnect hints.
+    """
+    async def shutdown(self, sockets: list[socket.socket] | None = None):
+        await chat_manager.drain()
+        await super().shutdown(sockets=sockets)
+
+
+def run():
+    config = uvicorn.Config(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8080,
+        ws="websockets",
+        ws_per_message_deflate=True,
+    )
+    DrainingServer(config).run()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,95 @@
+"""
+Bytes per chat message and encode/decode CPU of the chat frame formats:
+bare text (default, no metadata), orjson and msgpack frames carrying
+id, room, sender and timestamp. "deflated" is the frame size after
+permessage-deflate with context takeover, as negotiated by uvicorn;
+every frame repeats the same sentence, so it is a lower bound.
+CPU is also shown as the share of one core at 10k messages per second.
+
+Run: python -m benchmarks.bench_chat_protocol
+"""
+import time
+import zlib
+from uuid import uuid4
+
+import msgpack
+import orjson
+
+from app.services.chat import ChatFrame
+
+MESSAGES_PER_SECOND = 10_000
+MIN_DURATION = 1.0  # seconds of CPU per measurement
+SENTENCES = (
+    "hi",
+    "Client #3 says: see you at the meetup tomorrow",
+    "Has anyone tried the new feed? Posts from people I follow load "
+    "instantly now, even the ones from accounts with lots of followers.",
+)
+
+FORMATS = {
+    "text": (
+        lambda frame: frame.message.encode(),
+        lambda raw: raw.decode(),
+    ),
+    "orjson": (
+        lambda frame: orjson.dumps(frame.to_payload()),
+        orjson.loads,
+    ),
+    "msgpack": (
+        lambda frame: msgpack.packb(frame.to_payload()),
+        msgpack.unpackb,
+    ),
+}
+
+
+def make_frames(message: str, amount: int = 1_000) -> list[ChatFrame]:
+    senders = [uuid4() for _ in range(10)]
+    return [
+        ChatFrame(message, "public", senders[i % len(senders)])
+        for i in range(amount)
+    ]
+
+
+def deflated_size(frames: list[bytes]) -> float:
+    """Mean compressed size of a frame on a long-lived connection"""
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    total = 0
+    for frame in frames:
+        # permessage-deflate strips the trailing 0x00 0x00 0xff 0xff
+        total += len(compressor.compress(frame)) - 4
+        total += len(compressor.flush(zlib.Z_SYNC_FLUSH))
+    return total / len(frames)
+
+
+def measure(function, items: list) -> float:
+    """Returns CPU microseconds per item."""
+    iterations = 0
+    start = time.process_time()
+    while time.process_time() - start < MIN_DURATION:
+        for item in items:
+            function(item)
+        iterations += len(items)
+    return (time.process_time() - start) / iterations * 1_000_000
+
+
+def main() -> None:
+    print(
+        f"{'chars':>6} {'format':>8} {'bytes':>6} {'deflated':>9} "
+        f"{'encode, us':>11} {'decode, us':>11} {'core at 10k/s':>14}"
+    )
+    for message in SENTENCES:
+        frames = make_frames(message)
+        for name, (encode, decode) in FORMATS.items():
+            encoded = [encode(frame) for frame in frames]
+            encode_us = measure(encode, frames)
+            decode_us = measure(decode, encoded)
+            core = (encode_us + decode_us) * MESSAGES_PER_SECOND / 1_000_000
+            print(
+                f"{len(message):>6} {name:>8} "
+                f"{len(encoded[0]):>6} {deflated_size(encoded):>9.1f} "
+                f"{encode_us:>11.2f} {decode_us:>11.2f} {core:>13.1%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Per-request CPU of serializing `ShowPost` lists:
+default FastAPI path (response_model re-validation + JSONResponse)
+vs. ORJSONModelResponse (pre-validated models dumped with orjson).
+
+Run: python -m benchmarks.bench_responses
+"""
+import asyncio
+import time
+from datetime import datetime
+from uuid import uuid4
+
+import orjson
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.schemas.post import PostReaction, ShowPost
+from app.utils.responses import ORJSONModelResponse
+
+SIZES = (1, 50, 500)
+MIN_DURATION = 1.0  # seconds of CPU per measurement
+
+
+def make_posts(amount: int) -> list[ShowPost]:
+    now = datetime.now()
+    return [
+        ShowPost(
+            id=i,
+            title=f"Post #{i}",
+            content="Lorem ipsum dolor sit amet. " * 10,
+            owner_id=uuid4(),
+            is_published=True,
+            created_at=now,
+            updated_at=now,
+            reactions={PostReaction.LIKE: i, PostReaction.DISLIKE: 0},
+        )
+        for i in range(amount)
+    ]
+
+
+async def default_response(field, posts: list[ShowPost]) -> bytes:
+    content = await serialize_response(
+        field=field,
+        response_content=posts,
+        is_coroutine=True,
+    )
+    return JSONResponse(content).body
+
+
+async def fast_response(field, posts: list[ShowPost]) -> bytes:
+    return ORJSONModelResponse(posts).body
+
+
+async def measure(render, field, posts: list[ShowPost]) -> float:
+    """Returns CPU microseconds per request."""
+    iterations = 0
+    start = time.process_time()
+    while time.process_time() - start < MIN_DURATION:
+        await render(field, posts)
+        iterations += 1
+    return (time.process_time() - start) / iterations * 1_000_000
+
+
+async def main() -> None:
+    field = create_response_field(name="Response", type_=list[ShowPost])
+    print(f"{'items':>6} {'default, us':>14} {'orjson, us':>12} {'speedup':>8}")
+    for size in SIZES:
+        posts = make_posts(size)
+        assert (
+            orjson.loads(await default_response(field, posts))
+            == orjson.loads(await fast_response(field, posts))
+        )
+        default = await measure(default_response, field, posts)
+        fast = await measure(fast_response, field, posts)
+        print(f"{size:>6} {default:>14.1f} {fast:>12.1f} {default / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
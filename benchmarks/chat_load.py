@@ -0,0 +1,284 @@
+"""
+Load generator for the chat WebSocket endpoint.
+
+Opens `--clients` sockets spread over `--rooms` rooms, then `--senders`
+of them send `--rate` messages per second in total for `--duration`
+seconds. Every message carries its send time, so receivers measure
+fan-out latency. Prints one JSON report to diff between releases:
+connect time, fan-out latency, memory per connection of the server
+process and messages which never arrived.
+
+With `--spawn` a uvicorn worker is started on `--port` and stopped
+afterwards, otherwise pass `--url` and, for memory, `--pid`.
+
+Run: python -m benchmarks.chat_load --spawn --clients 2000
+"""
+import argparse
+import asyncio
+import platform
+import resource
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import orjson
+import websockets
+
+MARKER = "load:"
+
+
+@dataclass
+class Stats:
+    connect_seconds: list[float] = field(default_factory=list)
+    connect_failures: int = 0
+    latencies: list[float] = field(default_factory=list)
+    sent: dict[str, int] = field(default_factory=dict)
+    received: int = 0
+    closed_by_server: dict[str, int] = field(default_factory=dict)
+
+
+def percentiles(values: list[float], scale: float = 1.0) -> dict:
+    if len(values) == 0:
+        return {"p50": None, "p99": None, "max": None}
+    values = sorted(values)
+
+    def at(quantile: float) -> float:
+        index = min(len(values) - 1, int(quantile * len(values)))
+        return round(values[index] * scale, 3)
+
+    return {"p50": at(0.50), "p99": at(0.99), "max": at(1.0)}
+
+
+def rss_kib(pid: int | None) -> int | None:
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def raise_open_files_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def wait_for_port(host: str, port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            await asyncio.sleep(0.2)
+            continue
+        writer.close()
+        await writer.wait_closed()
+        return
+    raise TimeoutError(f"Nothing listens on {host}:{port}")
+
+
+class Client:
+    def __init__(self, client_id: int, room: str, url: str, stats: Stats):
+        self.client_id = client_id
+        self.room = room
+        self.url = url.format(client_id=client_id, room=room)
+        self.stats = stats
+        self.websocket = None
+        self.reader: asyncio.Task | None = None
+
+    async def connect(self, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                self.websocket = await websockets.connect(
+                    self.url, open_timeout=30, max_queue=None
+                )
+            except (
+                OSError,
+                asyncio.TimeoutError,
+                websockets.WebSocketException
+            ):
+                self.stats.connect_failures += 1
+                return
+            self.stats.connect_seconds.append(time.perf_counter() - start)
+        self.reader = asyncio.create_task(self.read())
+
+    async def read(self):
+        try:
+            async for message in self.websocket:
+                _, _, text = message.partition(MARKER)
+                if not text:
+                    continue
+                self.stats.received += 1
+                sent_at = float(text)
+                self.stats.latencies.append(time.perf_counter() - sent_at)
+        except websockets.ConnectionClosed as err:
+            if err.rcvd is not None:
+                code = str(err.rcvd.code)
+                self.stats.closed_by_server[code] = (
+                    self.stats.closed_by_server.get(code, 0) + 1
+                )
+
+    async def send(self):
+        await self.websocket.send(f"{MARKER}{time.perf_counter()}")
+        self.stats.sent[self.room] = self.stats.sent.get(self.room, 0) + 1
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+        if self.reader is not None:
+            await self.reader
+
+
+async def send_load(senders: list[Client], rate: float, duration: float):
+    interval = 1 / rate
+    start = time.perf_counter()
+    sent = 0
+    while time.perf_counter() - start < duration:
+        sender = senders[sent % len(senders)]
+        if sender.websocket is not None and sender.websocket.open:
+            await sender.send()
+        sent += 1
+        # keep the rate over the whole run, not per message
+        delay = start + sent * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    raise_open_files_limit()
+    server, pid = None, args.pid
+    if args.spawn:
+        server = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--host", "127.0.0.1", "--port", str(args.port),
+                "--ws", "websockets", "--log-level", "warning",
+            ]
+        )
+        pid = server.pid
+    try:
+        if server is not None:
+            # the url may name the worker differently, e.g. "localhost"
+            url = urlsplit(args.url)
+            await wait_for_port(
+                url.hostname or "127.0.0.1",
+                url.port or (443 if url.scheme == "wss" else 80)
+            )
+        return await load(args, pid)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+async def load(args: argparse.Namespace, pid: int | None) -> dict:
+    stats = Stats()
+    rooms = [f"load-{i}" for i in range(args.rooms)]
+    clients = [
+        Client(i, rooms[i % len(rooms)], args.url, stats)
+        for i in range(args.clients)
+    ]
+    rss_before = rss_kib(pid)
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+    start = time.perf_counter()
+    await asyncio.gather(*[client.connect(semaphore) for client in clients])
+    connect_wall_seconds = time.perf_counter() - start
+    # let the server settle its per-connection state
+    await asyncio.sleep(1)
+    rss_connected = rss_kib(pid)
+
+    connected = [client for client in clients if client.websocket is not None]
+    senders = connected[:args.senders]
+    if len(senders) != 0:
+        await send_load(senders, args.rate, args.duration)
+    await asyncio.sleep(args.grace)
+
+    members: dict[str, int] = {}
+    for client in connected:
+        members[client.room] = members.get(client.room, 0) + 1
+    expected = sum(
+        amount * members[room] for room, amount in stats.sent.items()
+    )
+    await asyncio.gather(*[client.close() for client in connected])
+
+    memory_per_connection = None
+    if rss_before is not None and rss_connected is not None and connected:
+        memory_per_connection = round(
+            (rss_connected - rss_before) / len(connected), 2
+        )
+    return {
+        "python": platform.python_version(),
+        "config": vars(args),
+        "clients": args.clients,
+        "connected": len(connected),
+        "connect_failures": stats.connect_failures,
+        "connect_wall_seconds": round(connect_wall_seconds, 3),
+        "connect_ms": percentiles(stats.connect_seconds, 1_000),
+        "messages_sent": sum(stats.sent.values()),
+        "deliveries_expected": expected,
+        "deliveries_received": stats.received,
+        "dropped": expected - stats.received,
+        "fan_out_latency_ms": percentiles(stats.latencies, 1_000),
+        "closed_by_server": stats.closed_by_server,
+        "server_rss_kib": {"before": rss_before, "connected": rss_connected},
+        "memory_per_connection_kib": memory_per_connection,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=1_000)
+    parser.add_argument("--rooms", type=int, default=1)
+    parser.add_argument("--senders", type=int, default=10)
+    parser.add_argument(
+        "--rate", type=float, default=10, help="messages per second"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=10, help="seconds of sending"
+    )
+    parser.add_argument(
+        "--grace", type=float, default=2,
+        help="seconds to wait for deliveries after the last message",
+    )
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--url",
+        default=None,
+        help="defaults to the legacy endpoint on --port, "
+        "{client_id} and {room} are substituted",
+    )
+    parser.add_argument(
+        "--spawn", action="store_true", help="start a uvicorn worker"
+    )
+    parser.add_argument("--pid", type=int, help="server pid for memory")
+    parser.add_argument("--output", help="write the report to a file")
+    args = parser.parse_args()
+    if args.url is None:
+        args.url = (
+            f"ws://127.0.0.1:{args.port}/chat/ws/{{client_id}}?room={{room}}"
+        )
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    report = orjson.dumps(
+        asyncio.run(run(args)),
+        option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS,
+    )
+    if args.output is not None:
+        with open(args.output, "wb") as output:
+            output.write(report)
+    sys.stdout.buffer.write(report + b"\n")
+
+
+if __name__ == "__main__":
+    main()
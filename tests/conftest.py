@@ -11,9 +11,13 @@ from sqlalchemy_utils import create_database, database_exists
 
 from app.main import app
 from app.config import settings
-from app.db.postgres.connection import get_db
+from app.db.postgres.connection import get_db, sync_session
 from app.db.postgres.models import Base
+from app.db.postgres.unit_of_work import get_uow, unit_of_work_dependency
+from app.db.redis.connection import sync_redis
+from app.db.redis.models import PublishedPostRedisBitmap
 from app.services.oauth2 import create_access_token
+from app.utils.celery.worker import celery
 
 DATABASE_URL = f"{settings.database_url}_test"
 ASYNC_DATABASE_URL = f"{settings.async_database_url}_test"
@@ -25,6 +29,9 @@ async_engine = create_async_engine(
     echo=True,
     future=True
 )
+# celery tasks run in-process and work with the test database
+sync_session.configure(bind=sync_engine)
+celery.conf.task_always_eager = True
 testing_async_session = sessionmaker(
     bind=async_engine,
     expire_on_commit=False,
@@ -48,6 +55,19 @@ async def prepare_database():
     Base.metadata.create_all(bind=sync_engine)
 
 
+@pytest.fixture(autouse=True, scope="module")
+def reset_published_posts():
+    # post ids start over with the database of every test module
+    sync_redis.delete(PublishedPostRedisBitmap.KEY)
+
+
+@pytest.fixture(autouse=True, scope="module")
+def reset_notified_events():
+    # so are outbox event ids, notified ones would be skipped
+    for key in sync_redis.scan_iter(match="Events:* notified"):
+        sync_redis.delete(key)
+
+
 @pytest.fixture
 async def session():
     db: AsyncSession = testing_async_session()
@@ -66,6 +86,9 @@ async def client(session):
             await session.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_uow] = unit_of_work_dependency(
+        testing_async_session
+    )
 
     # https://github.com/long2ice/fastapi-cache/issues/49
     # https://github.com/encode/httpx/issues/350
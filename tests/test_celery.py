@@ -0,0 +1,107 @@
+import pytest
+
+from app.db.redis.connection import redis
+from app.utils.celery import batches
+from app.utils.celery.batches import TaskBatch, flush_task_batch
+from app.utils.celery.worker import celery
+
+
+class ScheduledFlushes:
+    def __init__(self):
+        self.calls: list[dict] = []
+
+    def apply_async(self, args: tuple, **options):
+        self.calls.append({"args": args, **options})
+
+
+@pytest.fixture
+def scheduled(monkeypatch: pytest.MonkeyPatch) -> ScheduledFlushes:
+    scheduled = ScheduledFlushes()
+    monkeypatch.setattr(batches, "flush_task_batch", scheduled)
+    return scheduled
+
+
+@pytest.fixture
+async def batch():
+    handled: list[list] = []
+    batch = TaskBatch("test", handled.append, queue="feed", size=3)
+    batch.handled = handled
+    await redis.delete(batch.key)
+    yield batch
+    await redis.delete(batch.key)
+    del TaskBatch.registry["test"]
+
+
+async def test_batch_is_flushed_by_size_or_interval(
+    batch: TaskBatch,
+    scheduled: ScheduledFlushes
+):
+    await batch.add(1)
+    await batch.add(2)
+    assert scheduled.calls == [
+        {"args": ("test",), "queue": "feed", "countdown": batch.interval}
+    ]
+    await batch.add(3, 4)
+    assert scheduled.calls[1:] == [{"args": ("test",), "queue": "feed"}]
+
+    assert batch.flush() == 3
+    assert batch.handled == [[1, 2, 3]]
+    # the rest waits for the interval
+    assert scheduled.calls[2]["countdown"] == batch.interval
+    assert batch.flush() == 1
+    assert batch.handled == [[1, 2, 3], [4]]
+    assert batch.flush() == 0
+
+
+async def test_jobs_of_failed_flush_are_retried(
+    batch: TaskBatch,
+    scheduled: ScheduledFlushes
+):
+    failed: list[list] = []
+
+    def fail_once(jobs: list):
+        if len(failed) == 0:
+            failed.append(jobs)
+            raise RuntimeError("handler failed")
+        batch.handled.append(jobs)
+
+    await batch.add({"id": 1}, {"id": 2})
+    batch.handler = fail_once
+    with pytest.raises(RuntimeError):
+        batch.flush()
+    assert scheduled.calls[-1] == {
+        "args": ("test",), "queue": "feed", "countdown": batch.interval
+    }
+    assert flush_task_batch(*scheduled.calls[-1]["args"]) == 2
+    assert batch.handled == [[{"id": 1}, {"id": 2}]]
+
+
+async def test_jobs_of_killed_flush_are_handled_by_its_redelivery(
+    batch: TaskBatch,
+    scheduled: ScheduledFlushes
+):
+    def kill_worker(jobs: list):
+        raise SystemExit("worker killed")
+
+    await batch.add({"id": 1}, {"id": 2})
+    batch.handler = kill_worker
+    with pytest.raises(SystemExit):
+        batch.flush("redelivered")
+    assert await redis.llen(batch.key) == 0
+
+    batch.handler = batch.handled.append
+    assert batch.flush("redelivered") == 2
+    assert batch.handled == [[{"id": 1}, {"id": 2}]]
+    assert await redis.exists(batch.processing_key("redelivered")) == 0
+
+
+@pytest.mark.parametrize("task, queue", [
+    ("app.utils.celery.worker.fan_out_post", "feed"),
+    ("app.utils.celery.worker.verify_registration", "registration"),
+    ("app.utils.celery.worker.rebuild_follow_graph", "maintenance"),
+    ("app.utils.celery.batches.flush_task_batch", "celery"),
+])
+def test_tasks_are_routed_to_their_queues(task: str, queue: str):
+    route = celery.amqp.router.route({}, task)
+    assert route["queue"].name == queue
+    assert route["queue"].routing_key == queue
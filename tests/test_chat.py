@@ -0,0 +1,476 @@
+import asyncio
+from uuid import uuid4
+
+import msgpack
+import orjson
+import pytest
+from fastapi import WebSocketDisconnect, WebSocketException, status
+from httpx import AsyncClient
+from prometheus_client import REGISTRY
+from redis.exceptions import ConnectionError as RedisConnectionError
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from app.config import settings
+from app.db.postgres.models import Message
+from app.db.redis.connection import redis
+from app.db.redis.models import ChatRedisChannel
+from app.services.chat import (
+    MSGPACK_SUBPROTOCOL,
+    BufferedMessage,
+    ChatMessageBuffer,
+    ConnectionManager,
+    receive_message
+)
+from app.services.crud import ChatHistoryCRUD
+from tests.conftest import testing_async_session as session_factory
+
+
+class FakeWebSocket:
+    def __init__(
+        self,
+        blocked: bool = False,
+        subprotocols: list[str] | None = None,
+        received: list[dict] | None = None
+    ):
+        self.scope = {"subprotocols": subprotocols or []}
+        self.subprotocol: str | None = None
+        self.received = received or []
+        self.sent: list[str | bytes] = []
+        self.close_code: int | None = None
+        self.unblocked = asyncio.Event()
+        if not blocked:
+            self.unblocked.set()
+
+    async def accept(self, subprotocol: str | None = None):
+        self.subprotocol = subprotocol
+
+    async def receive(self) -> dict:
+        return self.received.pop(0)
+
+    async def send_text(self, message: str):
+        await self.unblocked.wait()
+        self.sent.append(message)
+
+    async def send_bytes(self, message: bytes):
+        await self.unblocked.wait()
+        self.sent.append(message)
+
+    async def close(self, code: int = status.WS_1000_NORMAL_CLOSURE):
+        self.close_code = code
+
+
+async def count_messages(text: str) -> int:
+    async with session_factory() as session:
+        res = await session.execute(
+            select(func.count(Message.id)).where(Message.message == text)
+        )
+        return res.scalar_one()
+
+
+async def buffered(message: str, room: str = "public") -> BufferedMessage:
+    manager = ConnectionManager(session_factory=session_factory)
+    room_id = await manager.get_room_id(room)
+    return BufferedMessage(room, room_id, None, message)
+
+
+async def drain():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+async def test_broadcast_is_not_delayed_by_slow_client():
+    manager = ConnectionManager(
+        session_factory=session_factory,
+        queue_size=10
+    )
+    fast, slow = FakeWebSocket(), FakeWebSocket(blocked=True)
+    await manager.connect(fast)
+    await manager.connect(slow)
+
+    for i in range(3):
+        await manager.broadcast(f"message {i}", add_to_db=False)
+    await drain()
+    assert fast.sent == ["message 0", "message 1", "message 2"]
+    assert slow.sent == []
+
+    slow.unblocked.set()
+    await drain()
+    assert slow.sent == ["message 0", "message 1", "message 2"]
+    manager.disconnect(fast)
+    manager.disconnect(slow)
+
+
+async def test_slow_client_is_dropped_on_queue_overflow():
+    manager = ConnectionManager(
+        session_factory=session_factory,
+        queue_size=2
+    )
+    fast, slow = FakeWebSocket(), FakeWebSocket(blocked=True)
+    await manager.connect(fast)
+    await manager.connect(slow)
+
+    for i in range(4):
+        await manager.broadcast(f"message {i}", add_to_db=False)
+        await drain()
+    assert slow not in manager.active_connections
+    assert slow.close_code == status.WS_1013_TRY_AGAIN_LATER
+    assert fast in manager.active_connections
+    assert len(fast.sent) == 4
+    manager.disconnect(fast)
+
+
+async def test_disconnect_is_idempotent():
+    manager = ConnectionManager(
+        session_factory=session_factory,
+        queue_size=2
+    )
+    websocket = FakeWebSocket()
+    await manager.connect(websocket)
+    manager.disconnect(websocket)
+    manager.disconnect(websocket)
+    assert manager.active_connections == {}
+
+
+async def test_broadcast_reaches_only_its_room():
+    manager = ConnectionManager(session_factory=session_factory)
+    lobby, kitchen = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(lobby, room="lobby", user_id=1)
+    await manager.connect(kitchen, room="kitchen", user_id=2)
+    assert manager.active_connections[lobby].room == "lobby"
+
+    await manager.broadcast("in the lobby", add_to_db=False, room="lobby")
+    await drain()
+    assert lobby.sent == ["in the lobby"]
+    assert kitchen.sent == []
+
+    manager.disconnect(lobby)
+    assert "lobby" not in manager.rooms
+    assert "kitchen" in manager.rooms
+    manager.disconnect(kitchen)
+
+
+async def test_broadcast_reaches_other_workers_once():
+    # two managers stand for two uvicorn workers sharing Redis
+    first_worker = ConnectionManager(session_factory=session_factory)
+    second_worker = ConnectionManager(session_factory=session_factory)
+    await first_worker.start()
+    await second_worker.start()
+    local, remote = FakeWebSocket(), FakeWebSocket()
+    await first_worker.connect(local)
+    await second_worker.connect(remote)
+
+    await first_worker.broadcast("hello from another worker", add_to_db=False)
+    for _ in range(50):
+        if remote.sent:
+            break
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.05)
+    assert local.sent == ["hello from another worker"]
+    assert remote.sent == ["hello from another worker"]
+
+    first_worker.disconnect(local)
+    second_worker.disconnect(remote)
+    await first_worker.stop()
+    await second_worker.stop()
+
+
+async def test_buffer_flushes_by_size():
+    buffer = ChatMessageBuffer(
+        session_factory=session_factory,
+        flush_size=3,
+        flush_interval=60
+    )
+    await buffer.start()
+    for _ in range(3):
+        await buffer.add(await buffered("flushed by size"))
+    for _ in range(50):
+        if len(buffer) == 0:
+            break
+        await asyncio.sleep(0.01)
+    assert await count_messages("flushed by size") == 3
+    await buffer.stop()
+
+
+async def test_buffer_is_drained_on_stop():
+    buffer = ChatMessageBuffer(
+        session_factory=session_factory,
+        flush_size=100,
+        flush_interval=60
+    )
+    await buffer.start()
+    await buffer.add(await buffered("drained on stop"))
+    await buffer.add(await buffered("drained on stop"))
+    await drain()
+    assert await count_messages("drained on stop") == 0
+    await buffer.stop()
+    assert len(buffer) == 0
+    assert await count_messages("drained on stop") == 2
+
+
+async def test_failed_publish_keeps_local_delivery(
+    monkeypatch: pytest.MonkeyPatch
+):
+    async def publish(*args):
+        raise RedisConnectionError("redis is down")
+
+    monkeypatch.setattr(redis, "publish", publish)
+    manager = ConnectionManager(session_factory=session_factory)
+    websocket = FakeWebSocket()
+    await manager.connect(websocket)
+    failed = REGISTRY.get_sample_value("chat_failed_publishes_total")
+    await manager.broadcast("delivered locally", add_to_db=False)
+    await drain()
+    assert websocket.sent == ["delivered locally"]
+    assert REGISTRY.get_sample_value(
+        "chat_failed_publishes_total"
+    ) == failed + 1
+    manager.disconnect(websocket)
+
+
+async def test_buffer_applies_backpressure_when_full():
+    buffer = ChatMessageBuffer(
+        session_factory=session_factory,
+        flush_size=100,
+        flush_interval=60,
+        max_size=2
+    )
+    message = await buffered("backpressure")
+    await buffer.add(message)
+    await buffer.add(message)
+    blocked = asyncio.create_task(buffer.add(message))
+    await drain()
+    assert not blocked.done()
+    await buffer.flush()
+    await asyncio.wait_for(blocked, timeout=1)
+    assert len(buffer) == 1
+    await buffer.stop()
+    assert await count_messages("backpressure") == 3
+
+
+async def test_buffer_drops_rejected_messages_after_retries():
+    buffer = ChatMessageBuffer(
+        session_factory=session_factory,
+        flush_interval=60,
+        max_retries=2
+    )
+    await buffer.add(await buffered("written despite a bad row"))
+    # the room was deleted meanwhile
+    await buffer.add(BufferedMessage("deleted", 2 ** 31 - 1, None, "lost"))
+    for _ in range(2):
+        with pytest.raises(IntegrityError):
+            await buffer.flush()
+    assert len(buffer) == 2
+
+    await buffer.flush()
+    assert len(buffer) == 0
+    assert await count_messages("written despite a bad row") == 1
+    assert await count_messages("lost") == 0
+
+
+async def test_flushed_messages_are_kept_in_capped_history(
+    monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(settings, "CHAT_HISTORY_SIZE", 2)
+    channel = ChatRedisChannel(room="test")
+    await redis.delete(channel.history_key)
+    buffer = ChatMessageBuffer(
+        session_factory=session_factory,
+        flush_interval=60
+    )
+    for i in range(3):
+        await buffer.add(await buffered(f"history {i}", room="test"))
+    await buffer.flush()
+
+    history = await ChatHistoryCRUD.get_last_messages(channel, 10)
+    assert [message["message"] for message in history] == [
+        "history 2", "history 1"
+    ]
+    assert history[0]["id"] > history[1]["id"]
+    await redis.delete(channel.history_key)
+
+
+async def test_broadcast_messages_are_in_history_before_flush(
+    monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(settings, "CHAT_HISTORY_SIZE", 2)
+    channel = ChatRedisChannel(room="test")
+    await redis.delete(channel.history_key)
+    manager = ConnectionManager(session_factory=session_factory)
+    manager.buffer.flush_interval = 60
+    for i in range(3):
+        await manager.broadcast(f"recent {i}", add_to_db=True, room="test")
+    assert await count_messages("recent 2") == 0
+
+    history = await ChatHistoryCRUD.get_last_messages(channel, 10)
+    assert [message["message"] for message in history] == [
+        "recent 2", "recent 1"
+    ]
+    assert history[0]["id"] > history[1]["id"]
+    await manager.buffer.stop()
+    async with session_factory() as session:
+        res = await session.execute(
+            select(Message.id).where(Message.message == "recent 2")
+        )
+        assert res.scalar_one() == history[0]["id"]
+    await redis.delete(channel.history_key)
+
+
+async def test_get_history(client: AsyncClient):
+    res = await client.get("/chat/history?limit=2")
+    assert res.status_code == status.HTTP_200_OK
+    newest = [message["id"] for message in res.json()]
+    assert len(newest) == 2
+    assert newest[0] > newest[1]
+
+    res = await client.get(f"/chat/history?before_id={newest[1]}&limit=2")
+    assert res.status_code == status.HTTP_200_OK
+    older = [message["id"] for message in res.json()]
+    assert all(message_id < newest[1] for message_id in older)
+
+
+@pytest.mark.parametrize("url", [
+    "/chat/history?room=unknown",
+    "/chat/last_messages?room=unknown",
+])
+async def test_get_history_of_room_which_not_exists(
+    client: AsyncClient,
+    url: str
+):
+    res = await client.get(url)
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+    assert res.json() == {"detail": "Room unknown not found"}
+
+
+async def test_get_last_messages(client: AsyncClient):
+    res = await client.get("/chat/last_messages")
+    assert res.status_code == status.HTTP_200_OK
+    assert len(res.json()) <= 5
+
+
+async def test_last_messages_fallback_refills_history(client: AsyncClient):
+    channel = ChatRedisChannel(room="public")
+    await redis.delete(channel.history_key)
+    res = await client.get("/chat/last_messages?limit=2")
+    assert res.status_code == status.HTTP_200_OK
+    from_database = res.json()
+    assert len(from_database) == 2
+
+    history = await ChatHistoryCRUD.get_last_messages(channel, 2)
+    assert [message["id"] for message in history] == [
+        message["id"] for message in from_database
+    ]
+
+
+async def test_send_to_user_reaches_all_user_connections():
+    manager = ConnectionManager(session_factory=session_factory)
+    user_id = uuid4()
+    phone, laptop, other = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    await manager.connect(phone, user_id=user_id)
+    await manager.connect(laptop, room="lobby", user_id=user_id)
+    await manager.connect(other, user_id=uuid4())
+
+    await manager.send_to_user(user_id, "direct message")
+    await drain()
+    assert phone.sent == laptop.sent == ["direct message"]
+    assert other.sent == []
+
+    manager.disconnect(phone)
+    manager.disconnect(laptop)
+    assert user_id not in manager.users
+    manager.disconnect(other)
+
+
+async def test_msgpack_subprotocol_gets_structured_frames():
+    manager = ConnectionManager(session_factory=session_factory)
+    text = FakeWebSocket()
+    binary = FakeWebSocket(subprotocols=["chat.json", MSGPACK_SUBPROTOCOL])
+    await manager.connect(text, room="lobby")
+    await manager.connect(binary, room="lobby")
+    assert text.subprotocol is None
+    assert binary.subprotocol == MSGPACK_SUBPROTOCOL
+
+    sender_id = uuid4()
+    await manager.broadcast(
+        "structured", add_to_db=False, room="lobby", sender_id=sender_id
+    )
+    await drain()
+    assert text.sent == ["structured"]
+    frame = msgpack.unpackb(binary.sent[0])
+    assert frame["message"] == "structured"
+    assert frame["room"] == "lobby"
+    assert frame["sender"] == str(sender_id)
+    assert len(frame["id"]) == 32
+    assert isinstance(frame["sent_at"], float)
+
+    manager.disconnect(text)
+    manager.disconnect(binary)
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"type": "websocket.receive", "text": "plain"}, "plain"),
+    (
+        {
+            "type": "websocket.receive",
+            "bytes": msgpack.packb({"message": "packed"}),
+        },
+        "packed",
+    ),
+])
+async def test_receive_message(data: dict, message: str):
+    assert await receive_message(FakeWebSocket(received=[data])) == message
+
+
+@pytest.mark.parametrize("raw", [
+    b"\xc1",
+    msgpack.packb(["not", "a", "map"]),
+    msgpack.packb({"message": 1}),
+])
+async def test_receive_malformed_message(raw: bytes):
+    websocket = FakeWebSocket(
+        received=[{"type": "websocket.receive", "bytes": raw}]
+    )
+    with pytest.raises(WebSocketDisconnect):
+        await receive_message(websocket)
+    assert websocket.close_code == status.WS_1003_UNSUPPORTED_DATA
+
+
+async def test_drain_sends_jittered_reconnect_hints():
+    manager = ConnectionManager(session_factory=session_factory)
+    websockets = [FakeWebSocket() for _ in range(10)]
+    for websocket in websockets:
+        await manager.connect(websocket)
+    await manager.broadcast("before shutdown", add_to_db=False)
+
+    await manager.drain(timeout=1, min_delay=5, max_delay=10)
+    delays = set()
+    for websocket in websockets:
+        assert websocket.sent[0] == "before shutdown"
+        hint = orjson.loads(websocket.sent[1])
+        assert hint["type"] == "reconnect"
+        assert 5 <= hint["delay"] <= 10
+        delays.add(hint["delay"])
+        assert websocket.close_code == status.WS_1012_SERVICE_RESTART
+    assert len(delays) > 1
+    assert manager.active_connections == {}
+
+    with pytest.raises(WebSocketException):
+        await manager.connect(FakeWebSocket())
+
+
+async def test_drain_does_not_wait_for_stuck_client_forever():
+    manager = ConnectionManager(session_factory=session_factory)
+    stuck = FakeWebSocket(blocked=True)
+    await manager.connect(stuck)
+    await manager.drain(timeout=0.05)
+    assert stuck.sent == []
+    assert stuck.close_code == status.WS_1012_SERVICE_RESTART
+
+
+async def test_drain_flushes_buffered_messages():
+    manager = ConnectionManager(session_factory=session_factory)
+    manager.buffer.flush_interval = 60
+    await manager.broadcast("flushed on drain", add_to_db=True)
+    assert await count_messages("flushed on drain") == 0
+    await manager.drain()
+    assert await count_messages("flushed on drain") == 1
@@ -0,0 +1,118 @@
+import gzip
+
+import brotli
+import pytest
+import zstandard
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from httpx import AsyncClient
+
+from app.utils.compression import CompressionMiddleware, negotiate_encoding
+
+LARGE_BODY = "social network " * 200
+SMALL_BODY = "pong"
+
+compressed_app = FastAPI()
+compressed_app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=500,
+    excluded_paths=["/metrics"],
+)
+
+
+@compressed_app.get("/large", response_class=PlainTextResponse)
+async def large():
+    return LARGE_BODY
+
+
+@compressed_app.get("/small", response_class=PlainTextResponse)
+async def small():
+    return SMALL_BODY
+
+
+@compressed_app.get("/stream")
+async def stream():
+    async def chunks():
+        for _ in range(10):
+            yield LARGE_BODY
+
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+@compressed_app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return LARGE_BODY
+
+
+@pytest.fixture
+async def compression_client():
+    async with AsyncClient(
+        app=compressed_app,
+        base_url="http://test"
+    ) as client:
+        yield client
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),
+    ("gzip, br, zstd", "zstd"),
+    ("zstd;q=0.5, gzip", "gzip"),
+    ("*", "zstd"),
+    ("br;q=0, *;q=0.1", "zstd"),
+    ("identity", None),
+    ("", None),
+])
+def test_negotiate_encoding(accept_encoding: str, expected: str | None):
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+@pytest.mark.parametrize("encoding, decompress", [
+    ("gzip", gzip.decompress),
+    ("br", brotli.decompress),
+    ("zstd", lambda raw: (
+        zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+    )),
+])
+async def test_large_response_is_compressed(
+    compression_client: AsyncClient,
+    encoding: str,
+    decompress
+):
+    async with compression_client.stream(
+        "GET", "/large", headers={"Accept-Encoding": encoding}
+    ) as res:
+        raw = b"".join([chunk async for chunk in res.aiter_raw()])
+    assert res.headers["content-encoding"] == encoding
+    assert res.headers["vary"] == "Accept-Encoding"
+    assert int(res.headers["content-length"]) == len(raw)
+    assert decompress(raw).decode() == LARGE_BODY
+
+
+async def test_streaming_response_is_compressed(
+    compression_client: AsyncClient
+):
+    res = await compression_client.get(
+        "/stream", headers={"Accept-Encoding": "gzip"}
+    )
+    assert res.headers["content-encoding"] == "gzip"
+    assert "content-length" not in res.headers
+    assert res.text == LARGE_BODY * 10
+
+
+@pytest.mark.parametrize("url, accept_encoding, vary", [
+    ("/small", "gzip, br, zstd", "Accept-Encoding"),
+    ("/large", "identity", "Accept-Encoding"),
+    ("/metrics", "gzip, br, zstd", None),
+])
+async def test_response_is_not_compressed(
+    compression_client: AsyncClient,
+    url: str,
+    accept_encoding: str,
+    vary: str | None
+):
+    res = await compression_client.get(
+        url, headers={"Accept-Encoding": accept_encoding}
+    )
+    assert "content-encoding" not in res.headers
+    assert res.headers.get("vary") == vary
@@ -0,0 +1,171 @@
+from uuid import uuid4
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+
+from app.config import settings
+from app.db.postgres.models import Base
+from app.db.redis.connection import sync_redis
+from app.db.redis.models import FollowRedisSet, TimelineRedisSortedSet
+from app.utils.celery.worker import remove_post_from_timelines
+from tests.conftest import create_test_auth_headers_for_user, sync_engine
+
+# first artificially populate the database with users, follows and posts
+
+
+@pytest.mark.parametrize("user", [
+    ({
+        "username": "new_user",
+        "first_name": "Lex",
+        "last_name": "Fridman",
+        "email": "user@example.com",
+        "password": "123456789",
+    }),
+    ({
+        "username": "pepe",
+        "first_name": "Pepe",
+        "last_name": "King",
+        "email": "pepe@example.com",
+        "password": "pepe`s hashed password",
+    }),
+    ({
+        "username": "auto",
+        "first_name": "FastAPI",
+        "last_name": "Fun",
+        "email": "google@example.com",
+        "password": "very_difficult_password",
+    })
+])
+async def test_create_user_in_database(client: AsyncClient, user: dict):
+    await client.post("/user/registration", json=user)
+
+
+@pytest.mark.parametrize("follower_email, username_to_follow", [
+    ("user@example.com", "pepe"),
+    ("user@example.com", "auto"),
+    ("pepe@example.com", "auto"),
+])
+async def test_create_follow_in_database(
+    client: AsyncClient,
+    follower_email: str,
+    username_to_follow: str
+):
+    headers = await create_test_auth_headers_for_user(follower_email)
+    await client.post(f"/follow/{username_to_follow}", headers=headers)
+
+
+@pytest.mark.parametrize("email, title", [
+    ("pepe@example.com", "Pepe Post"),
+    ("google@example.com", "Auto Post"),
+    ("user@example.com", "User Post"),
+])
+async def test_create_post_in_database(
+    client: AsyncClient,
+    email: str,
+    title: str
+):
+    headers = await create_test_auth_headers_for_user(email)
+    post = {"title": title, "content": f"{title} content"}
+    await client.post("/post/create", json=post, headers=headers)
+
+
+@pytest.mark.parametrize("email, titles", [
+    ("user@example.com", ["Auto Post", "Pepe Post"]),
+    ("pepe@example.com", ["Auto Post"]),
+    ("google@example.com", []),
+])
+async def test_get_feed(client: AsyncClient, email: str, titles: list[str]):
+    headers = await create_test_auth_headers_for_user(email)
+    res = await client.get("/feed", headers=headers)
+    assert res.status_code == status.HTTP_200_OK
+    assert [post["title"] for post in res.json()] == titles
+
+
+@pytest.mark.parametrize("skip, limit, titles", [
+    (0, 1, ["Auto Post"]),
+    (1, 1, ["Pepe Post"]),
+    (2, 10, []),
+    (0, 0, []),
+])
+async def test_get_feed_page(
+    client: AsyncClient,
+    skip: int,
+    limit: int,
+    titles: list[str]
+):
+    headers = await create_test_auth_headers_for_user("user@example.com")
+    res = await client.get(
+        f"/feed?skip={skip}&limit={limit}",
+        headers=headers
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert [post["title"] for post in res.json()] == titles
+
+
+async def test_get_feed_after_delete_and_restore_post(client: AsyncClient):
+    headers = await create_test_auth_headers_for_user("user@example.com")
+    owner_headers = await create_test_auth_headers_for_user("pepe@example.com")
+
+    await client.delete(f"/post/{id}?post_id=1", headers=owner_headers)
+    res = await client.get("/feed", headers=headers)
+    assert [post["title"] for post in res.json()] == ["Auto Post"]
+
+    await client.post(f"/post/restore/{id}?post_id=1", headers=owner_headers)
+    res = await client.get("/feed", headers=headers)
+    assert [post["title"] for post in res.json()] == ["Auto Post", "Pepe Post"]
+
+
+@pytest.mark.parametrize("email, titles", [
+    ("user@example.com", ["Celebrity Post", "Auto Post", "Pepe Post"]),
+    ("pepe@example.com", ["Celebrity Post", "Auto Post"]),
+])
+async def test_get_feed_with_celebrity_posts(
+    client: AsyncClient,
+    monkeypatch: pytest.MonkeyPatch,
+    email: str,
+    titles: list[str]
+):
+    # auto has two followers, so it's pulled instead of pushed
+    monkeypatch.setattr(settings, "FEED_CELEBRITY_FOLLOWERS_THRESHOLD", 2)
+    if email == "user@example.com":
+        owner_headers = await create_test_auth_headers_for_user(
+            "google@example.com"
+        )
+        post = {"title": "Celebrity Post", "content": "Pulled at read time"}
+        await client.post("/post/create", json=post, headers=owner_headers)
+
+    headers = await create_test_auth_headers_for_user(email)
+    res = await client.get("/feed", headers=headers)
+    assert res.status_code == status.HTTP_200_OK
+    assert [post["title"] for post in res.json()] == titles
+
+    res = await client.get("/feed?skip=1&limit=1", headers=headers)
+    assert [post["title"] for post in res.json()] == titles[1:2]
+
+
+def test_removed_post_leaves_timelines_of_celebrity_followers():
+    owner_id, follower_id = str(uuid4()), str(uuid4())
+    owner = TimelineRedisSortedSet(user_id=owner_id, post_id=1)
+    follower = TimelineRedisSortedSet(user_id=follower_id, post_id=1)
+    followers_key = FollowRedisSet(user_id=owner_id).followers_key
+    sync_redis.sadd(followers_key, follower_id)
+    # pushed before the owner became a celebrity
+    sync_redis.zadd(follower.key, {follower.value: 1})
+    sync_redis.sadd(TimelineRedisSortedSet.CELEBRITIES_KEY, owner_id)
+
+    assert remove_post_from_timelines(1, owner_id) == 1
+    assert sync_redis.exists(follower.key) == 0
+    sync_redis.srem(TimelineRedisSortedSet.CELEBRITIES_KEY, owner_id)
+    sync_redis.delete(followers_key, owner.posts_key)
+
+
+async def test_get_feed_not_authenticated(client: AsyncClient):
+    res = await client.get("/feed")
+    assert res.status_code == status.HTTP_401_UNAUTHORIZED
+    assert res.json() == {"detail": "Not authenticated"}
+
+
+async def test_delete_user_in_database():
+    Base.metadata.drop_all(bind=sync_engine)
+    Base.metadata.create_all(bind=sync_engine)
@@ -1,9 +1,23 @@
+import asyncio
+from uuid import UUID
+
 import pytest
 from fastapi import status
 from httpx import AsyncClient
 
 from app.db.postgres.models import Base
-from tests.conftest import create_test_auth_headers_for_user, sync_engine
+from app.db.redis.connection import redis, sync_redis
+from app.db.redis.models import FollowRedisSet
+from app.services.crud import FollowCRUD, FollowGraphCRUD
+from app.utils.celery.worker import (
+    compute_follow_suggestions,
+    rebuild_follow_graph
+)
+from tests.conftest import (
+    create_test_auth_headers_for_user,
+    sync_engine,
+    testing_async_session as session_factory
+)
 
 # first artificially populate the database with users
 
@@ -47,6 +61,24 @@ async def test_follow_user(client: AsyncClient, follower_email: str, username_to
     assert res.json() == f"You are following to the user {username_to_follow}"
 
 
+@pytest.mark.parametrize("username, followers_count, following_count", [
+    ("new_user", 0, 1),
+    ("pepe", 2, 1),
+    ("auto", 1, 1),
+])
+async def test_get_user_follow_counters(
+    client: AsyncClient,
+    username: str,
+    followers_count: int,
+    following_count: int
+):
+    res = await client.get(f"/user/{username}")
+    data = res.json()
+    assert res.status_code == status.HTTP_200_OK
+    assert data["followers_count"] == followers_count
+    assert data["following_count"] == following_count
+
+
 @pytest.mark.parametrize("follower_email, username_to_follow", [
     ("user@example.com", "pepe"),
     ("pepe@example.com", "auto"),
@@ -141,6 +173,62 @@ async def test_get_status_of_follow_not_authenticated(client: AsyncClient, usern
     assert res.json() == {"detail": "Not authenticated"}
 
 
+async def get_user_id(client: AsyncClient, username: str) -> UUID:
+    res = await client.get(f"/user/{username}")
+    return UUID(res.json()["id"])
+
+
+async def test_follow_is_checked_in_database_without_graph(
+    client: AsyncClient
+):
+    pepe_id = await get_user_id(client, "pepe")
+    await redis.delete(FollowRedisSet(user_id=pepe_id).followers_key)
+    headers = await create_test_auth_headers_for_user("user@example.com")
+    res = await client.get("/follow/pepe", headers=headers)
+    assert res.json() == "You are following to the user pepe"
+    res = await client.post("/follow/pepe", headers=headers)
+    assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+
+async def test_follow_is_created_once(client: AsyncClient):
+    pepe_id = await get_user_id(client, "pepe")
+    auto_id = await get_user_id(client, "auto")
+    async with session_factory() as db:
+        # followed concurrently, after both requests checked the graph
+        assert await FollowCRUD(db).create_follow(auto_id, pepe_id) is False
+        await db.rollback()
+
+
+async def test_rebuild_keeps_follows_changed_during_rebuild(
+    client: AsyncClient,
+    monkeypatch: pytest.MonkeyPatch
+):
+    pepe_id = await get_user_id(client, "pepe")
+    user_id = await get_user_id(client, "new_user")
+    loop = asyncio.get_running_loop()
+    scan_iter = sync_redis.scan_iter
+
+    async def unfollow():
+        async with session_factory() as db:
+            await FollowCRUD(db).delete_follow(pepe_id, user_id)
+            await db.commit()
+        await FollowGraphCRUD.remove_follow(pepe_id, user_id)
+
+    def scan_iter_after_unfollow(*args, **kwargs):
+        # the table was read already, the old sets are not swapped yet
+        monkeypatch.setattr(sync_redis, "scan_iter", scan_iter)
+        asyncio.run_coroutine_threadsafe(unfollow(), loop).result()
+        return scan_iter(*args, **kwargs)
+
+    monkeypatch.setattr(sync_redis, "scan_iter", scan_iter_after_unfollow)
+    await asyncio.to_thread(rebuild_follow_graph)
+    assert await FollowGraphCRUD.is_following(pepe_id, user_id) is False
+
+    headers = await create_test_auth_headers_for_user("user@example.com")
+    res = await client.post("/follow/pepe", headers=headers)
+    assert res.status_code == status.HTTP_201_CREATED
+
+
 @pytest.mark.parametrize("email", [
     ("user@example.com"),
     ("pepe@example.com"),
@@ -163,6 +251,45 @@ async def test_get_list_following(client: AsyncClient, email: str):
     assert res.status_code == status.HTTP_200_OK
 
 
+@pytest.mark.parametrize("email, username, common_following", [
+    ("user@example.com", "auto", ["pepe"]),
+    ("pepe@example.com", "new_user", []),
+])
+async def test_get_common_following(
+    client: AsyncClient,
+    email: str,
+    username: str,
+    common_following: list[str]
+):
+    headers = await create_test_auth_headers_for_user(email)
+    res = await client.get(f"/follow/mutual/{username}", headers=headers)
+    assert res.status_code == status.HTTP_200_OK
+    assert [user["username"] for user in res.json()] == common_following
+
+
+async def test_get_common_following_with_user_who_not_exists(client: AsyncClient):
+    headers = await create_test_auth_headers_for_user("user@example.com")
+    res = await client.get("/follow/mutual/unknown", headers=headers)
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.parametrize("email, suggestions", [
+    ("user@example.com", ["auto"]),
+    ("pepe@example.com", []),
+    ("google@example.com", []),
+])
+async def test_get_follow_suggestions(
+    client: AsyncClient,
+    email: str,
+    suggestions: list[str]
+):
+    compute_follow_suggestions()
+    headers = await create_test_auth_headers_for_user(email)
+    res = await client.get("/follow/suggestions", headers=headers)
+    assert res.status_code == status.HTTP_200_OK
+    assert [user["username"] for user in res.json()] == suggestions
+
+
 @pytest.mark.parametrize("follower_email, username_to_unfollow", [
     ("user@example.com", "pepe"),
     ("pepe@example.com", "auto"),
@@ -0,0 +1,189 @@
+import pytest
+from fastapi import WebSocketException, status
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.postgres.models import Base
+from app.services.oauth2 import (
+    create_access_token,
+    get_current_user_from_websocket
+)
+from tests.conftest import (
+    ASYNC_DATABASE_URL,
+    create_test_auth_headers_for_user,
+    sync_engine
+)
+
+# first artificially populate the database with users
+
+
+@pytest.mark.parametrize("user", [
+    ({
+        "username": "new_user",
+        "first_name": "Lex",
+        "last_name": "Fridman",
+        "email": "user@example.com",
+        "password": "123456789",
+    }),
+    ({
+        "username": "pepe",
+        "first_name": "Pepe",
+        "last_name": "King",
+        "email": "pepe@example.com",
+        "password": "pepe`s hashed password",
+    }),
+    ({
+        "username": "auto",
+        "first_name": "FastAPI",
+        "last_name": "Fun",
+        "email": "google@example.com",
+        "password": "very_difficult_password",
+    })
+])
+async def test_create_user_in_database(client: AsyncClient, user: dict):
+    await client.post("/user/registration", json=user)
+
+
+@pytest.mark.parametrize("sender_email, username, message", [
+    ("user@example.com", "pepe", "Hi, Pepe!"),
+    ("user@example.com", "pepe", "How are you?"),
+    ("pepe@example.com", "new_user", "Fine"),
+    ("google@example.com", "pepe", "Hello from auto"),
+])
+async def test_send_direct_message(
+    client: AsyncClient,
+    sender_email: str,
+    username: str,
+    message: str
+):
+    headers = await create_test_auth_headers_for_user(sender_email)
+    res = await client.post(
+        f"/messages/{username}",
+        json={"message": message},
+        headers=headers
+    )
+    assert res.status_code == status.HTTP_201_CREATED
+    assert res.json()["message"] == message
+
+
+@pytest.mark.parametrize("email, inbox", [
+    ("user@example.com", [("pepe", 1, "Fine")]),
+    ("pepe@example.com", [
+        ("auto", 1, "Hello from auto"),
+        ("new_user", 2, "Fine"),
+    ]),
+    ("google@example.com", [("pepe", 0, "Hello from auto")]),
+])
+async def test_get_inbox(client: AsyncClient, email: str, inbox: list):
+    headers = await create_test_auth_headers_for_user(email)
+    res = await client.get("/messages", headers=headers)
+    assert res.status_code == status.HTTP_200_OK
+    assert [
+        (item["username"], item["unread_count"], item["last_message"])
+        for item in res.json()
+    ] == inbox
+
+
+async def test_get_direct_messages(client: AsyncClient):
+    headers = await create_test_auth_headers_for_user("pepe@example.com")
+    res = await client.get("/messages/new_user?limit=2", headers=headers)
+    assert res.status_code == status.HTTP_200_OK
+    newest = res.json()
+    assert [item["message"] for item in newest] == ["Fine", "How are you?"]
+
+    res = await client.get(
+        f"/messages/new_user?limit=2&before_id={newest[-1]['id']}",
+        headers=headers
+    )
+    assert [item["message"] for item in res.json()] == ["Hi, Pepe!"]
+
+    res = await client.get("/messages", headers=headers)
+    unread = {item["username"]: item["unread_count"] for item in res.json()}
+    assert unread == {"auto": 1, "new_user": 0}
+
+
+@pytest.mark.parametrize("email, username, status_code", [
+    ("user@example.com", "new_user", status.HTTP_403_FORBIDDEN),
+    ("user@example.com", "unknown", status.HTTP_404_NOT_FOUND),
+])
+async def test_send_direct_message_with_invalid_recipient(
+    client: AsyncClient,
+    email: str,
+    username: str,
+    status_code: int
+):
+    headers = await create_test_auth_headers_for_user(email)
+    res = await client.post(
+        f"/messages/{username}",
+        json={"message": "Hello"},
+        headers=headers
+    )
+    assert res.status_code == status_code
+
+
+async def test_get_inbox_not_authenticated(client: AsyncClient):
+    res = await client.get("/messages")
+    assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class FakeHandshake:
+    def __init__(self, headers: dict):
+        self.headers = headers
+
+
+@pytest.mark.parametrize("token, headers", [
+    ("not a token", {}),
+    (None, {}),
+    (None, {"authorization": "Basic dXNlcjpwYXNz"}),
+])
+async def test_websocket_with_invalid_credentials(
+    session: AsyncSession,
+    token: str | None,
+    headers: dict
+):
+    with pytest.raises(WebSocketException) as err:
+        await get_current_user_from_websocket(
+            FakeHandshake(headers), token, session
+        )
+    assert err.value.code == status.WS_1008_POLICY_VIOLATION
+
+
+async def test_websocket_with_token(session: AsyncSession):
+    token = await create_access_token(data={"sub": "pepe@example.com"})
+    for handshake, query_token in (
+        (FakeHandshake({}), token),
+        (FakeHandshake({"authorization": f"Bearer {token}"}), None),
+    ):
+        user = await get_current_user_from_websocket(
+            handshake, query_token, session
+        )
+        assert user.username == "pepe"
+
+
+async def test_websockets_do_not_hold_db_connections():
+    engine = create_async_engine(
+        ASYNC_DATABASE_URL, pool_size=2, max_overflow=0, pool_timeout=1
+    )
+    session_factory = sessionmaker(
+        bind=engine,
+        expire_on_commit=False,
+        class_=AsyncSession
+    )
+    token = await create_access_token(data={"sub": "pepe@example.com"})
+    # sessions of open sockets stay referenced until they close
+    open_sockets = []
+    for _ in range(5):
+        session = session_factory()
+        user = await get_current_user_from_websocket(
+            FakeHandshake({}), token, session
+        )
+        assert user.username == "pepe"
+        open_sockets.append(session)
+    assert engine.pool.checkedout() == 0
+    await engine.dispose()
+
+
+async def test_delete_user_in_database():
+    Base.metadata.drop_all(bind=sync_engine)
+    Base.metadata.create_all(bind=sync_engine)
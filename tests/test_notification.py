@@ -0,0 +1,203 @@
+from uuid import uuid4
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+
+from app.db.postgres.models import Base
+from app.db.redis.connection import redis, sync_redis
+from app.db.redis.models import (
+    EventRedisStream,
+    NotificationRedisStream,
+    PostReactionRedisSet
+)
+from app.schemas.notification import NotificationType
+from app.schemas.post import PostReaction
+from app.services import notification
+from app.utils.celery.worker import flush_notification_digest, notify
+from tests.conftest import create_test_auth_headers_for_user, sync_engine
+
+
+class ScheduledFlushes:
+    def __init__(self):
+        self.calls: list[dict] = []
+
+    def apply_async(self, args: tuple, **options):
+        self.calls.append({"args": args, **options})
+
+
+@pytest.fixture
+def scheduled(monkeypatch: pytest.MonkeyPatch) -> ScheduledFlushes:
+    scheduled = ScheduledFlushes()
+    monkeypatch.setattr(notification, "flush_notification_digest", scheduled)
+    return scheduled
+
+
+@pytest.mark.parametrize("user", [
+    ({
+        "username": "star",
+        "first_name": "Star",
+        "last_name": "Notified",
+        "email": "star@example.com",
+        "password": "123456789",
+    }),
+    ({
+        "username": "fan",
+        "first_name": "First",
+        "last_name": "Fan",
+        "email": "fan@example.com",
+        "password": "123456789",
+    }),
+    ({
+        "username": "other_fan",
+        "first_name": "Other",
+        "last_name": "Fan",
+        "email": "other_fan@example.com",
+        "password": "123456789",
+    })
+])
+async def test_create_user_in_database(client: AsyncClient, user: dict):
+    await client.post("/user/registration", json=user)
+
+
+@pytest.mark.parametrize("follower_email", [
+    "fan@example.com",
+    "other_fan@example.com",
+])
+async def test_create_follow_in_database(
+    client: AsyncClient,
+    follower_email: str
+):
+    headers = await create_test_auth_headers_for_user(follower_email)
+    res = await client.post("/follow/star", headers=headers)
+    assert res.status_code == status.HTTP_201_CREATED
+
+
+async def test_followed_user_is_notified(client: AsyncClient):
+    headers = await create_test_auth_headers_for_user("star@example.com")
+    # celery runs eagerly in tests, every follow was flushed on its own
+    res = await client.get("/notification", headers=headers)
+    assert res.status_code == status.HTTP_200_OK
+    page = res.json()
+    assert page["unread"] == 2
+    assert page["next_cursor"] is None
+    assert [n["type"] for n in page["notifications"]] == [
+        NotificationType.FOLLOW, NotificationType.FOLLOW
+    ]
+    assert [n["count"] for n in page["notifications"]] == [1, 1]
+
+
+async def test_notifications_are_paged(client: AsyncClient):
+    headers = await create_test_auth_headers_for_user("star@example.com")
+    res = await client.get("/notification?limit=1", headers=headers)
+    first_page = res.json()
+    assert len(first_page["notifications"]) == 1
+    assert first_page["next_cursor"] == first_page["notifications"][0]["id"]
+
+    res = await client.get(
+        f"/notification?limit=1&before={first_page['next_cursor']}",
+        headers=headers
+    )
+    second_page = res.json()
+    assert len(second_page["notifications"]) == 1
+    assert (
+        second_page["notifications"][0]["id"]
+        < first_page["notifications"][0]["id"]
+    )
+
+    res = await client.get(
+        f"/notification?before={second_page['next_cursor']}",
+        headers=headers
+    )
+    assert res.json()["notifications"] == []
+
+
+@pytest.mark.parametrize("query", [
+    "before=not-a-cursor",
+    "limit=0",
+    "limit=1000",
+])
+async def test_get_notifications_with_wrong_query(
+    client: AsyncClient,
+    query: str
+):
+    headers = await create_test_auth_headers_for_user("star@example.com")
+    res = await client.get(f"/notification?{query}", headers=headers)
+    assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+async def test_mark_notifications_read(client: AsyncClient):
+    headers = await create_test_auth_headers_for_user("star@example.com")
+    res = await client.post("/notification/read", headers=headers)
+    assert res.json() == 2
+    res = await client.get("/notification", headers=headers)
+    assert res.json()["unread"] == 0
+    assert len(res.json()["notifications"]) == 2
+
+
+async def test_reactions_are_coalesced_into_digest(
+    client: AsyncClient,
+    scheduled: ScheduledFlushes
+):
+    star_headers = await create_test_auth_headers_for_user("star@example.com")
+    res = await client.post(
+        "/post/create",
+        json={"title": "Viral", "content": "Viral content"},
+        headers=star_headers
+    )
+    post_id = res.json()["id"]
+
+    for email in ["fan@example.com", "other_fan@example.com"]:
+        headers = await create_test_auth_headers_for_user(email)
+        for _ in range(2):
+            await client.post(
+                f"/post/{post_id}/reaction/like?post_id={post_id}",
+                headers=headers
+            )
+    # own reactions are not notified
+    await client.post(
+        f"/post/{post_id}/reaction/dislike?post_id={post_id}",
+        headers=star_headers
+    )
+    assert len(scheduled.calls) == 1
+    args = scheduled.calls[0]["args"]
+    assert args[1:] == (NotificationType.LIKE, str(post_id))
+
+    assert flush_notification_digest(*args) == 2
+    assert flush_notification_digest(*args) == 0
+    res = await client.get("/notification", headers=star_headers)
+    page = res.json()
+    assert page["unread"] == 1
+    digest = page["notifications"][0]
+    assert digest["type"] == NotificationType.LIKE
+    assert digest["target"] == str(post_id)
+    assert digest["count"] == 2
+
+    # post ids start over with the database, reactions must not outlive it
+    await redis.delete(*[
+        PostReactionRedisSet(post_id=post_id, reaction=reaction).key
+        for reaction in PostReaction
+    ])
+    await redis.zrem(PostReactionRedisSet.TRENDING_KEY, post_id)
+
+
+def test_replayed_follow_event_is_notified_once():
+    user_id, follower_id = str(uuid4()), str(uuid4())
+    event_id = 2 ** 62  # not reached by the outbox ids of the tests
+    stream = NotificationRedisStream(user_id=user_id)
+    notified_key = EventRedisStream(event_id=event_id).notified_key
+    sync_redis.delete(notified_key)
+
+    for _ in range(2):
+        notify(
+            user_id, NotificationType.FOLLOW, user_id, follower_id, event_id
+        )
+    # celery runs eagerly in tests, the digest was flushed at once
+    entries = sync_redis.xrange(stream.key)
+    assert [fields[b"count"] for _, fields in entries] == [b"1"]
+    sync_redis.delete(notified_key, stream.key, stream.unread_key)
+
+
+async def test_delete_user_in_database():
+    Base.metadata.drop_all(bind=sync_engine)
+    Base.metadata.create_all(bind=sync_engine)
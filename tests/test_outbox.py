@@ -0,0 +1,92 @@
+import orjson
+from fastapi import status
+from httpx import AsyncClient
+from sqlalchemy import func, select
+
+from app.db.postgres.connection import sync_session
+from app.db.postgres.models import Base, OutboxEvent, OutboxEventType
+from app.db.redis.connection import redis
+from app.db.redis.models import EventRedisStream
+from app.utils.celery.worker import relay_outbox
+from tests.conftest import create_test_auth_headers_for_user, sync_engine
+
+
+def count_outbox_events() -> int:
+    with sync_session() as db:
+        return db.execute(select(func.count(OutboxEvent.id))).scalar_one()
+
+
+async def get_last_events(amount: int) -> list[dict]:
+    entries = await redis.xrevrange(EventRedisStream.KEY, count=amount)
+    return [
+        {
+            "type": fields[b"type"].decode(),
+            "payload": orjson.loads(fields[b"payload"]),
+        }
+        for _, fields in reversed(entries)
+    ]
+
+
+async def test_events_are_relayed_after_commit(client: AsyncClient):
+    user = {
+        "username": "outbox",
+        "first_name": "Out",
+        "last_name": "Box",
+        "email": "outbox@example.com",
+        "password": "123456789",
+    }
+    res = await client.post("/user/registration", json=user)
+    user_id = res.json()["id"]
+    headers = await create_test_auth_headers_for_user(user["email"])
+    res = await client.post(
+        "/post/create",
+        json={"title": "Outbox", "content": "Outbox content"},
+        headers=headers
+    )
+    assert res.status_code == status.HTTP_201_CREATED
+    post_id = res.json()["id"]
+
+    # celery runs eagerly in tests, the nudged relay emptied the outbox
+    assert count_outbox_events() == 0
+    events = await get_last_events(2)
+    assert events[0] == {
+        "type": OutboxEventType.USER_REGISTERED,
+        "payload": {"user_id": user_id},
+    }
+    assert events[1]["type"] == OutboxEventType.POST_PUBLISHED
+    assert events[1]["payload"]["post_id"] == post_id
+    assert events[1]["payload"]["owner_id"] == user_id
+
+
+async def test_relay_skips_events_locked_by_another_relay():
+    with sync_session() as db:
+        with db.begin():
+            db.add_all([
+                OutboxEvent(
+                    event_type=OutboxEventType.USER_DELETED,
+                    payload={"user_id": f"locked {i}"}
+                )
+                for i in range(2)
+            ])
+
+    with sync_session() as other_relay:
+        with other_relay.begin():
+            other_relay.execute(
+                select(OutboxEvent)
+                .order_by(OutboxEvent.id)
+                .limit(1)
+                .with_for_update()
+            ).scalar_one()
+            assert relay_outbox() == 1
+            assert count_outbox_events() == 1
+    assert relay_outbox() == 1
+    assert count_outbox_events() == 0
+    events = await get_last_events(2)
+    assert [event["payload"]["user_id"] for event in events] == [
+        "locked 1", "locked 0"
+    ]
+
+
+async def test_delete_user_in_database():
+    Base.metadata.drop_all(bind=sync_engine)
+    Base.metadata.create_all(bind=sync_engine)
@@ -1,10 +1,21 @@
+from uuid import uuid4
+
 import pytest
 from fastapi import status
 from httpx import AsyncClient
+from sqlalchemy import text, update
+from sqlalchemy.exc import DBAPIError
 
-from app.db.postgres.models import Base
+from app.config import settings
+from app.db.postgres.models import Base, Post
+from app.db.redis.connection import sync_redis
+from app.db.redis.models import PostReactionRedisSet, PublishedPostRedisBitmap
 from app.schemas.post import PostReaction
+from app.services.crud import PostReactionCRUD, PublishedPostCRUD
+from app.services.post import _is_post_published
+from app.utils.celery.worker import decay_trending_posts
 from tests.conftest import create_test_auth_headers_for_user, sync_engine
+from tests.conftest import testing_async_session as session_factory
 
 # first artificially populate the database with users
 
@@ -60,6 +71,17 @@ async def test_create_post(client: AsyncClient, email: str, post: dict):
     assert data["is_published"] is True
 
 
+@pytest.mark.parametrize("username", [
+    ("new_user"),
+    ("pepe"),
+    ("auto")
+])
+async def test_get_user_posts_counter(client: AsyncClient, username: str):
+    res = await client.get(f"/user/{username}")
+    assert res.status_code == status.HTTP_200_OK
+    assert res.json()["posts_count"] == 1
+
+
 @pytest.mark.parametrize("post", [
     ({
         "title": "First Post",
@@ -128,6 +150,26 @@ async def test_get_all_posts_by_title(client: AsyncClient, title: str):
     assert res.status_code == status.HTTP_200_OK
 
 
+@pytest.mark.parametrize("title, content", [
+    ("First Post", "This is my first post!"),
+    ("Middle Post", "Second Post. Middle of the history."),
+    ("Last Post", "This is my last post! End of the history.")
+])
+async def test_get_all_posts_by_title_content(
+    client: AsyncClient,
+    title: str,
+    content: str
+):
+    res = await client.get(f"/post/posts/{title}")
+    data = res.json()
+    assert res.status_code == status.HTTP_200_OK
+    assert res.headers["content-type"] == "application/json"
+    assert len(data) == 1
+    assert data[0]["title"] == title
+    assert data[0]["content"] == content
+    assert data[0]["reactions"] == {"like": 0, "dislike": 0}
+
+
 @pytest.mark.parametrize("email, post", [
     ("user@example.com", {
         "id": 1,
@@ -310,6 +352,10 @@ async def test_delete_post(client: AsyncClient, email: str, post: dict):
     assert data["title"] == post["title"]
     assert data["content"] == post["content"]
     assert data["is_published"] is False
+    assert sync_redis.getbit(PublishedPostRedisBitmap.KEY, post["id"]) == 0
+    assert sync_redis.zscore(
+        PostReactionRedisSet.TRENDING_KEY, post["id"]
+    ) is None
 
 
 @pytest.mark.parametrize("email, post_id", [
@@ -432,6 +478,12 @@ async def test_check_reactions_on_post(
     }
 
 
+async def test_get_trending_posts(client: AsyncClient):
+    res = await client.get("/post/trending")
+    assert res.status_code == status.HTTP_200_OK
+    assert [post["id"] for post in res.json()] == [1, 2]
+
+
 @pytest.mark.parametrize("email, post_id, reaction", [
     ("user@example.com", 1, PostReaction.DISLIKE),
     ("pepe@example.com", 1, PostReaction.DISLIKE),
@@ -476,6 +528,14 @@ async def test_check_reactions_on_post_after_change_reaction(
     }
 
 
+async def test_get_trending_posts_after_change_reaction(
+    client: AsyncClient
+):
+    res = await client.get("/post/trending")
+    assert res.status_code == status.HTTP_200_OK
+    assert [post["id"] for post in res.json()] == [3]
+
+
 @pytest.mark.parametrize("email, post_id, reaction", [
     ("user@example.com", 1, PostReaction.DISLIKE),
     ("pepe@example.com", 1, PostReaction.DISLIKE),
@@ -520,6 +580,118 @@ async def test_remove_reaction_from_post_not_exists(
     assert res.json() == {"detail": f"Post with id {post_id} not found."}
 
 
+async def test_published_posts_cache_falls_back_to_database(
+    client: AsyncClient
+):
+    key = PublishedPostRedisBitmap.KEY
+    # restored posts were put back to the cache
+    assert [sync_redis.getbit(key, post_id) for post_id in (1, 2, 3)] == [
+        1, 1, 1
+    ]
+    sync_redis.delete(key)
+    headers = await create_test_auth_headers_for_user("google@example.com")
+    res = await client.delete(
+        url=f"/post/{id}/reaction/like?post_id=1",
+        headers=headers
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert sync_redis.getbit(key, 1) == 1
+
+
+async def test_published_posts_cache_repair_holds_off_delete():
+    sync_redis.setbit(PublishedPostRedisBitmap.KEY, 1, 0)
+    async with session_factory() as db, db.begin():
+        assert await _is_post_published(1, db)
+        async with session_factory() as other, other.begin():
+            await other.execute(text("SET LOCAL lock_timeout = '50ms'"))
+            with pytest.raises(DBAPIError):
+                await other.execute(
+                    update(Post)
+                    .where(Post.id == 1)
+                    .values(is_published=False)
+                )
+
+
+async def test_published_posts_cache_is_cleared_after_commit(
+    client: AsyncClient,
+    monkeypatch: pytest.MonkeyPatch
+):
+    key = PublishedPostRedisBitmap.KEY
+    remove = PublishedPostCRUD.remove
+
+    async def remove_before_racing_read(post_id: int):
+        monkeypatch.setattr(PublishedPostCRUD, "remove", remove)
+        await remove(post_id)
+        # a concurrent read still sees the post published
+        await PublishedPostCRUD.add(post_id)
+
+    monkeypatch.setattr(PublishedPostCRUD, "remove", remove_before_racing_read)
+    headers = await create_test_auth_headers_for_user("user@example.com")
+    res = await client.delete(url="/post/1?post_id=1", headers=headers)
+    assert res.status_code == status.HTTP_200_OK
+    assert sync_redis.getbit(key, 1) == 0
+
+    await client.post(url="/post/restore/1?post_id=1", headers=headers)
+    assert sync_redis.getbit(key, 1) == 1
+
+
+def test_decay_trending_posts(monkeypatch: pytest.MonkeyPatch):
+    key = "Post:trending:test"
+    monkeypatch.setattr(PostReactionRedisSet, "TRENDING_KEY", key)
+    monkeypatch.setattr(
+        settings, "TRENDING_HALF_LIFE", settings.TRENDING_DECAY_INTERVAL
+    )
+    sync_redis.delete(key)
+    sync_redis.zadd(key, {"1": 4.0, "2": 0.08})
+    assert decay_trending_posts() == 1
+    assert sync_redis.zrange(key, 0, -1, withscores=True) == [(b"1", 2.0)]
+    sync_redis.delete(key)
+
+
+async def test_taken_back_reaction_leaves_no_negative_score(
+    monkeypatch: pytest.MonkeyPatch
+):
+    key = "Post:trending:test"
+    monkeypatch.setattr(PostReactionRedisSet, "TRENDING_KEY", key)
+    sync_redis.delete(key)
+    user_id = uuid4()
+    await PostReactionCRUD.add_reaction(1, user_id, PostReaction.LIKE)
+    await PostReactionCRUD.add_reaction(2, user_id, PostReaction.LIKE)
+    # decayed to half of the weight before the likes are taken back
+    sync_redis.zadd(key, {"1": 0.5, "2": 0.5})
+    await PostReactionCRUD.remove_reaction(1, user_id, PostReaction.LIKE)
+    await PostReactionCRUD.remove_all_reactions(2, user_id)
+    assert sync_redis.zcard(key) == 0
+
+
+async def test_repeated_reaction_moves_trending_score_once(
+    monkeypatch: pytest.MonkeyPatch
+):
+    key = "Post:trending:test"
+    monkeypatch.setattr(PostReactionRedisSet, "TRENDING_KEY", key)
+    sync_redis.delete(key)
+    user_id = uuid4()
+    assert await PostReactionCRUD.add_reaction(1, user_id, PostReaction.LIKE)
+    assert not await PostReactionCRUD.add_reaction(
+        1, user_id, PostReaction.LIKE
+    )
+    assert sync_redis.zscore(key, "1") == PostReactionRedisSet(
+        reaction=PostReaction.LIKE
+    ).trending_weight
+    reactions = await PostReactionCRUD.get_reactions_of_posts([1, 2])
+    assert reactions == {
+        post_id: {
+            reaction: sync_redis.scard(
+                PostReactionRedisSet(post_id=post_id, reaction=reaction).key
+            )
+            for reaction in PostReaction
+        }
+        for post_id in (1, 2)
+    }
+    await PostReactionCRUD.remove_reaction(1, user_id, PostReaction.LIKE)
+    sync_redis.delete(key)
+
+
 async def test_delete_user_in_database():
     Base.metadata.drop_all(bind=sync_engine)
     Base.metadata.create_all(bind=sync_engine)
@@ -0,0 +1,190 @@
+import asyncio
+from uuid import UUID, uuid4
+
+import orjson
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+from sqlalchemy import func, select
+
+from app.api import chat
+from app.db.postgres.models import User
+from app.db.redis.connection import redis
+from app.db.redis.models import PresenceRedisKey
+from app.services.chat import ConnectionManager
+from app.services.crud import PresenceCRUD
+from app.services.presence import PresenceService
+from tests.conftest import testing_async_session as session_factory
+from tests.test_chat import FakeWebSocket, drain
+
+
+async def load_user_ids(amount: int) -> list[UUID]:
+    # asyncpg returns its own UUID type, as for ids of loaded users
+    async with session_factory() as session:
+        res = await session.execute(
+            select(func.gen_random_uuid())
+            .select_from(func.generate_series(1, amount))
+        )
+        return list(res.scalars())
+
+
+async def connected_service() -> tuple[PresenceService, FakeWebSocket]:
+    chat_manager = ConnectionManager(session_factory=session_factory)
+    websocket = FakeWebSocket()
+    await chat_manager.connect(websocket)
+    return PresenceService(chat_manager), websocket
+
+
+async def test_presence_is_kept_while_user_is_connected():
+    service, websocket = await connected_service()
+    [user_id] = await load_user_ids(1)
+    await service.connect(user_id)
+    await service.connect(user_id)
+    await service.disconnect(user_id)
+    assert await redis.ttl(PresenceRedisKey(user_id=user_id).key) > 0
+    assert service.local_users == {user_id: 1}
+
+    await service.disconnect(user_id)
+    assert await redis.exists(PresenceRedisKey(user_id=user_id).key) == 0
+    assert service.local_users == {}
+    service.chat_manager.disconnect(websocket)
+
+
+async def test_heartbeat_restores_expired_presence():
+    service, websocket = await connected_service()
+    [user_id] = await load_user_ids(1)
+    await service.connect(user_id)
+    await service.flush_changes()
+    await redis.delete(PresenceRedisKey(user_id=user_id).key)
+
+    await service.heartbeat()
+    assert await redis.ttl(PresenceRedisKey(user_id=user_id).key) > 0
+    await service.flush_changes()
+    await drain()
+    assert len(websocket.sent) == 2
+    await service.disconnect(user_id)
+    service.chat_manager.disconnect(websocket)
+
+
+async def test_presence_is_tracked_per_worker():
+    first, websocket = await connected_service()
+    second = PresenceService(first.chat_manager)
+    [user_id] = await load_user_ids(1)
+    key = PresenceRedisKey(user_id=user_id).key
+    await first.connect(user_id)
+    await second.connect(user_id)
+    await redis.delete(key)
+
+    # a heartbeat of one worker doesn't drop connections of another
+    await first.heartbeat()
+    await second.disconnect(user_id)
+    assert await PresenceCRUD.get_presence([user_id]) == {user_id: True}
+    assert first._changes == {user_id: True}
+
+    # the first worker crashed without disconnecting
+    await redis.zadd(key, {first.worker_id: 0})
+    await second.connect(user_id)
+    assert await PresenceCRUD.get_presence([user_id]) == {user_id: True}
+    await second.disconnect(user_id)
+    assert await PresenceCRUD.get_presence([user_id]) == {user_id: False}
+    assert second._changes == {}
+    first.chat_manager.disconnect(websocket)
+
+
+async def test_presence_changes_are_coalesced():
+    service, websocket = await connected_service()
+    first, second, third = await load_user_ids(3)
+    await service.connect(first)
+    await service.connect(second)
+    await service.connect(third)
+    await service.disconnect(third)
+    await service.flush_changes()
+    await service.flush_changes()
+    await drain()
+    assert len(websocket.sent) == 1
+    assert orjson.loads(websocket.sent[0]) == {
+        "type": "presence",
+        "online": [str(first), str(second)],
+        "offline": [],
+    }
+
+    await service.disconnect(first)
+    await service.connect(first)
+    await service.flush_changes()
+    await drain()
+    assert len(websocket.sent) == 1
+    await service.disconnect(first)
+    await service.disconnect(second)
+    service.chat_manager.disconnect(websocket)
+
+
+async def test_failed_callback_does_not_stop_the_loop():
+    service = PresenceService()
+    calls = []
+
+    async def heartbeat():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise ValueError("broken heartbeat")
+
+    task = asyncio.create_task(service._every(0, heartbeat))
+    await drain()
+    task.cancel()
+    assert len(calls) > 1
+
+
+@pytest.mark.parametrize("received, error", [
+    ([{"type": "websocket.disconnect", "code": 1000}], None),
+    # the socket fails while receiving
+    ([], IndexError),
+])
+async def test_chat_endpoint_cleans_up_on_any_exit(
+    monkeypatch: pytest.MonkeyPatch,
+    received: list[dict],
+    error: type[Exception] | None
+):
+    service, websocket = await connected_service()
+    monkeypatch.setattr(chat, "manager", service.chat_manager)
+    monkeypatch.setattr(chat, "presence", service)
+    [user_id] = await load_user_ids(1)
+    user = User(id=user_id, username="leaving")
+    leaving = FakeWebSocket(received=received)
+
+    if error is None:
+        await chat.authenticated_websocket_endpoint(leaving, "public", user)
+    else:
+        with pytest.raises(error):
+            await chat.authenticated_websocket_endpoint(
+                leaving, "public", user
+            )
+    assert leaving not in service.chat_manager.active_connections
+    assert service.local_users == {}
+    assert await redis.exists(PresenceRedisKey(user_id=user_id).key) == 0
+    service.chat_manager.disconnect(websocket)
+
+
+async def test_get_presence(client: AsyncClient):
+    service, websocket = await connected_service()
+    online, offline = uuid4(), uuid4()
+    await service.connect(online)
+    res = await client.get(
+        f"/chat/presence?user_id={online}&user_id={offline}"
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert res.json() == {str(online): True, str(offline): False}
+    await service.disconnect(online)
+    service.chat_manager.disconnect(websocket)
+
+
+@pytest.mark.parametrize("amount, status_code", [
+    (0, status.HTTP_422_UNPROCESSABLE_ENTITY),
+    (101, status.HTTP_400_BAD_REQUEST),
+])
+async def test_get_presence_with_wrong_amount_of_users(
+    client: AsyncClient,
+    amount: int,
+    status_code: int
+):
+    query = "&".join(f"user_id={uuid4()}" for _ in range(amount))
+    res = await client.get(f"/chat/presence?{query}")
+    assert res.status_code == status_code
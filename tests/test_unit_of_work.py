@@ -0,0 +1,116 @@
+import pytest
+from fastapi import Depends, FastAPI, HTTPException, status
+from httpx import AsyncClient
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.postgres.connection import sync_session
+from app.db.postgres.memo import get_memo, memoized
+from app.db.postgres.models import ChatRoom
+from app.db.postgres.unit_of_work import (
+    ROUND_TRIPS_HEADER,
+    UnitOfWorkMiddleware,
+    after_commit,
+    unit_of_work_dependency
+)
+from app.services.crud import ChatRoomCRUD
+from tests.conftest import testing_async_session
+
+
+class RoomCRUD:
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    @memoized(ChatRoom, "name", aliases=("id",))
+    async def get_room_by_name(self, name: str) -> ChatRoom | None:
+        res = await self.db_session.execute(
+            select(ChatRoom).where(ChatRoom.name == name)
+        )
+        return res.scalar_one_or_none()
+
+    @memoized(ChatRoom, "id", aliases=("name",))
+    async def get_room_by_id(self, room_id: int) -> ChatRoom | None:
+        return await self.db_session.get(ChatRoom, room_id)
+
+
+get_uow = unit_of_work_dependency(testing_async_session)
+committed_rooms: list[str] = []
+
+app = FastAPI()
+app.add_middleware(UnitOfWorkMiddleware)
+
+
+@app.api_route("/room/{name}", methods=["GET", "POST"])
+async def get_or_create_room(
+    name: str,
+    fail: bool = False,
+    db: AsyncSession = Depends(get_uow)
+) -> int:
+    room_id = await ChatRoomCRUD(db).get_or_create_room(name)
+    after_commit(db, lambda: committed_rooms.append(name))
+    if fail:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    return room_id
+
+
+@pytest.fixture
+async def uow_client():
+    committed_rooms.clear()
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+    with sync_session() as db:
+        with db.begin():
+            db.execute(delete(ChatRoom).where(ChatRoom.name.like("uow %")))
+
+
+def get_room_names() -> list[str]:
+    with sync_session() as db:
+        return list(db.execute(
+            select(ChatRoom.name).where(ChatRoom.name.like("uow %"))
+        ).scalars())
+
+
+async def test_request_is_committed_before_response(uow_client: AsyncClient):
+    res = await uow_client.post("/room/uow committed")
+    assert res.status_code == status.HTTP_200_OK
+    assert get_room_names() == ["uow committed"]
+    assert committed_rooms == ["uow committed"]
+
+
+async def test_failed_request_is_rolled_back(uow_client: AsyncClient):
+    res = await uow_client.post("/room/uow failed?fail=true")
+    assert res.status_code == status.HTTP_400_BAD_REQUEST
+    assert get_room_names() == []
+    assert committed_rooms == []
+
+
+async def test_read_only_request_skips_transaction(uow_client: AsyncClient):
+    res = await uow_client.post("/room/uow counted")
+    # BEGIN, INSERT and COMMIT
+    assert res.headers[ROUND_TRIPS_HEADER] == "3"
+    res = await uow_client.get("/room/uow counted")
+    # INSERT and SELECT of the existing room, in autocommit
+    assert res.headers[ROUND_TRIPS_HEADER] == "2"
+
+
+async def test_lookups_are_memoized_until_write(session: AsyncSession):
+    session.add(ChatRoom(name="uow memo"))
+    await session.flush()
+    room_crud = RoomCRUD(session)
+    room = await room_crud.get_room_by_name("uow memo")
+    assert await room_crud.get_room_by_name("uow memo") is room
+    # found entities are stored under their other attributes too
+    assert await room_crud.get_room_by_id(room.id) is room
+    assert await room_crud.get_room_by_name("uow missing") is None
+    assert await room_crud.get_room_by_name("uow missing") is None
+    memo = get_memo(session)
+    assert (memo.hits, memo.misses) == (3, 2)
+
+    await session.execute(
+        update(ChatRoom)
+        .where(ChatRoom.id == room.id)
+        .values(name="uow renamed")
+    )
+    assert await room_crud.get_room_by_name("uow memo") is None
+    assert (memo.hits, memo.misses) == (3, 3)
+    await session.rollback()
@@ -1,10 +1,23 @@
+from uuid import uuid4
+
 import pytest
 from fastapi import status
 from httpx import AsyncClient
 
+from app.db.postgres.memo import MEMO_HITS_HEADER
+from app.services import email_verification
 from tests.conftest import create_test_auth_headers_for_user
 
 
+class RejectingEmailVerifier(email_verification.EmailVerifier):
+    def __init__(self):
+        self.emails: list[str] = []
+
+    def verify(self, email: str) -> bool:
+        self.emails.append(email)
+        return False
+
+
 @pytest.mark.parametrize("user", [
     ({
         "username": "new_user",
@@ -31,12 +44,15 @@ from tests.conftest import create_test_auth_headers_for_user
 async def test_create_user(client: AsyncClient, user: dict):
     res = await client.post("/user/registration", json=user)
     data = res.json()
-    assert res.status_code == status.HTTP_201_CREATED
+    assert res.status_code == status.HTTP_202_ACCEPTED
     assert data["username"] == user["username"]
-    assert data["first_name"] == user["first_name"]
-    assert data["last_name"] == user["last_name"]
     assert data["email"] == user["email"]
-    assert data["is_active"] is True
+    assert data["registration_status"] == "PENDING"
+
+    # celery runs eagerly in tests, the stub verifier accepts everyone
+    res = await client.get(f"/user/registration/{data['id']}")
+    assert res.status_code == status.HTTP_200_OK
+    assert res.json() == "VERIFIED"
 
 
 @pytest.mark.parametrize("user", [
@@ -68,6 +84,38 @@ async def test_create_user_bad_request(client: AsyncClient, user: dict):
     assert res.json() == {"detail": "This username or email is already in use"}
 
 
+async def test_rejected_user_is_not_activated(
+    client: AsyncClient,
+    monkeypatch: pytest.MonkeyPatch
+):
+    verifier = RejectingEmailVerifier()
+    monkeypatch.setattr(email_verification, "email_verifier", verifier)
+    user = {
+        "username": "rejected",
+        "first_name": "Fake",
+        "last_name": "Email",
+        "email": "rejected@example.com",
+        "password": "123456789",
+    }
+    res = await client.post("/user/registration", json=user)
+    assert res.status_code == status.HTTP_202_ACCEPTED
+    assert verifier.emails == [user["email"]]
+
+    res = await client.get(f"/user/registration/{res.json()['id']}")
+    assert res.json() == "REJECTED"
+    res = await client.get(f"/user/{user['username']}")
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+async def test_get_registration_status_of_user_which_not_exists(
+    client: AsyncClient
+):
+    user_id = uuid4()
+    res = await client.get(f"/user/registration/{user_id}")
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+    assert res.json() == {"detail": f"User with id {user_id} not found."}
+
+
 @pytest.mark.parametrize("user", [
     ({
         "username": "new_user",
@@ -268,6 +316,8 @@ async def test_delete_user(client: AsyncClient, email: str):
     assert res.status_code == status.HTTP_200_OK
     assert data["email"] == email
     assert data["is_active"] is False
+    # the account was looked up once, by the auth dependency
+    assert res.headers[MEMO_HITS_HEADER] == "1"
 
 
 @pytest.mark.parametrize("email", [